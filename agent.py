@@ -1,4 +1,17 @@
+import math
 import random
+import time
+
+import othello_bitboard
+import othello_book
+import othello_endgame
+import othello_eval
+import othello_mcts
+import othello_ordering
+import othello_rules
+import othello_stats
+import othello_symmetry
+import othello_transposition
 
 NONE = '.'
 BLACK = 'B'
@@ -8,6 +21,23 @@ LEAST_CELLS = 'L'
 DEFAULT_ROWS = 8
 DEFAULT_COLS = 8
 BOARD_DEPTH = 2
+# How many nodes a timed search visits between two looks at the clock
+TIME_CHECK_INTERVAL = 64
+# Search scores: any won game scores above WIN_SCORE, any lost one below -WIN_SCORE
+INFINITY = float("inf")
+WIN_SCORE = 100000
+ASPIRATION_WINDOW = 4
+# Positions with this many empty squares or fewer are solved exactly
+ENDGAME_EMPTIES = 10
+# Leaf evaluation by pattern tables (see othello_eval)
+PATTERN_EVALUATOR = 'pattern'
+# Monte Carlo tree search
+UCT = 'uct'
+PUCT = 'puct'
+UCT_EXPLORATION = 1.4
+PUCT_EXPLORATION = 2.0
+MCTS_ITERATIONS = 1000
+MCTS_MAX_NODES = 200000
 
 class RandomAgent:
 
@@ -19,575 +49,846 @@ class RandomAgent:
         next_move = random.choice(possible_moves)
         return next_move
 
-class AlphaBetaAgent:
-    def __init__(self):
-        self.possible_moves = []
 
-    def get_next_action(self, board_state):
-        board = self.copy_state(board_state)
-        return self.max_value(board_state, board, 0, float("-inf"), float("inf"))
+# The search agents below never keep a copy of the game's rules or the board.
+# They search on a private copy of the game state and walk the game tree in place
+# with make_move()/unmake_move(), so expanding a node allocates almost nothing.
+# make_move() follows the real pass rule: when the opponent has no reply, the
+# same player simply moves again.
+
+class SearchTimeout(Exception):
+    ''' Raised inside a search when its time budget runs out '''
+    pass
+
+
+class SearchResult:
+    '''
+    What a search found: the best move, its score, the principal variation
+    and how much work it took
+    '''
+
+    def __init__(self, move, score, pv, nodes, depth, elapsed, iterations=None, stats=None):
+        ''' move is a [row, col] list like get_next_action() returns, score is
+            from the searching player's point of view, pv is the principal
+            variation as a list of [row, col] moves starting with move, depth
+            is the deepest completed iteration in plies and elapsed is in
+            seconds. iterations lists (depth, score, square, seconds) for
+            every completed iteration, seconds being the time from the start
+            of the search to the end of the iteration. stats is the
+            othello_stats.SearchStats of an instrumented search, else None. '''
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.nodes = nodes
+        self.depth = depth
+        self.elapsed = elapsed
+        self.iterations = iterations or []
+        self.stats = stats
+
+    def __repr__(self):
+        return ('SearchResult(move={}, score={}, pv={}, nodes={}, depth={}, elapsed={:.3f})'
+                .format(self.move, self.score, self.pv, self.nodes, self.depth, self.elapsed))
 
-    def max_value(self, board_state, board, depth, alpha, beta):
-        if self.is_game_over(board_state, board):
-            return self.get_total_cells(board_state.turn, board_state, board)
-        max_score = float("-inf")
 
-        legalMoves = self.get_possible_moves(board_state, board)
-
-        if len(legalMoves) > 0:
-            action = legalMoves[0]
-
-
-        for move in legalMoves:
-            newBoard = self.copy_board(board_state, board)
-            row = move[0]
-            col = move[1]
-            self.move(row, col, board_state, newBoard)
-            score = self.min_value(newBoard, depth, board_state, 1, alpha, beta)
-            if score > max_score:
-                max_score = score
-                action = move
-            alpha = max(alpha, max_score)
-            if max_score > beta:
-                return max_score
-
-        if depth == 0:
-            return action
+class AlphaBetaAgent:
+    def __init__(self, max_depth=None, time_budget_ms=None,
+                 tt_size=othello_transposition.DEFAULT_SIZE,
+                 tt_replacement=othello_transposition.AGING,
+                 aspiration_window=ASPIRATION_WINDOW,
+                 endgame_empties=ENDGAME_EMPTIES, endgame_wld=False, evaluator=None, book=None,
+                 tt_symmetry=False, instrument=None):
+        self.possible_moves = []
+        # Without a time budget the agent searches max_depth plies (default
+        # 2 * BOARD_DEPTH). With a budget it deepens one ply at a time until the
+        # budget runs out or max_depth (default: no limit) is reached.
+        self.max_depth = max_depth
+        self.time_budget_ms = time_budget_ms
+        # Half-width of the window placed around the previous iteration's
+        # score. 0 or None searches every iteration with a full window.
+        self.aspiration_window = aspiration_window
+        # From endgame_empties empty squares on, the exact endgame solver takes
+        # over from the heuristic search. With endgame_wld it only proves win,
+        # loss or draw, which is much faster but ignores the margin.
+        # An endgame_empties of 0 or None turns the solver off.
+        self.endgame_empties = endgame_empties
+        self.endgame_wld = endgame_wld
+        # None scores leaves with evaluationFunction(). PATTERN_EVALUATOR uses
+        # othello_eval's pattern tables for the board's size (tuned ones if
+        # installed, else the defaults); any other string is the path of a
+        # weights file written by othello_tuning, and a PatternEvaluator is
+        # used as given.
+        self.evaluator = _evaluator_argument(evaluator)
+        self._pattern_evaluator = None
+        # Opening book consulted before searching: an OpeningBook, or the
+        # path of a book file (opened once per process and shared)
+        self.book = book
+        self.nodes = 0
+        self.depth_reached = 0
+        self.last_result = None
+        # Positions searched so far, keyed by the game's Zobrist key. Scores are
+        # derived from this agent's evaluation of its own color under the game's
+        # victory type, so the table is cleared if the agent is handed the other
+        # color, a different board size or a different victory type.
+        # A tt_size of 0 or None turns the table off.
+        # With tt_symmetry positions are keyed by their canonical form (see
+        # othello_symmetry), so all the orientations of a position share an
+        # entry, at the cost of canonicalizing every node.
+        self.transposition_table = None
+        self.tt_symmetry = tt_symmetry
+        if tt_size:
+            self.transposition_table = othello_transposition.TranspositionTable(tt_size, tt_replacement)
+        # Killer moves, history heuristic and static square weights
+        self.move_orderer = othello_ordering.MoveOrderer()
+        self._color = None
+        self._geometry = None
+        self._victory_type = None
+        # With instrument every search builds an othello_stats.SearchStats,
+        # attached to its result and passed to the hooks: instrument is True
+        # (no hooks), a callable, a log file path, or a list of those.
+        # Like nodes, scored leaves are counted by every agent; only an
+        # instrumented one reads the count.
+        self._hooks = othello_stats.make_hooks(instrument)
+        self._leaves = 0
+        self._source = None
+        self._iteration_nodes = []
+
+    def get_next_action(self, board_state, time_budget_ms=None):
+        return self.search(board_state, time_budget_ms).move
+
+    def search(self, board_state, time_budget_ms=None, root_moves=None) -> SearchResult:
+        ''' Searches the game's current position and returns a SearchResult.
+            root_moves optionally restricts the moves considered at the root
+            to the given squares; the parallel search uses it to split the
+            root moves between workers. '''
+        if self._hooks is None:
+            return self._search(board_state, time_budget_ms, root_moves)
+
+        table = self.transposition_table
+        tt_before = (table.hits, table.misses) if table is not None else (0, 0)
+        cutoffs_before = list(self.move_orderer.cutoff_indices)
+        self._leaves = 0
+        result = self._search(board_state, time_budget_ms, root_moves)
+        result.stats = self._search_stats(board_state, result, tt_before, cutoffs_before)
+        for hook in self._hooks:
+            hook(result.stats)
+        return result
+
+    def prepare(self, rows: int, cols: int) -> None:
+        ''' Builds what the agent needs for boards of the given size (the
+            pattern tables, which take longer than a short move budget),
+            so that it is not done during the first move '''
+        if self.evaluator == PATTERN_EVALUATOR:
+            othello_eval.evaluator(rows, cols)
+
+    def _search(self, board_state, time_budget_ms, root_moves):
+        start = time.perf_counter()
+        # Without prepare() the first move on a board size pays for building
+        # the pattern tables out of its budget
+        self._prepare_evaluator(board_state)
+        self._iteration_nodes = []
+        if self.book is not None and root_moves is None:
+            self._source = othello_stats.BOOK
+            result = self._book_move(board_state, start)
+            if result is not None:
+                self.last_result = result
+                return result
+        state = board_state.copy()
+        self._start_search(state)
+        if self._pattern_evaluator is not None:
+            # Pattern features are kept up to date by make/unmake from here on
+            state.attach_features(othello_eval.IncrementalFeatures(self._pattern_evaluator))
+        self._root_moves = root_moves
+        self.nodes = 0
+        if time_budget_ms is None:
+            time_budget_ms = self.time_budget_ms
+
+        if time_budget_ms is None:
+            self._deadline = None
+            max_depth = self.max_depth or 2 * BOARD_DEPTH
         else:
-            return max_score
-
-
-    def min_value(self, board, depth, board_state, agent, alpha, beta):
-        if self.is_game_over(board_state, board):
-            return self.get_total_cells(board_state.turn, board_state, board)
-
-        next = 0
-        legalMoves = self.get_opponent_moves(board_state, board)
-        min_score = float("inf")
-
-        for move in legalMoves:
-            if agent > 0:
-                newBoard = self.copy_board(board_state, board)
-                row = move[0]
-                col = move[1]
-                self.move_opponent(row, col, board_state, newBoard)
-                score = self.min_value(newBoard, depth, board_state, next, alpha, beta)
+            self._deadline = start + time_budget_ms / 1000.0
+            max_depth = self.max_depth or state.get_empty_cells()
+
+        if (self.endgame_empties and root_moves is None
+                and state.get_empty_cells() <= self.endgame_empties):
+            self._source = othello_stats.ENDGAME
+            result = self._solve_endgame(state, start, time_budget_ms)
+            if result is not None:
+                self.last_result = result
+                return result
+        self._source = othello_stats.SEARCH
+
+        # Iterative deepening: every completed iteration leaves its best moves
+        # in the transposition table, which orders the next, deeper iteration.
+        # When the clock runs out mid-iteration that iteration is thrown away
+        # and the result of the deepest completed one is used.
+        candidates = root_moves or state.legal_squares()
+        square = self._hash_move(state)
+        if square not in candidates:
+            square = candidates[0]
+        score = None
+        pv = [square]
+        iterations = []
+        self.depth_reached = 0
+
+        for depth in range(1, max_depth + 1):
+            iteration_start = time.perf_counter()
+            try:
+                score = self._aspiration_search(state, depth, score)
+            except SearchTimeout:
+                break
+            square = self._pv[0][0]
+            pv = self._pv[0]
+            iterations.append((depth, score, square, time.perf_counter() - start))
+            self._iteration_nodes.append(self.nodes)
+            self.depth_reached = depth
+            if self._deadline is not None:
+                now = time.perf_counter()
+                # Don't start an iteration that can't even match the last one's time
+                if self._deadline - now < now - iteration_start:
+                    break
+
+        geometry = state.get_geometry()
+        self.last_result = SearchResult(list(geometry.position(square)), score,
+                                        [list(geometry.position(move)) for move in pv],
+                                        self.nodes, self.depth_reached,
+                                        time.perf_counter() - start, iterations)
+        return self.last_result
+
+    def _search_stats(self, board_state, result, tt_before, cutoffs_before):
+        ''' Returns the SearchStats of the search that produced the result,
+            given the table and cutoff counters from before it '''
+        table = self.transposition_table
+        hits, misses = (table.hits, table.misses) if table is not None else (0, 0)
+        cutoffs = list(self.move_orderer.cutoff_indices)
+        for index, count in enumerate(cutoffs_before):
+            cutoffs[index] -= count
+
+        iterations = []
+        nodes = seconds = 0
+        if self._source == othello_stats.SEARCH:
+            for (depth, score, square, end), end_nodes in zip(result.iterations, self._iteration_nodes):
+                iterations.append((depth, end_nodes - nodes, end - seconds))
+                nodes, seconds = end_nodes, end
+        elif result.iterations:
+            iterations = [(result.depth, result.nodes, result.elapsed)]
+        return othello_stats.SearchStats(
+            self._source, result.move, result.score, result.pv, result.depth, result.elapsed,
+            result.nodes, self._leaves if self._source == othello_stats.SEARCH else None,
+            cutoffs, hits - tt_before[0] + misses - tt_before[1], hits - tt_before[0],
+            iterations, board_state.get_empty_cells(), board_state.get_turn())
+
+    def _book_move(self, state, start):
+        ''' Returns a SearchResult for the best book move in the state, or
+            None if the book has no move for it. Its score is the book's
+            search score, or None for a move only scored by games (see
+            OpeningBook.best_move). '''
+        book = othello_book.open_book(self.book) if isinstance(self.book, str) else self.book
+        entry = book.best_move(state)
+        if entry is None:
+            return None
+        square, score, depth = entry
+        move = list(state.get_geometry().position(square))
+        self.nodes = 0
+        self.depth_reached = depth
+        return SearchResult(move, score, [move], 0, depth, time.perf_counter() - start)
+
+    def _solve_endgame(self, state, start, time_budget_ms):
+        ''' Solves the state exactly and returns a SearchResult, or None if
+            the solver could not finish within half the time budget '''
+        solver = othello_endgame.EndgameSolver(state.get_geometry(), state.victory_type)
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = start + time_budget_ms / 2000.0
+        player, opponent = state.get_bitboards()
+        try:
+            result, square = solver.solve(player, opponent, self.endgame_wld, deadline)
+        except othello_endgame.SolverTimeout:
+            self.nodes += solver.nodes
+            return None
+        self.nodes += solver.nodes
+        self.depth_reached = state.get_empty_cells()
+        move = list(state.get_geometry().position(square))
+        elapsed = time.perf_counter() - start
+        return SearchResult(move, self._final_score(result), [move], self.nodes,
+                            self.depth_reached, elapsed,
+                            [(self.depth_reached, self._final_score(result), square, elapsed)])
+
+    def _aspiration_search(self, state, depth, previous_score):
+        ''' Searches the root depth plies deep inside a narrow window around
+            the previous iteration's score, widening the failing side of the
+            window and searching again whenever the score falls outside it '''
+        if not self.aspiration_window or previous_score is None:
+            return self.negamax(state, depth, -INFINITY, INFINITY, 0)
+
+        alpha = previous_score - self.aspiration_window
+        beta = previous_score + self.aspiration_window
+        while True:
+            score = self.negamax(state, depth, alpha, beta, 0)
+            if score <= alpha:
+                alpha = -INFINITY
+            elif score >= beta:
+                beta = INFINITY
             else:
-                newBoard = self.copy_board(board_state, board)
-                row = move[0]
-                col = move[1]
-                self.move_opponent(row, col, board_state, newBoard)
-                if (depth+1) == BOARD_DEPTH:
-                    score = self.evaluationFunction(newBoard, board_state, move)
+                return score
+
+    # Negamax with principal variation search. Every score is from the point of
+    # view of the player to move at that node. The first move of a node is
+    # searched with the full (alpha, beta) window; the rest are first tested
+    # with a null window and only searched again if they turn out to be better.
+    #
+    # Passes are handled in _child_value(): after a move the turn normally goes
+    # to the other player, whose score is the negation of ours, but if the other
+    # player has to pass we move again and the child's score is already ours.
+    # A pass does not use up a ply of depth.
+    def negamax(self, state, depth, alpha, beta, ply):
+        self._count_node()
+        self._pv[ply] = []
+        if state.is_game_over():
+            return self._terminal_score(state)
+        if depth == 0:
+            return self._evaluate(state)
+
+        alpha_original = alpha
+        hash_move = None
+        table_key = self._table_key(state)
+        entry = self._probe(state, table_key)
+        if entry is not None:
+            # Never cut off at the root, which must always produce a move
+            if entry[1] >= depth and ply > 0:
+                bound = entry[2]
+                score = entry[3]
+                if (bound == othello_transposition.EXACT
+                        or (bound == othello_transposition.LOWER and score >= beta)
+                        or (bound == othello_transposition.UPPER and score <= alpha)):
+                    if entry[4] is not None:
+                        self._pv[ply] = [entry[4]]
+                    return score
+            hash_move = entry[4]
+
+        mover = state.turn
+        side = 0 if mover == self._color else 1
+        best_score = -INFINITY
+        best_move = None
+        moves = state.legal_squares()
+        if ply == 0 and self._root_moves is not None:
+            moves = [move for move in moves if move in self._root_moves]
+        moves = self.move_orderer.order(moves, ply, side, hash_move)
+
+        for index, move in enumerate(moves):
+            state.make_move(move)
+            try:
+                if index == 0:
+                    score = self._child_value(state, mover, depth - 1, alpha, beta, ply + 1)
                 else:
-                    score = self.max_value(board_state, newBoard, depth+1, alpha, beta)
-
-            if score < min_score:
-                min_score = score
-            beta = min(beta, min_score)
-            if min_score < alpha:
-                return min_score
-
-        return min_score
-
-    def evaluationFunction(self, board, board_state, move):
-        return self.get_total_cells(board_state.turn, board_state, board)
-        # Corner
-        #if (move[0] == 0 or move[0] == 1) and (move[1] == 0 or move[1] == 1):
-        #    return 100
-
-    def betterEvaluationFunction(self, board, board_state, move):
-        blackPieces = self.get_total_cells(board_state.turn, board_state, board)
-        whitePices = self.get_total_cells(board_state._opposite_turn(board_state.turn), board_state, board)
-        blackMoves = len(self.get_possible_moves(board_state,board))
-        whiteMoves = len(self.get_opponent_moves(board_state, board))
-
-        # Number of pieces on board
-        p = 0
-        if blackPieces > whitePices:
-            p = 100*(float(blackPieces)/float(blackPieces+whitePices))
-        if whitePices > blackPieces:
-            p = -100*(float(whitePices)/float(blackPieces+whitePices))
-
-        # Number of moves
-        m = 0
-        if blackMoves > whiteMoves:
-            m = 100*(float(blackMoves)/float(blackMoves+whiteMoves))
-        if whiteMoves > blackMoves:
-            m = -100 * (float(whiteMoves) / float(blackMoves + whiteMoves))
-
-
-        # Corner occupancy
-        blackCorner = 0
-        whiteCorner = 0
-        if board[0][0] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[0][0] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[0][DEFAULT_COLS-1] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[0][DEFAULT_COLS-1] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[DEFAULT_ROWS-1][0] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[DEFAULT_ROWS-1][0] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[DEFAULT_ROWS-1][DEFAULT_COLS-1] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[DEFAULT_ROWS-1][DEFAULT_COLS-1] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        c = (25*blackCorner) - (25*whiteCorner)
-
-        return p + m + c
-
-
-
-
-    def get_total_cells(self, turn: str, board_state, board) -> int:
-        total = 0
-        for row in range(board_state.rows):
-            for col in range(board_state.cols):
-                if board[row][col] == turn:
-                    total += 1
-        return total
-
-    def is_game_over(self, board_state, board) -> bool:
-        return self.can_move(BLACK, board_state, board) == False and self.can_move(WHITE, board_state, board) == False
-
-    def copy_state(self, board_state):
-        board = []
-        for row in range(board_state.rows):
-            new_row = []
-            for col in range(board_state.cols):
-                new_row.append(board_state.current_board[row][col])
-            board.append(new_row)
-        return board
-
-    def copy_board(self, board_state, oldBoard):
-        board = []
-        for row in range(board_state.rows):
-            new_row = []
-            for col in range(board_state.cols):
-                new_row.append(oldBoard[row][col])
-            board.append(new_row)
-        return board
-
-    def get_possible_moves(self, board_state, board):
-        self.can_move(board_state.turn, board_state, board)
-        return self.possible_moves
-
-    def get_opponent_moves(self, board_state, board):
-        self.can_move(board_state._opposite_turn(board_state.turn), board_state, board)
-        return self.possible_moves
-
-    def move(self, row: int, col: int, board_state, board) -> None:
-        self._require_valid_empty_space_to_move(row, col, board_state, board)
-        possible_directions = self._adjacent_opposite_color_directions(row, col, board_state.turn, board_state, board)
-
-        next_turn = board_state.turn
-        for direction in possible_directions:
-            if self._is_valid_directional_move(row, col, direction[0], direction[1], board_state.turn, board_state, board):
-                next_turn = board_state._opposite_turn(board_state.turn)
-            self._convert_adjacent_cells_in_direction(row, col, direction[0], direction[1], board_state.turn, board_state, board)
-
-        if next_turn != board_state.turn:
-            board[row][col] = board_state.turn
-          #  if self.can_move(next_turn, board_state, board):
-          #      board_state.switch_turn()
+                    score = self._child_value(state, mover, depth - 1, alpha, alpha + 1, ply + 1)
+                    if alpha < score < beta:
+                        score = self._child_value(state, mover, depth - 1, alpha, beta, ply + 1)
+            finally:
+                state.unmake_move()
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if alpha >= beta:
+                        self.move_orderer.record_cutoff(move, ply, side, depth, index)
+                        break
+
+        self._store(state, depth, alpha_original, beta, best_score, best_move, table_key)
+        if not self._pv[ply]:
+            self._pv[ply] = [best_move]
+        return best_score
+
+    def _child_value(self, state, mover, depth, alpha, beta, ply):
+        ''' Returns the value, for mover, of the position mover just moved into '''
+        if state.turn == mover:
+            return self.negamax(state, depth, alpha, beta, ply)
+        return -self.negamax(state, depth, -beta, -alpha, ply)
+
+    def _evaluate(self, state):
+        ''' Returns evaluationFunction(), or the pattern evaluation, from the
+            point of view of the player to move '''
+        self._leaves += 1
+        if self._pattern_evaluator is not None:
+            score = state.get_features().evaluate(state.turn == BLACK, state.get_empty_cells())
+            # The tables reward holding discs, which is what LEAST_CELLS punishes
+            if state.victory_type == LEAST_CELLS:
+                return -score
+            return score
+        score = self.evaluationFunction(state)
+        if state.turn == self._color:
+            return score
+        return -score
+
+    def _terminal_score(self, state):
+        ''' Scores a finished game for the player to move: any win beats any
+            heuristic score, and bigger wins beat smaller ones '''
+        self._leaves += 1
+        player, opponent = state.get_bitboards()
+        return self._final_score(othello_rules.score(player, opponent, state.victory_type))
+
+    def _final_score(self, result):
+        ''' Turns a final score under the game's victory type into a search score '''
+        if result > 0:
+            return WIN_SCORE + result
+        if result < 0:
+            return -WIN_SCORE + result
+        return 0
+
+    def _count_node(self):
+        ''' Counts a visited node and, every TIME_CHECK_INTERVAL nodes of a
+            timed search, raises SearchTimeout once the deadline has passed '''
+        self.nodes += 1
+        if (self._deadline is not None and self.nodes % TIME_CHECK_INTERVAL == 0
+                and time.perf_counter() > self._deadline):
+            raise SearchTimeout()
+
+    def _start_search(self, state):
+        ''' Prepares the transposition table and move orderer for a search
+            from the given state '''
+        self._pv = [[] for ply in range(state.get_empty_cells() + 2)]
+        self.move_orderer.start_search(state.get_geometry())
+        if self.transposition_table is None:
+            self._color = state.turn
+            return
+        if (state.turn != self._color or state.get_geometry() is not self._geometry
+                or state.victory_type != self._victory_type):
+            self.transposition_table.clear()
+        self._color = state.turn
+        self._geometry = state.get_geometry()
+        self._victory_type = state.victory_type
+        self.transposition_table.new_search()
+
+    def _prepare_evaluator(self, state):
+        ''' Sets up the pattern evaluator, if any, for the state's board size '''
+        self._pattern_evaluator = _board_evaluator(self.evaluator, state)
+
+    def _table_key(self, state):
+        ''' Returns (key, symmetry): the state's transposition table key and
+            the symmetry its stored moves are transformed by '''
+        if self.transposition_table is None:
+            return None
+        if not self.tt_symmetry:
+            return state.get_key(), 0
+        rows, cols = state.get_rows(), state.get_columns()
+        player, opponent, symmetry = othello_symmetry.canonical(rows, cols, *state.get_bitboards())
+        return hash((player, opponent, state.turn == WHITE)), symmetry
+
+    def _probe(self, state, table_key=None):
+        ''' Returns the transposition table entry for the state, or None '''
+        if self.transposition_table is None:
+            return None
+        key, symmetry = table_key or self._table_key(state)
+        entry = self.transposition_table.probe(key)
+        if entry is None or not symmetry or entry[4] is None:
+            return entry
+        inverse = othello_symmetry.inverses(state.get_rows(), state.get_columns())[symmetry]
+        move = othello_symmetry.transform_square(state.get_rows(), state.get_columns(), inverse, entry[4])
+        return entry[:4] + (move,) + entry[5:]
+
+    def _hash_move(self, state):
+        ''' Returns the best move stored for the state, or None '''
+        entry = self._probe(state)
+        if entry is None:
+            return None
+        return entry[4]
+
+    def _store(self, state, depth, alpha, beta, score, move, table_key=None):
+        ''' Records a node's result in the transposition table. alpha and beta
+            are the window the node was searched with. '''
+        if self.transposition_table is None:
+            return
+        if score <= alpha:
+            bound = othello_transposition.UPPER
+        elif score >= beta:
+            bound = othello_transposition.LOWER
         else:
-            raise InvalidMoveException()
-
-    def move_opponent(self, row: int, col: int, board_state, board) -> None:
-        self._require_valid_empty_space_to_move(row, col, board_state, board)
-        possible_directions = self._adjacent_opposite_color_directions(row, col, board_state._opposite_turn(board_state.turn), board_state, board)
-
-        next_turn = board_state.turn
-        for direction in possible_directions:
-            if self._is_valid_directional_move(row, col, direction[0], direction[1], board_state._opposite_turn(board_state.turn), board_state,
-                                               board):
-                next_turn = board_state.turn
-            self._convert_adjacent_cells_in_direction(row, col, direction[0], direction[1], board_state._opposite_turn(board_state.turn),
-                                                      board_state, board)
-
-        if next_turn != board_state._opposite_turn(board_state.turn):
-            board[row][col] = board_state._opposite_turn(board_state.turn)
-        #  if self.can_move(next_turn, board_state, board):
-        #      board_state.switch_turn()
-        else:
-            raise InvalidMoveException()
-
-    def can_move(self, turn: str, board_state, board) -> bool:
-        can_move = False
-        new_possible_moves = []
-        for row in range(board_state.rows):
-            for col in range(board_state.cols):
-                if board[row][col] == NONE:
-                    for direction in self._adjacent_opposite_color_directions(row, col, turn, board_state, board):
-                        if self._is_valid_directional_move(row, col, direction[0], direction[1], turn, board_state, board):
-                            new_possible_moves.append([row, col])
-                            can_move = True
-        self.possible_moves = new_possible_moves
-        return can_move
-
-    def _require_valid_empty_space_to_move(self, row: int, col: int, board_state, board) -> bool:
-        ''' In order to move, the specified cell space must be within board boundaries
-            AND the cell has to be empty '''
-
-        if self._is_valid_cell(row, col, board_state) and self._cell_color(row, col, board_state, board) != NONE:
-            raise InvalidMoveException()
-
-    def _is_valid_cell(self, row: int, col: int, board_state) -> bool:
-        ''' Returns True if the given cell move position is invalid due to
-            position (out of bounds) '''
-        return self._is_valid_row_number(row, board_state) and self._is_valid_col_number(col, board_state)
-
-    def _is_valid_row_number(self, row: int, board_state) -> bool:
-        ''' Returns True if the given row number is valid; False otherwise '''
-        return 0 <= row < board_state.rows
-
-    def _is_valid_col_number(self, col: int, board_state) -> bool:
-        ''' Returns True if the given col number is valid; False otherwise '''
-        return 0 <= col < board_state.cols
-
-
-    def _cell_color(self, row: int, col: int, board_state, board) -> str:
-        ''' Determines the color/player of the specified cell '''
-        return board[row][col]
-
-    def _adjacent_opposite_color_directions(self, row: int, col: int, turn: str, board_state, board) -> [tuple]:
-        dir_list = []
-        for rowdelta in range(-1, 2):
-            for coldelta in range(-1, 2):
-                if self._is_valid_cell(row+rowdelta, col + coldelta, board_state):
-                    if board[row + rowdelta][col + coldelta] == board_state._opposite_turn(turn):
-                        dir_list.append((rowdelta, coldelta))
-        return dir_list
-
-    def _is_valid_directional_move(self, row: int, col: int, rowdelta: int, coldelta: int, turn: str, board_state, board) -> bool:
-        current_row = row + rowdelta
-        current_col = col + coldelta
-
-        last_cell_color = board_state._opposite_turn(turn)
+            bound = othello_transposition.EXACT
+        key, symmetry = table_key or self._table_key(state)
+        if symmetry and move is not None:
+            move = othello_symmetry.transform_square(state.get_rows(), state.get_columns(), symmetry, move)
+        self.transposition_table.store(key, depth, bound, score, move)
 
-        while True:
-            # Immediately return false if the board reaches the end (b/c there's no blank
-            # space for the cell to sandwich the other colored cell(s)
-            if not self._is_valid_cell(current_row, current_col, board_state):
-                break
-            if self._cell_color(current_row, current_col, board_state, board) == NONE:
-                break
-            if self._cell_color(current_row, current_col, board_state, board) == turn:
-                last_cell_color = turn
-                break
-
-            current_row += rowdelta
-            current_col += coldelta
+    def evaluationFunction(self, state):
+        return state.get_total_cells(self._color)
 
-        return last_cell_color == turn
-
-    def _convert_adjacent_cells_in_direction(self, row: int, col: int,
-                                             rowdelta: int, coldelta: int, turn: str, board_state, board) -> None:
-        if self._is_valid_directional_move(row, col, rowdelta, coldelta, turn, board_state, board):
-            current_row = row + rowdelta
-            current_col = col + coldelta
-
-            while self._cell_color(current_row, current_col, board_state, board) == board_state._opposite_turn(turn):
-                self._flip_cell(current_row, current_col, board_state, board)
-                current_row += rowdelta
-                current_col += coldelta
-
-    def _flip_cell(self, row: int, col: int, board_state, board) -> None:
-        ''' Flips the specified cell over to the other color '''
-        board[row][col] = board_state._opposite_turn(board[row][col])
+    def betterEvaluationFunction(self, state):
+        return _better_evaluation(state, self._color)
 
 
 class ExpectimaxAgent:
 
-    def __init__(self):
+    def __init__(self, evaluator=None):
         self.possible_moves = []
+        # As for AlphaBetaAgent: None scores leaves with evaluationFunction(),
+        # PATTERN_EVALUATOR, a weights file path or a PatternEvaluator with
+        # pattern tables, whose features make/unmake keep up to date.
+        self.evaluator = _evaluator_argument(evaluator)
+        self._pattern_evaluator = None
+        self.nodes = 0
+        self.last_result = None
+
+    def prepare(self, rows: int, cols: int) -> None:
+        ''' Builds the pattern tables for boards of the given size ahead of
+            the first move (see AlphaBetaAgent.prepare) '''
+        if self.evaluator == PATTERN_EVALUATOR:
+            othello_eval.evaluator(rows, cols)
+
+    def get_next_action(self, board_state, time_budget_ms=None):
+        return self.search(board_state, time_budget_ms).move
+
+    def search(self, board_state, time_budget_ms=None, root_moves=None) -> SearchResult:
+        ''' Searches the game's current position and returns a SearchResult.
+            root_moves optionally restricts the moves considered at the root.
+            The search has a fixed depth, so a time budget can only cut it
+            short between root moves: once it has run out, the best of the
+            moves searched so far is played. '''
+        start = time.perf_counter()
+        deadline = None if time_budget_ms is None else start + time_budget_ms / 1000.0
+        state = board_state.copy()
+        self._color = state.turn
+        self._pattern_evaluator = _board_evaluator(self.evaluator, state)
+        if self._pattern_evaluator is not None:
+            state.attach_features(othello_eval.IncrementalFeatures(self._pattern_evaluator))
+        self.nodes = 0
+        max_score = float("-inf")
+        action = None
 
-    def get_next_action(self, board_state):
-        board = self.copy_state(board_state)
-        return self.max_value(board_state, 0, board)
+        for move in root_moves or state.legal_squares():
+            if action is not None and deadline is not None and time.perf_counter() > deadline:
+                break
+            state.make_move(move)
+            score = self.value(state, 0)
+            state.unmake_move()
+            if action is None or score > max_score:
+                max_score = score
+                action = move
 
-    def max_value(self, board_state, depth, board):
-        if self.is_game_over(board_state, board):
-            return self.get_total_cells(board_state.turn, board_state, board)
-        max_score = float("-inf")
+        move = list(state.get_geometry().position(action))
+        elapsed = time.perf_counter() - start
+        self.last_result = SearchResult(move, max_score, [move], self.nodes, 2 * BOARD_DEPTH, elapsed,
+                                        [(2 * BOARD_DEPTH, max_score, action, elapsed)])
+        return self.last_result
 
-        legalMoves = self.get_possible_moves(board_state,board)
-        if len(legalMoves) > 0:
-            action = legalMoves[0]
+    def value(self, state, depth):
+        self.nodes += 1
+        if state.turn == self._color:
+            return self.max_value(state, depth)
+        else:
+            return self.exp_value(state, depth)
 
-        for move in legalMoves:
-            newBoard = self.copy_board(board_state, board)
-            row = move[0]
-            col = move[1]
-            self.move(row, col, board_state, newBoard)
-            score = self.exp_value(newBoard, depth, board_state, 1)
+    def max_value(self, state, depth):
+        if state.is_game_over():
+            return self._terminal_value(state)
+        max_score = float("-inf")
+
+        for move in state.legal_squares():
+            state.make_move(move)
+            score = self.value(state, depth)
+            state.unmake_move()
             if score > max_score:
                 max_score = score
-                action = move
 
-        if depth == 0:
-            return action
-        else:
-            return max_score
+        return max_score
 
 
 
-    def exp_value(self, board, depth, board_state, agent):
-        if self.is_game_over(board_state, board):
-            return self.get_total_cells(board_state.turn, board_state, board)
+    def exp_value(self, state, depth):
+        if state.is_game_over():
+            return self._terminal_value(state)
 
-        next = 0
-        legalMoves = self.get_opponent_moves(board_state, board)
+        legalMoves = state.legal_squares()
         v = 0
 
         for move in legalMoves:
-            if agent > 0:
-                newBoard = self.copy_board(board_state, board)
-                row = move[0]
-                col = move[1]
-                self.move_opponent(row, col, board_state, newBoard)
-                score = self.exp_value(newBoard, depth, board_state, next)
+            state.make_move(move)
+            if (depth+1) == BOARD_DEPTH:
+                score = self._evaluate(state)
             else:
-                newBoard = self.copy_board(board_state, board)
-                row = move[0]
-                col = move[1]
-                self.move_opponent(row, col, board_state, newBoard)
-                if (depth+1) == BOARD_DEPTH:
-                    score = self.evaluationFunction(newBoard, board_state, move)
-                else:
-                    score = self.max_value(board_state, depth+1, newBoard)
+                score = self.value(state, depth+1)
+            state.unmake_move()
 
             v = v + score
 
-        if len(legalMoves) == 0:
-            return 1
-        else:
-            return float(v) / float(len(legalMoves))
-        #return 1
-
-    def evaluationFunction(self, board, board_state, move):
-        return self.get_total_cells(board_state.turn, board_state, board)
-        # Corner
-        #if (move[0] == 0 or move[0] == 1) and (move[1] == 0 or move[1] == 1):
-        #    return 100
-
-    def betterEvaluationFunction(self, board, board_state, move):
-        blackPieces = self.get_total_cells(board_state.turn, board_state, board)
-        whitePices = self.get_total_cells(board_state._opposite_turn(board_state.turn), board_state, board)
-        blackMoves = len(self.get_possible_moves(board_state,board))
-        whiteMoves = len(self.get_opponent_moves(board_state, board))
-
-        # Number of pieces on board
-        p = 0
-        if blackPieces > whitePices:
-            p = 100*(float(blackPieces)/float(blackPieces+whitePices))
-        if whitePices > blackPieces:
-            p = -100*(float(whitePices)/float(blackPieces+whitePices))
-
-        # Number of moves
-        m = 0
-        if blackMoves > whiteMoves:
-            m = 100*(float(blackMoves)/float(blackMoves+whiteMoves))
-        if whiteMoves > blackMoves:
-            m = -100 * (float(whiteMoves) / float(blackMoves + whiteMoves))
-
-
-        # Corner occupancy
-        blackCorner = 0
-        whiteCorner = 0
-        if board[0][0] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[0][0] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[0][DEFAULT_COLS-1] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[0][DEFAULT_COLS-1] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[DEFAULT_ROWS-1][0] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[DEFAULT_ROWS-1][0] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        if board[DEFAULT_ROWS-1][DEFAULT_COLS-1] == board_state.turn:
-            blackCorner = blackCorner + 1
-        if board[DEFAULT_ROWS-1][DEFAULT_COLS-1] == board_state._opposite_turn(board_state.turn):
-            whiteCorner = whiteCorner + 1
-
-        c = (25*blackCorner) - (25*whiteCorner)
-
-        return p + m + c
-
-
-
-
-    def get_total_cells(self, turn: str, board_state, board) -> int:
-        total = 0
-        for row in range(board_state.rows):
-            for col in range(board_state.cols):
-                if board[row][col] == turn:
-                    total += 1
-        return total
-
-    def is_game_over(self, board_state, board) -> bool:
-        return self.can_move(BLACK, board_state, board) == False and self.can_move(WHITE, board_state, board) == False
-
-    def copy_state(self, board_state):
-        board = []
-        for row in range(board_state.rows):
-            new_row = []
-            for col in range(board_state.cols):
-                new_row.append(board_state.current_board[row][col])
-            board.append(new_row)
-        return board
-
-    def copy_board(self, board_state, oldBoard):
-        board = []
-        for row in range(board_state.rows):
-            new_row = []
-            for col in range(board_state.cols):
-                new_row.append(oldBoard[row][col])
-            board.append(new_row)
-        return board
-
-    def get_possible_moves(self, board_state, board):
-        self.can_move(board_state.turn, board_state, board)
-        return self.possible_moves
-
-    def get_opponent_moves(self, board_state, board):
-        self.can_move(board_state._opposite_turn(board_state.turn), board_state, board)
-        return self.possible_moves
-
-    def move(self, row: int, col: int, board_state, board) -> None:
-        self._require_valid_empty_space_to_move(row, col, board_state, board)
-        possible_directions = self._adjacent_opposite_color_directions(row, col, board_state.turn, board_state, board)
-
-        next_turn = board_state.turn
-        for direction in possible_directions:
-            if self._is_valid_directional_move(row, col, direction[0], direction[1], board_state.turn, board_state, board):
-                next_turn = board_state._opposite_turn(board_state.turn)
-            self._convert_adjacent_cells_in_direction(row, col, direction[0], direction[1], board_state.turn, board_state, board)
-
-        if next_turn != board_state.turn:
-            board[row][col] = board_state.turn
-          #  if self.can_move(next_turn, board_state, board):
-          #      board_state.switch_turn()
-        else:
-            raise InvalidMoveException()
-
-    def move_opponent(self, row: int, col: int, board_state, board) -> None:
-        self._require_valid_empty_space_to_move(row, col, board_state, board)
-        possible_directions = self._adjacent_opposite_color_directions(row, col, board_state._opposite_turn(board_state.turn), board_state, board)
-
-        next_turn = board_state.turn
-        for direction in possible_directions:
-            if self._is_valid_directional_move(row, col, direction[0], direction[1], board_state._opposite_turn(board_state.turn), board_state,
-                                               board):
-                next_turn = board_state.turn
-            self._convert_adjacent_cells_in_direction(row, col, direction[0], direction[1], board_state._opposite_turn(board_state.turn),
-                                                      board_state, board)
-
-        if next_turn != board_state._opposite_turn(board_state.turn):
-            board[row][col] = board_state._opposite_turn(board_state.turn)
-        #  if self.can_move(next_turn, board_state, board):
-        #      board_state.switch_turn()
-        else:
-            raise InvalidMoveException()
-
-    def can_move(self, turn: str, board_state, board) -> bool:
-        can_move = False
-        new_possible_moves = []
-        for row in range(board_state.rows):
-            for col in range(board_state.cols):
-                if board[row][col] == NONE:
-                    for direction in self._adjacent_opposite_color_directions(row, col, turn, board_state, board):
-                        if self._is_valid_directional_move(row, col, direction[0], direction[1], turn, board_state, board):
-                            new_possible_moves.append([row, col])
-                            can_move = True
-        self.possible_moves = new_possible_moves
-        return can_move
-
-    def _require_valid_empty_space_to_move(self, row: int, col: int, board_state, board) -> bool:
-        ''' In order to move, the specified cell space must be within board boundaries
-            AND the cell has to be empty '''
-
-        if self._is_valid_cell(row, col, board_state) and self._cell_color(row, col, board_state, board) != NONE:
-            raise InvalidMoveException()
-
-    def _is_valid_cell(self, row: int, col: int, board_state) -> bool:
-        ''' Returns True if the given cell move position is invalid due to
-            position (out of bounds) '''
-        return self._is_valid_row_number(row, board_state) and self._is_valid_col_number(col, board_state)
-
-    def _is_valid_row_number(self, row: int, board_state) -> bool:
-        ''' Returns True if the given row number is valid; False otherwise '''
-        return 0 <= row < board_state.rows
-
-    def _is_valid_col_number(self, col: int, board_state) -> bool:
-        ''' Returns True if the given col number is valid; False otherwise '''
-        return 0 <= col < board_state.cols
-
-
-    def _cell_color(self, row: int, col: int, board_state, board) -> str:
-        ''' Determines the color/player of the specified cell '''
-        return board[row][col]
-
-    def _adjacent_opposite_color_directions(self, row: int, col: int, turn: str, board_state, board) -> [tuple]:
-        dir_list = []
-        for rowdelta in range(-1, 2):
-            for coldelta in range(-1, 2):
-                if self._is_valid_cell(row+rowdelta, col + coldelta, board_state):
-                    if board[row + rowdelta][col + coldelta] == board_state._opposite_turn(turn):
-                        dir_list.append((rowdelta, coldelta))
-        return dir_list
-
-    def _is_valid_directional_move(self, row: int, col: int, rowdelta: int, coldelta: int, turn: str, board_state, board) -> bool:
-        current_row = row + rowdelta
-        current_col = col + coldelta
-
-        last_cell_color = board_state._opposite_turn(turn)
-
-        while True:
-            # Immediately return false if the board reaches the end (b/c there's no blank
-            # space for the cell to sandwich the other colored cell(s)
-            if not self._is_valid_cell(current_row, current_col, board_state):
-                break
-            if self._cell_color(current_row, current_col, board_state, board) == NONE:
-                break
-            if self._cell_color(current_row, current_col, board_state, board) == turn:
-                last_cell_color = turn
+        return float(v) / float(len(legalMoves))
+
+    def _evaluate(self, state):
+        ''' Returns evaluationFunction(), or the pattern evaluation read from
+            the incremental features, for the agent's color '''
+        if self._pattern_evaluator is None:
+            return self.evaluationFunction(state)
+        score = state.get_features().evaluate(state.turn == BLACK, state.get_empty_cells())
+        if state.victory_type == LEAST_CELLS:
+            score = -score
+        if state.turn == self._color:
+            return score
+        return -score
+
+    def _terminal_value(self, state):
+        ''' Scores a finished game for the agent's color: its disc count, or
+            with pattern tables a win or loss beyond any evaluation '''
+        if self._pattern_evaluator is None:
+            return state.get_total_cells(self._color)
+        player, opponent = state.get_bitboards()
+        result = othello_rules.score(player, opponent, state.victory_type)
+        if state.turn != self._color:
+            result = -result
+        if result > 0:
+            return WIN_SCORE + result
+        if result < 0:
+            return -WIN_SCORE + result
+        return 0
+
+    def evaluationFunction(self, state):
+        return state.get_total_cells(self._color)
+
+    def betterEvaluationFunction(self, state):
+        return _better_evaluation(state, self._color)
+
+
+class MCTSAgent:
+    def __init__(self, iterations=None, time_budget_ms=None, selection=UCT,
+                 exploration=None, max_nodes=MCTS_MAX_NODES, take_corners=True,
+                 reuse_tree=True, leaf_playouts=1, seed=None):
+        self.possible_moves = []
+        # The search stops after iterations playouts or when the time budget
+        # runs out, whichever comes first. With neither set it runs
+        # MCTS_ITERATIONS playouts.
+        self.iterations = iterations
+        self.time_budget_ms = time_budget_ms
+        # UCT picks children by win rate plus an exploration bonus; PUCT
+        # scales the bonus by a prior from the static square weights, so
+        # corners are tried early and X-squares late.
+        if selection not in (UCT, PUCT):
+            raise ValueError('unknown selection rule: ' + str(selection))
+        self.selection = selection
+        if exploration is None:
+            exploration = UCT_EXPLORATION if selection == UCT else PUCT_EXPLORATION
+        self.exploration = exploration
+        # The tree never grows past max_nodes nodes; after that, leaves are
+        # only played out, not expanded.
+        self.max_nodes = max_nodes
+        # Playouts are random, except that a legal corner is always taken
+        self.take_corners = take_corners
+        # Playouts run from every new leaf: more of them give fewer,
+        # better-informed leaves. From othello_mcts.BATCH_MIN_PLAYOUTS on they
+        # are played as one vectorized batch (leaf parallelism), which is
+        # cheaper per playout than playing them one after another; smaller
+        # counts are played one after another, as a batch would be slower.
+        self.leaf_playouts = leaf_playouts
+        # Keep the part of the tree below our move and the opponent's reply
+        # for the next search
+        self.reuse_tree = reuse_tree
+        self.nodes = 0
+        self.playouts = 0
+        self.reused_visits = 0
+        self.last_result = None
+        self._generator = random.Random(seed)
+        self._tree = None
+        self._settings = None
+
+    def get_next_action(self, board_state, time_budget_ms=None):
+        return self.search(board_state, time_budget_ms).move
+
+    def search(self, board_state, time_budget_ms=None) -> SearchResult:
+        ''' Runs playouts from the game's current position until the budget
+            is spent and returns a SearchResult. The score is the win rate
+            of the chosen move, nodes is the number of iterations (each
+            running leaf_playouts playouts). '''
+        start = time.perf_counter()
+        if time_budget_ms is None:
+            time_budget_ms = self.time_budget_ms
+        iterations = self.iterations
+        if iterations is None and time_budget_ms is None:
+            iterations = MCTS_ITERATIONS
+        deadline = None
+        if time_budget_ms is not None:
+            deadline = start + time_budget_ms / 1000.0
+
+        geometry = board_state.get_geometry()
+        victory_type = board_state.victory_type
+        tree = self._root_tree(board_state)
+        self.nodes = 0
+        self.playouts = 0
+        depth_reached = 0
+
+        while iterations is None or self.nodes < iterations:
+            if deadline is not None and self.nodes and time.perf_counter() > deadline:
                 break
-
-            current_row += rowdelta
-            current_col += coldelta
-
-        return last_cell_color == turn
-
-    def _convert_adjacent_cells_in_direction(self, row: int, col: int,
-                                             rowdelta: int, coldelta: int, turn: str, board_state, board) -> None:
-        if self._is_valid_directional_move(row, col, rowdelta, coldelta, turn, board_state, board):
-            current_row = row + rowdelta
-            current_col = col + coldelta
-
-            while self._cell_color(current_row, current_col, board_state, board) == board_state._opposite_turn(turn):
-                self._flip_cell(current_row, current_col, board_state, board)
-                current_row += rowdelta
-                current_col += coldelta
-
-    def _flip_cell(self, row: int, col: int, board_state, board) -> None:
-        ''' Flips the specified cell over to the other color '''
-        board[row][col] = board_state._opposite_turn(board[row][col])
-
-
-
-
-
+            self.nodes += 1
+
+            # Selection
+            node = 0
+            depth = 0
+            while tree.child_count[node]:
+                node = self._select(tree, node)
+                depth += 1
+
+            # Expansion: a leaf gets its children on its second visit (the root
+            # on its first), and one of them is played out
+            if (not tree.terminal[node] and (tree.visits[node] or node == 0)
+                    and tree.expand(node, geometry)):
+                node = self._select(tree, node)
+                depth += 1
+            depth_reached = max(depth_reached, depth)
+
+            # Simulation
+            playouts = self.leaf_playouts
+            if tree.terminal[node]:
+                result = playouts * othello_mcts.final_result(tree.player[node], tree.opponent[node],
+                                                              tree.turn[node], victory_type)
+            elif playouts == 1:
+                result = othello_mcts.playout(geometry, tree.player[node], tree.opponent[node],
+                                              tree.turn[node], victory_type, self._generator,
+                                              self.take_corners)
+            else:
+                result = othello_mcts.batch_playouts(geometry, tree.player[node], tree.opponent[node],
+                                                     tree.turn[node], victory_type, playouts,
+                                                     self._generator, self.take_corners)
+            self.playouts += playouts
+
+            # Backpropagation
+            while node != othello_mcts.NO_NODE:
+                tree.visits[node] += playouts
+                tree.wins[node] += result if tree.mover[node] == othello_mcts.BLACK else playouts - result
+                node = tree.parent[node]
+
+        best = self._most_visited(tree, 0)
+        pv = []
+        node = best
+        while node != othello_mcts.NO_NODE:
+            pv.append(list(geometry.position(tree.move[node])))
+            node = self._most_visited(tree, node)
+
+        self.last_result = SearchResult(pv[0], tree.wins[best] / max(tree.visits[best], 1), pv,
+                                        self.nodes, depth_reached, time.perf_counter() - start)
+        return self.last_result
+
+    def root_statistics(self) -> [(int, int, float)]:
+        ''' Returns (square, visits, wins) for every move at the root of the
+            last search, wins counted for the player to move there '''
+        tree = self._tree
+        if tree is None:
+            return []
+        return [(tree.move[child], tree.visits[child], tree.wins[child])
+                for child in tree.children(0)]
+
+    def _root_tree(self, board_state):
+        ''' Returns the tree to search from: the subtree of the last search
+            holding the current position if there is one, or a new tree '''
+        player, opponent = board_state.get_bitboards()
+        turn = othello_mcts.BLACK if board_state.get_turn() == BLACK else othello_mcts.WHITE
+        settings = (board_state.get_rows(), board_state.get_columns(), board_state.victory_type)
+        self.reused_visits = 0
+
+        if self.reuse_tree and self._tree is not None and self._settings == settings:
+            node = self._tree.find(player, opponent, turn, 2)
+            if node == 0:
+                self.reused_visits = self._tree.visits[0]
+                return self._tree
+            if node != othello_mcts.NO_NODE:
+                self._tree = self._tree.subtree(node)
+                self.reused_visits = self._tree.visits[0]
+                return self._tree
+
+        self._settings = settings
+        self._tree = othello_mcts.SearchTree(self.max_nodes)
+        self._tree.add_node(othello_mcts.NO_NODE, othello_mcts.NO_NODE, player, opponent,
+                            turn, 1 - turn, False)
+        return self._tree
+
+    def _select(self, tree, node):
+        ''' Returns the child of the node to descend into '''
+        parent_visits = tree.visits[node]
+        exploration = self.exploration
+        best = None
+        best_value = -INFINITY
+        if self.selection == UCT:
+            log_visits = math.log(max(parent_visits, 1))
+            for child in tree.children(node):
+                visits = tree.visits[child]
+                if visits == 0:
+                    return child
+                value = tree.wins[child] / visits + exploration * math.sqrt(log_visits / visits)
+                if value > best_value:
+                    best, best_value = child, value
+        else:
+            root_visits = math.sqrt(parent_visits)
+            for child in tree.children(node):
+                visits = tree.visits[child]
+                quality = tree.wins[child] / visits if visits else 0.5
+                value = quality + exploration * tree.prior[child] * root_visits / (1 + visits)
+                if value > best_value:
+                    best, best_value = child, value
+        return best
+
+    def _most_visited(self, tree, node):
+        ''' Returns the node's most visited child, or NO_NODE for a leaf '''
+        best = othello_mcts.NO_NODE
+        for child in tree.children(node):
+            if best == othello_mcts.NO_NODE or tree.visits[child] > tree.visits[best]:
+                best = child
+        return best
+
+
+def _evaluator_argument(evaluator):
+    ''' Checks an agent's evaluator argument, loading the tables of a weights
+        file given by its path '''
+    if isinstance(evaluator, str) and evaluator != PATTERN_EVALUATOR:
+        evaluator = othello_eval.load_evaluator(evaluator)
+    if evaluator is not None and evaluator != PATTERN_EVALUATOR and not hasattr(evaluator, 'evaluate'):
+        raise ValueError('unknown evaluator: ' + str(evaluator))
+    return evaluator
+
+
+def _board_evaluator(evaluator, state):
+    ''' Returns the PatternEvaluator to score the state's board with, or None
+        for an agent without pattern tables '''
+    if evaluator is None:
+        return None
+    if evaluator == PATTERN_EVALUATOR:
+        return othello_eval.evaluator(state.get_rows(), state.get_columns())
+    if (evaluator.rows, evaluator.cols) != (state.get_rows(), state.get_columns()):
+        raise ValueError('the evaluator was built for a different board size')
+    return evaluator
+
+
+def _better_evaluation(state, color):
+    geometry = state.get_geometry()
+    me, them = state.get_bitboards()
+    if state.turn != color:
+        me, them = them, me
+    blackPieces = othello_bitboard.count(me)
+    whitePices = othello_bitboard.count(them)
+    blackMoves = othello_bitboard.count(othello_rules.legal_moves(geometry, me, them))
+    whiteMoves = othello_bitboard.count(othello_rules.legal_moves(geometry, them, me))
+
+    # Number of pieces on board
+    p = 0
+    if blackPieces > whitePices:
+        p = 100*(float(blackPieces)/float(blackPieces+whitePices))
+    if whitePices > blackPieces:
+        p = -100*(float(whitePices)/float(blackPieces+whitePices))
+
+    # Number of moves
+    m = 0
+    if blackMoves > whiteMoves:
+        m = 100*(float(blackMoves)/float(blackMoves+whiteMoves))
+    if whiteMoves > blackMoves:
+        m = -100 * (float(whiteMoves) / float(blackMoves + whiteMoves))
+
+
+    # Corner occupancy
+    corners = ((1 << geometry.square(0, 0))
+               | (1 << geometry.square(0, geometry.cols-1))
+               | (1 << geometry.square(geometry.rows-1, 0))
+               | (1 << geometry.square(geometry.rows-1, geometry.cols-1)))
+    blackCorner = othello_bitboard.count(me & corners)
+    whiteCorner = othello_bitboard.count(them & corners)
+
+    c = (25*blackCorner) - (25*whiteCorner)
+
+    return p + m + c
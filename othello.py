@@ -1,11 +1,16 @@
 #  Kevan Hong-Nhan Nguyen 71632979.  ICS 32 Lab sec 9.  Project #5.
 
+import othello_bitboard
+import othello_rules
+import othello_zobrist
+
 # Game Constants
 NONE = '.'
 BLACK = 'B'
 WHITE = 'W'
 MOST_CELLS = 'M'
 LEAST_CELLS = 'L'
+OPPOSITE_TURN = {BLACK: WHITE, WHITE: BLACK}
 
 # An Exception that is raised every time an invalid move occurs
 class InvalidMoveException(Exception):
@@ -18,54 +23,52 @@ class OthelloGame:
     '''
     Class that creates the Othello game and deals with all its game logic
     '''
-    
+
     # Initialize the game through the __init__() function.
-    # Within the function we initialize the game's board
-    # by assigning it to a 2D list of strings through the
-    # _new_game_board() function with its corresponding
-    # arguments (to be received from the user in the user interface)
+    # The board itself is kept as two bitboards (see othello_bitboard):
+    # one integer mask for the player whose turn it is and one for the
+    # opponent. The 2D list of strings that the GUI and agents read is
+    # only built on demand by get_board().
+    #
+    # Alongside the bitboards the game keeps each side's disc count and a
+    # cached mask of each side's legal moves (None until first needed).
+    # make_move() and unmake_move() update them incrementally, so score,
+    # move and game-over queries never rescan the board. The position's
+    # Zobrist key (see othello_zobrist) is maintained the same way.
     def __init__(self, rows: int, cols: int, turn: str,
                  top_left: str, victory_type: str):
         ''' Initialize all of the games settings and creates the board. '''
         self.rows = rows
         self.cols = cols
-        self.current_board = self._new_game_board(rows, cols, top_left)
         self.turn = turn
         self.victory_type = victory_type
         self.possible_moves = []
 
-
-    def _new_game_board(self, rows: int, cols: int, top_left: str) -> [[str]]:
-        ''' Creates the Othello Game board with specified dimensions. '''
-        board =[]
-
-        # Create an empty board
-        for row in range(rows):
-            board.append([])
-            for col in range(cols):
-                board[-1].append(NONE)
-
-        # Initialize the 4 game pieces in the center
-        board[rows // 2 - 1][cols // 2 - 1] = top_left
-        board[rows // 2 - 1][cols // 2] = self._opposite_turn(top_left)
-        board[rows // 2][cols // 2 - 1] = self._opposite_turn(top_left)
-        board[rows // 2][cols // 2] = top_left
-        
-        return board
-
-
-    # def is_valid_move(self, row, column):
-    #     if self.current_board[row][column]
-
-
-    # def get_possible_moves(self):
-    #     moves = []
-    #     for row in range(self.rows):
-    #         for col in range(self.cols):
-    #             if self.is_valid_move(row, col):
-    #                 moves.append([row, col])
-    #
-    #     return moves
+        self._geometry = othello_bitboard.geometry(rows, cols)
+        self._zobrist = othello_zobrist.keys(rows, cols)
+        black, white = self._new_game_bitboards(rows, cols, top_left)
+        if turn == BLACK:
+            self._player, self._opponent = black, white
+        else:
+            self._player, self._opponent = white, black
+        self._board = None
+        self._undo_stack = []
+        self._features = None
+        self._reset_caches()
+
+
+    def _new_game_bitboards(self, rows: int, cols: int, top_left: str) -> (int, int):
+        ''' Creates the black and white bitboards of a new game with the
+            4 game pieces in the center. '''
+        top_left_cells = ((1 << self._geometry.square(rows // 2 - 1, cols // 2 - 1))
+                          | (1 << self._geometry.square(rows // 2, cols // 2)))
+        other_cells = ((1 << self._geometry.square(rows // 2 - 1, cols // 2))
+                       | (1 << self._geometry.square(rows // 2, cols // 2 - 1)))
+
+        if top_left == BLACK:
+            return top_left_cells, other_cells
+        else:
+            return other_cells, top_left_cells
 
 
     def get_possible_moves(self):
@@ -73,9 +76,9 @@ class OthelloGame:
         return self.possible_moves
 
 
-    # This is the meat of the game logic. I define making a move through the
-    # move() function, and within it are broken down helper functions that
-    # make the code more reusable and the move() function more readable.
+    # This is the meat of the game logic. A move is validated and played
+    # through the shared rules kernel (othello_rules), the same code the
+    # search agents use, and the move is invalid if nothing flips.
     def move(self, row: int, col: int) -> None:
         ''' Attempts to make a move at given row/col position.
             Current player/turn is the one that makes the move.
@@ -86,99 +89,139 @@ class OthelloGame:
         # Check to see if the move is in a valid empty space
         # within the board's boundary
         self._require_valid_empty_space_to_move(row, col)
+        self.make_move(self._geometry.square(row, col))
+
+
+    # make_move() and unmake_move() are the in-place move API used by the search
+    # agents. Moves are square indices (row * cols + col). Each move pushes the
+    # square, the flipped discs, whether the turn switched and the cached counts
+    # and legal moves from before the move onto an undo stack, so a search can
+    # walk the game tree on a single OthelloGame without ever copying the board.
+    def make_move(self, square: int) -> None:
+        ''' Plays the current player's move on the given square index and
+            records it on the undo stack. Raises InvalidMoveException if
+            the move is invalid. '''
+        player, opponent, flipped = othello_rules.apply_move(
+            self._geometry, self._player, self._opponent, square)
+        if not flipped:
+            raise InvalidMoveException()
 
-
-        # Retrieve a list of possible directions in which a valid move can occur.
-        # (looks up to all 8 possible directions surrounding the move/cell)
-        # The list only contains the directions where the opposite cell's color is
-        # adjacent / touching the current cell. So it's not definite that the entire
-        # list will return directions in which the cells in line of direction can be flipped.
-        possible_directions = self._adjacent_opposite_color_directions(row, col, self.turn)
-
-
-        # After having the list of possible directions, we begin keeping track of when a possible
-        # valid move in a direction has been completed. The variable "next_turn" is used at the end
-        # of this function to determine if the player switches turn, which only occurs if the
-        # move is valid.
-        #
-        # The for loop looks through all of the possible directions, and if a direction is capable
-        # of making a valid move/flip, then proceed into flipping the cells in that line of direction
-        # and assign "next_turn" to the opposite turn to switch turns at the very end
-        next_turn = self.turn
-        for direction in possible_directions:
-            if self._is_valid_directional_move(row, col, direction[0], direction[1], self.turn):
-                next_turn = self._opposite_turn(self.turn)
-            self._convert_adjacent_cells_in_direction(row, col, direction[0], direction[1], self.turn)
-
-
-        # Here we decide if we can finally place down the current move and whether or not
-        # we can switch turns. We decide to switch turns if the current player has made a valid move
-        # AND the opposite player must have the option to be able to move in at least one empty cell
-        # space. If the opposite player can't move in at least one empty cell space after the current
-        # player has gone, we do not switch turns and the current player goes again for the second
-        # time in a row.
-        #
-        # Ultimately, if the move is not valid, then raise an InvalidMoveException()
-        if next_turn != self.turn:
-            self.current_board[row][col] = self.turn
-            if self.can_move(next_turn):
-                self.switch_turn()
+        undo = (square, flipped, self._player_count, self._opponent_count,
+                self._player_moves, self._opponent_moves, self._key)
+        flipped_count = othello_bitboard.count(flipped)
+        player_count = self._player_count + flipped_count + 1
+        opponent_count = self._opponent_count - flipped_count
+        if self.turn == BLACK:
+            key = self._key ^ self._zobrist.black[square]
         else:
-            raise InvalidMoveException()
+            key = self._key ^ self._zobrist.white[square]
+        key ^= self._zobrist.flip_key(flipped)
+
+        # We switch turns only if the opposite player has the option to move
+        # in at least one empty cell space. Otherwise the current player goes
+        # again for the second time in a row. Either way the opposite player's
+        # moves have just been generated, so they go straight into the cache.
+        opponent_moves = othello_rules.legal_moves(self._geometry, opponent, player)
+        switched = opponent_moves != 0
+        if switched:
+            self._player, self._opponent = opponent, player
+            self._player_count, self._opponent_count = opponent_count, player_count
+            self._player_moves, self._opponent_moves = opponent_moves, None
+            self.turn = OPPOSITE_TURN[self.turn]
+            key ^= self._zobrist.white_to_move
+        else:
+            self._player, self._opponent = player, opponent
+            self._player_count, self._opponent_count = player_count, opponent_count
+            self._player_moves, self._opponent_moves = None, 0
+        self._key = key
+        self._undo_stack.append((switched,) + undo)
+        self._board = None
+        if self._features is not None:
+            black_moved = switched == (self.turn == WHITE)
+            self._features.update(black_moved, square, flipped, *self._masks_for(BLACK))
+
+
+    def unmake_move(self) -> None:
+        ''' Takes back the last move made with make_move() or move() '''
+        (switched, square, flipped, self._player_count, self._opponent_count,
+         self._player_moves, self._opponent_moves, self._key) = self._undo_stack.pop()
+        if switched:
+            self.turn = OPPOSITE_TURN[self.turn]
+            mover, other = self._opponent, self._player
+        else:
+            mover, other = self._player, self._opponent
+        self._player, self._opponent = othello_rules.undo_move(mover, other, square, flipped)
+        self._board = None
+        if self._features is not None:
+            self._features.undo()
+
+
+    def legal_squares(self) -> [int]:
+        ''' Returns the square indices where the current player can move '''
+        return othello_bitboard.squares(self._legal_moves())
+
+
+    def get_undo_depth(self) -> int:
+        ''' Returns how many moves on the undo stack can still be taken back '''
+        return len(self._undo_stack)
 
 
-    def _is_valid_directional_move(self, row: int, col: int, rowdelta: int, coldelta: int, turn: str) -> bool:
-        ''' Given a move at specified row/col, checks in the given direction to see if
-            a valid move can be made. Returns True if it can; False otherwise.
-            Only supposed to be used in conjunction with _adjacent_opposite_color_directions()'''
-        current_row = row + rowdelta
-        current_col = col + coldelta
-
-        last_cell_color = self._opposite_turn(turn)
-
-        while True:
-            # Immediately return false if the board reaches the end (b/c there's no blank
-            # space for the cell to sandwich the other colored cell(s)
-            if not self._is_valid_cell(current_row, current_col):
-                break
-            if self._cell_color(current_row, current_col) == NONE:
-                break           
-            if self._cell_color(current_row, current_col) == turn:
-                last_cell_color = turn
-                break
-
-            current_row += rowdelta
-            current_col += coldelta
-            
-        return last_cell_color == turn
-
-
-    def _adjacent_opposite_color_directions(self, row: int, col: int, turn: str) -> [tuple]:
-        ''' Looks up to a possible of 8 directions surrounding the given move. If any of the
-            move's surrounding cells is the opposite color of the move itself, then record
-            the direction it is in and store it in a list of tuples [(rowdelta, coldelta)].
-            Return the list of the directions at the end. '''
-        dir_list = []
-        for rowdelta in range(-1, 2):
-            for coldelta in range(-1, 2):
-                if self._is_valid_cell(row+rowdelta, col + coldelta):
-                    if self.current_board[row + rowdelta][col + coldelta] == self._opposite_turn(turn):
-                        dir_list.append((rowdelta, coldelta))
-        return dir_list
-           
-
-    def _convert_adjacent_cells_in_direction(self, row: int, col: int,
-                                             rowdelta: int, coldelta: int, turn: str) -> None:
-        ''' If it can, converts all the adjacent/contiguous cells on a turn in
-            a given direction until it finally reaches the specified cell's original color '''
-        if self._is_valid_directional_move(row, col, rowdelta, coldelta, turn):
-            current_row = row + rowdelta
-            current_col = col + coldelta
-            
-            while self._cell_color(current_row, current_col) == self._opposite_turn(turn):
-                self._flip_cell(current_row, current_col)
-                current_row += rowdelta
-                current_col += coldelta
+    def copy(self) -> 'OthelloGame':
+        ''' Returns an independent copy of the game with an empty undo stack.
+            Attached features are not copied. '''
+        game = object.__new__(OthelloGame)
+        game.__dict__.update(self.__dict__)
+        game.possible_moves = []
+        game._undo_stack = []
+        game._features = None
+        return game
+
+
+    # Incremental evaluation features (othello_eval.IncrementalFeatures) can
+    # be attached to a game; make_move() and unmake_move() then keep them up
+    # to date, so a search reads them at its leaves instead of recomputing.
+    def attach_features(self, features) -> None:
+        ''' Attaches the features to the game and computes them for the
+            current position. None detaches them. '''
+        self._features = features
+        if features is not None:
+            features.reset(*self._masks_for(BLACK))
+
+
+    def get_features(self):
+        ''' Returns the attached features, or None '''
+        return self._features
+
+
+    # A position is the tuple (rows, cols, turn, victory_type, black, white),
+    # where black and white are bitboards. It is small and picklable, which is
+    # how positions are handed to worker processes and stored in files.
+    def get_position(self) -> tuple:
+        ''' Returns the current position as a plain tuple '''
+        black, white = self._masks_for(BLACK)
+        return (self.rows, self.cols, self.turn, self.victory_type, black, white)
+
+
+    @classmethod
+    def from_position(cls, position: tuple) -> 'OthelloGame':
+        ''' Creates a game that starts from the given position tuple '''
+        rows, cols, turn, victory_type, black, white = position
+        game = cls(rows, cols, turn, BLACK, victory_type)
+        game.load_position(black, white, turn)
+        return game
+
+
+    def load_position(self, black: int, white: int, turn: str) -> None:
+        ''' Replaces the board with the given bitboards and player to move.
+            The undo stack is cleared. '''
+        self.turn = turn
+        if turn == BLACK:
+            self._player, self._opponent = black, white
+        else:
+            self._player, self._opponent = white, black
+        self._board = None
+        self._undo_stack = []
+        self._reset_caches()
 
 
     # Functions to be used to determine if the game is over and what do when it is:
@@ -190,24 +233,20 @@ class OthelloGame:
     def is_game_over(self) -> bool:
         ''' Looks through every empty cell and determines if there are
             any valid moves left. If not, returns True; otherwise returns False '''
-        return self.can_move(BLACK) == False and self.can_move(WHITE) == False
+        return self._legal_moves() == 0 and self._opponent_legal_moves() == 0
 
 
     def can_move(self, turn: str) -> bool:
         ''' Looks at all the empty cells in the board and checks to
             see if the specified player can move in any of the cells.
             Returns True if it can move; False otherwise. '''
-        can_move = False
-        new_possible_moves = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if self.current_board[row][col] == NONE:
-                    for direction in self._adjacent_opposite_color_directions(row, col, turn):
-                        if self._is_valid_directional_move(row, col, direction[0], direction[1], turn):
-                            new_possible_moves.append([row, col])
-                            can_move = True
-        self.possible_moves = new_possible_moves
-        return can_move
+        if turn == self.turn:
+            moves = self._legal_moves()
+        else:
+            moves = self._opponent_legal_moves()
+        self.possible_moves = [list(self._geometry.position(square))
+                               for square in othello_bitboard.squares(moves)]
+        return moves != 0
 
     def return_winner(self) -> str:
         ''' Returns the winner. ONLY to be called once the game is over.
@@ -243,10 +282,46 @@ class OthelloGame:
             the other. Only to be called if the current player
             cannot move at all. '''
         self.turn = self._opposite_turn(self.turn)
+        self._player, self._opponent = self._opponent, self._player
+        self._player_count, self._opponent_count = self._opponent_count, self._player_count
+        self._player_moves, self._opponent_moves = self._opponent_moves, self._player_moves
+        self._key ^= self._zobrist.white_to_move
 
     def get_board(self) -> [[str]]:
         ''' Returns the current game's 2D board '''
-        return self.current_board
+        if self._board is None:
+            black, white = self._masks_for(BLACK)
+            board = []
+            for row in range(self.rows):
+                board.append([])
+                for col in range(self.cols):
+                    bit = 1 << self._geometry.square(row, col)
+                    if black & bit:
+                        board[-1].append(BLACK)
+                    elif white & bit:
+                        board[-1].append(WHITE)
+                    else:
+                        board[-1].append(NONE)
+            self._board = board
+        return self._board
+
+    @property
+    def current_board(self) -> [[str]]:
+        ''' The current game's 2D board (read-only view of the bitboards) '''
+        return self.get_board()
+
+    def get_geometry(self) -> othello_bitboard.BoardGeometry:
+        ''' Returns the board geometry shared with the rules kernel '''
+        return self._geometry
+
+    def get_bitboards(self) -> (int, int):
+        ''' Returns the (player, opponent) bitboards, where player is
+            the one whose turn it is '''
+        return self._player, self._opponent
+
+    def get_key(self) -> int:
+        ''' Returns the Zobrist key of the current position (side to move included) '''
+        return self._key
 
     def get_rows(self) -> int:
         ''' Returns the number of rows the game currently has '''
@@ -262,47 +337,62 @@ class OthelloGame:
 
     def get_total_cells(self, turn: str) -> int:
         ''' Returns the total cell count of the specified colored player '''
-        total = 0
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if self.current_board[row][col] == turn:
-                    total += 1
-        return total
-
+        if turn == self.turn:
+            return self._player_count
+        else:
+            return self._opponent_count
 
-    # The rest of the functions are private functions only to be used within this module
-    def _flip_cell(self, row: int, col: int) -> None:
-        ''' Flips the specified cell over to the other color '''
-        self.current_board[row][col] = self._opposite_turn(self.current_board[row][col])
+    def get_empty_cells(self) -> int:
+        ''' Returns the total count of empty cells '''
+        return self._geometry.size - self._player_count - self._opponent_count
 
 
-    def _cell_color(self, row: int, col: int) -> str:
-        ''' Determines the color/player of the specified cell '''
-        return self.current_board[row][col]
-        
+    # The rest of the functions are private functions only to be used within this module
+    def _reset_caches(self) -> None:
+        ''' Recounts the discs from the bitboards and drops the cached legal
+            moves. Must be called whenever the bitboards are replaced
+            without going through make_move() '''
+        self._player_count = othello_bitboard.count(self._player)
+        self._opponent_count = othello_bitboard.count(self._opponent)
+        self._player_moves = None
+        self._opponent_moves = None
+        black, white = self._masks_for(BLACK)
+        self._key = self._zobrist.key(black, white, self.turn == WHITE)
+        if self._features is not None:
+            self._features.reset(black, white)
+
+    def _legal_moves(self) -> int:
+        ''' Returns the (cached) mask of the current player's legal moves '''
+        if self._player_moves is None:
+            self._player_moves = othello_rules.legal_moves(self._geometry, self._player, self._opponent)
+        return self._player_moves
+
+    def _opponent_legal_moves(self) -> int:
+        ''' Returns the (cached) mask of the opposite player's legal moves '''
+        if self._opponent_moves is None:
+            self._opponent_moves = othello_rules.legal_moves(self._geometry, self._opponent, self._player)
+        return self._opponent_moves
+
+    def _masks_for(self, turn: str) -> (int, int):
+        ''' Returns the (player, opponent) bitboards as seen by the specified player '''
+        if turn == self.turn:
+            return self._player, self._opponent
+        else:
+            return self._opponent, self._player
 
     def _opposite_turn(self, turn: str) -> str:
         ''' Returns the player of the opposite player '''
-        return {BLACK: WHITE, WHITE: BLACK}[turn]
+        return OPPOSITE_TURN[turn]
 
     def _require_valid_empty_space_to_move(self, row: int, col: int) -> bool:
         ''' In order to move, the specified cell space must be within board boundaries
             AND the cell has to be empty '''
-        
-        if self._is_valid_cell(row, col) and self._cell_color(row, col) != NONE:
+        if not self._is_valid_cell(row, col):
+            raise InvalidMoveException()
+        if (self._player | self._opponent) & (1 << self._geometry.square(row, col)):
             raise InvalidMoveException()
 
     def _is_valid_cell(self, row: int, col: int) -> bool:
         ''' Returns True if the given cell move position is invalid due to
             position (out of bounds) '''
-        return self._is_valid_row_number(row) and self._is_valid_col_number(col)
-
-    def _is_valid_row_number(self, row: int) -> bool:
-        ''' Returns True if the given row number is valid; False otherwise '''
-        return 0 <= row < self.rows
-
-    def _is_valid_col_number(self, col: int) -> bool:
-        ''' Returns True if the given col number is valid; False otherwise '''
-        return 0 <= col < self.cols
-
-    
+        return self._geometry.is_valid_position(row, col)
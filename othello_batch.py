@@ -0,0 +1,266 @@
+#  Vectorized Othello rules for many boards at once.
+#
+#  The functions in othello_bitboard work on one position at a time, and every
+#  step is a Python-level operation. When thousands of independent positions
+#  have to be stepped (self-play data, Monte Carlo playouts), this module does
+#  the same work with NumPy array operations over the whole batch, so the
+#  Python overhead is paid once per batch instead of once per board.
+#
+#  Two representations are supported, both from the point of view of the side
+#  to move, like othello_rules:
+#
+#    - boolean arrays shaped (N, rows, cols), one array for player and one for
+#      opponent. Works for every board size.
+#    - packed bitboards: uint64 arrays shaped (N,), using the same bit layout
+#      as othello_bitboard (square = row * cols + col). Much faster, but only
+#      for boards of at most 64 squares.
+#
+#  Moves are square indices, one per board, with NO_MOVE (-1) for a board that
+#  does not move. A move that is not legal flips nothing and leaves its board
+#  unchanged, as with othello_rules.apply_move().
+
+import functools
+
+import numpy
+
+import othello_bitboard
+
+NO_MOVE = -1
+# Largest board that fits a packed uint64 bitboard
+PACKED_MAX_SQUARES = 64
+
+# The 8 directions as (row delta, column delta)
+DIRECTIONS = [(rowdelta, coldelta) for rowdelta in (-1, 0, 1) for coldelta in (-1, 0, 1)
+              if rowdelta or coldelta]
+
+
+# Conversions
+#
+# from_games()
+# pack()
+# unpack()
+#
+def from_games(games: list) -> (numpy.ndarray, numpy.ndarray):
+    ''' Returns the (player, opponent) boolean arrays, shaped (N, rows, cols),
+        of the current positions of a list of same-sized OthelloGames '''
+    geometry = games[0].get_geometry()
+    player = numpy.zeros((len(games), geometry.size), dtype = bool)
+    opponent = numpy.zeros((len(games), geometry.size), dtype = bool)
+    for index, game in enumerate(games):
+        game_player, game_opponent = game.get_bitboards()
+        player[index, othello_bitboard.squares(game_player)] = True
+        opponent[index, othello_bitboard.squares(game_opponent)] = True
+    shape = (len(games), geometry.rows, geometry.cols)
+    return player.reshape(shape), opponent.reshape(shape)
+
+
+def pack(boards: numpy.ndarray) -> numpy.ndarray:
+    ''' Packs boolean boards shaped (N, rows, cols) into uint64 bitboards '''
+    flat = boards.reshape(len(boards), -1)
+    if flat.shape[1] > PACKED_MAX_SQUARES:
+        raise ValueError('boards of more than 64 squares cannot be packed')
+    weights = numpy.left_shift(numpy.uint64(1), numpy.arange(flat.shape[1], dtype = numpy.uint64))
+    return numpy.bitwise_or.reduce(numpy.where(flat, weights, numpy.uint64(0)), axis = 1)
+
+
+def unpack(geometry, masks: numpy.ndarray) -> numpy.ndarray:
+    ''' Unpacks uint64 bitboards into boolean boards shaped (N, rows, cols) '''
+    bits = numpy.arange(geometry.size, dtype = numpy.uint64)
+    flat = (masks[:, None] >> bits) & numpy.uint64(1)
+    return flat.astype(bool).reshape(len(masks), geometry.rows, geometry.cols)
+
+
+def count(masks: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns the number of squares set on every board, for either
+        boolean boards or packed bitboards '''
+    if masks.dtype == bool:
+        return masks.reshape(len(masks), -1).sum(axis = 1)
+    if hasattr(numpy, 'bitwise_count'):
+        return numpy.bitwise_count(masks).astype(numpy.int64)
+    return numpy.unpackbits(masks.view(numpy.uint8)).reshape(len(masks), -1).sum(axis = 1)
+
+
+# Boolean arrays
+#
+# legal_moves()
+# flips()
+# apply_moves()
+#
+def legal_moves(player: numpy.ndarray, opponent: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns a boolean array, shaped like the boards, of every square
+        where player can move on each board '''
+    empty = ~(player | opponent)
+    moves = numpy.zeros_like(player)
+    for rowdelta, coldelta in DIRECTIONS:
+        run = _shift(player, rowdelta, coldelta) & opponent
+        while run.any():
+            run = _shift(run, rowdelta, coldelta)
+            moves |= run & empty
+            run &= opponent
+    return moves
+
+
+def flips(player: numpy.ndarray, opponent: numpy.ndarray, moves: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns the discs each board's move (a square index, or NO_MOVE)
+        would flip. A board whose move is invalid flips nothing. '''
+    move_boards = _move_boards(player.shape, moves) & ~(player | opponent)
+    flipped = numpy.zeros_like(player)
+    for rowdelta, coldelta in DIRECTIONS:
+        line = _shift(move_boards, rowdelta, coldelta) & opponent
+        run = line
+        while run.any():
+            run = _shift(run, rowdelta, coldelta) & opponent
+            line |= run
+        closed = (_shift(line, rowdelta, coldelta) & player).any(axis = (1, 2))
+        flipped |= line & closed[:, None, None]
+    return flipped
+
+
+def apply_moves(player: numpy.ndarray, opponent: numpy.ndarray,
+                moves: numpy.ndarray) -> (numpy.ndarray, numpy.ndarray, numpy.ndarray):
+    ''' Plays every board's move. Returns the new (player, opponent) boards,
+        still from the point of view of the player who moved, and the
+        flipped discs. Boards with an invalid move or NO_MOVE are unchanged. '''
+    flipped = flips(player, opponent, moves)
+    played = flipped.any(axis = (1, 2))
+    placed = _move_boards(player.shape, numpy.where(played, moves, NO_MOVE))
+    return player | flipped | placed, opponent & ~flipped, flipped
+
+
+def _shift(boards: numpy.ndarray, rowdelta: int, coldelta: int) -> numpy.ndarray:
+    ''' Moves every disc one square in the given direction; discs pushed
+        off the board are lost '''
+    rows, cols = boards.shape[1], boards.shape[2]
+    shifted = numpy.zeros_like(boards)
+    shifted[:, max(rowdelta, 0):rows + min(rowdelta, 0), max(coldelta, 0):cols + min(coldelta, 0)] = \
+        boards[:, max(-rowdelta, 0):rows - max(rowdelta, 0), max(-coldelta, 0):cols - max(coldelta, 0)]
+    return shifted
+
+
+def _move_boards(shape: tuple, moves: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns boolean boards with only each board's move square set '''
+    boards = numpy.zeros((shape[0], shape[1] * shape[2]), dtype = bool)
+    moves = numpy.asarray(moves)
+    moving = numpy.nonzero(moves >= 0)[0]
+    boards[moving, moves[moving]] = True
+    return boards.reshape(shape)
+
+
+# Packed bitboards
+#
+# legal_moves_packed()
+# flips_packed()
+# apply_moves_packed()
+#
+class PackedGeometry:
+    '''
+    A BoardGeometry's shift tables as NumPy uint64 values
+    '''
+
+    def __init__(self, geometry):
+        if geometry.size > PACKED_MAX_SQUARES:
+            raise ValueError('boards of more than 64 squares cannot be packed')
+        self.geometry = geometry
+        self.full = numpy.uint64(geometry.full)
+        self.left_shifts = [(numpy.uint64(shift), numpy.uint64(mask))
+                            for shift, mask in geometry.left_shifts]
+        self.right_shifts = [(numpy.uint64(shift), numpy.uint64(mask))
+                             for shift, mask in geometry.right_shifts]
+        # No run of opponent discs is longer than this
+        self.steps = max(geometry.rows, geometry.cols) - 2
+
+
+@functools.lru_cache(maxsize = None)
+def packed_geometry(geometry) -> PackedGeometry:
+    ''' Returns the shared PackedGeometry for a BoardGeometry '''
+    return PackedGeometry(geometry)
+
+
+def from_games_packed(games: list) -> (numpy.ndarray, numpy.ndarray):
+    ''' Returns the (player, opponent) packed bitboards of the current
+        positions of a list of same-sized OthelloGames '''
+    bitboards = [game.get_bitboards() for game in games]
+    return (numpy.array([player for player, opponent in bitboards], dtype = numpy.uint64),
+            numpy.array([opponent for player, opponent in bitboards], dtype = numpy.uint64))
+
+
+def legal_moves_packed(geometry, player: numpy.ndarray, opponent: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns the packed mask of every square where player can move on
+        each board. geometry is a BoardGeometry of at most 64 squares. '''
+    packed = packed_geometry(geometry)
+    empty = packed.full & ~(player | opponent)
+    moves = numpy.zeros_like(player)
+
+    for shift, mask in packed.left_shifts:
+        line_opponent = opponent & mask
+        run = (player << shift) & line_opponent
+        for step in range(packed.steps):
+            run |= (run << shift) & line_opponent
+        moves |= (run << shift) & empty & mask
+
+    for shift, mask in packed.right_shifts:
+        line_opponent = opponent & mask
+        run = (player >> shift) & line_opponent
+        for step in range(packed.steps):
+            run |= (run >> shift) & line_opponent
+        moves |= (run >> shift) & empty & mask
+
+    return moves
+
+
+def flips_packed(geometry, player: numpy.ndarray, opponent: numpy.ndarray,
+                 moves: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns the packed mask of discs each board's move (a square index,
+        or NO_MOVE) would flip. A board whose move is invalid flips nothing. '''
+    packed = packed_geometry(geometry)
+    move_masks = _move_masks(moves) & ~(player | opponent)
+    flipped = numpy.zeros_like(player)
+    zero = numpy.uint64(0)
+
+    for shift, mask in packed.left_shifts:
+        line_opponent = opponent & mask
+        run = (move_masks << shift) & line_opponent
+        for step in range(packed.steps):
+            run |= (run << shift) & line_opponent
+        flipped |= numpy.where((run << shift) & player & mask != 0, run, zero)
+
+    for shift, mask in packed.right_shifts:
+        line_opponent = opponent & mask
+        run = (move_masks >> shift) & line_opponent
+        for step in range(packed.steps):
+            run |= (run >> shift) & line_opponent
+        flipped |= numpy.where((run >> shift) & player & mask != 0, run, zero)
+
+    return flipped
+
+
+def apply_moves_packed(geometry, player: numpy.ndarray, opponent: numpy.ndarray,
+                       moves: numpy.ndarray) -> (numpy.ndarray, numpy.ndarray, numpy.ndarray):
+    ''' Plays every board's move on packed bitboards. Returns the new
+        (player, opponent) bitboards, still from the point of view of the
+        player who moved, and the flipped discs. Boards with an invalid move
+        or NO_MOVE are unchanged. '''
+    flipped = flips_packed(geometry, player, opponent, moves)
+    placed = numpy.where(flipped != 0, _move_masks(moves), numpy.uint64(0))
+    return player | flipped | placed, opponent & ~flipped, flipped
+
+
+def _move_masks(moves: numpy.ndarray) -> numpy.ndarray:
+    ''' Returns the single-bit mask of each board's move, 0 for NO_MOVE '''
+    moves = numpy.asarray(moves, dtype = numpy.int64)
+    return numpy.where(moves >= 0,
+                       numpy.left_shift(numpy.uint64(1), numpy.maximum(moves, 0).astype(numpy.uint64)),
+                       numpy.uint64(0))
+
+
+# Move choice
+#
+def random_moves(legal: numpy.ndarray, generator: numpy.random.Generator) -> numpy.ndarray:
+    ''' Picks a uniformly random legal square on every board, or NO_MOVE
+        where there is none. legal is a boolean array shaped (N, rows, cols)
+        or (N, squares). '''
+    flat = legal.reshape(len(legal), -1)
+    scores = generator.random(flat.shape)
+    scores[~flat] = -1.0
+    choice = scores.argmax(axis = 1)
+    return numpy.where(flat.any(axis = 1), choice, NO_MOVE)
@@ -0,0 +1,247 @@
+#  Search benchmark over a fixed corpus of positions.
+#
+#  The corpus covers every board size in SIZES, three game phases (how full
+#  the board is) and both victory types. Its positions are reached by random
+#  moves from a generator seeded with the position's name, so every run, on
+#  every machine, benchmarks the same positions. They are written into the
+#  results, and a comparison refuses positions that do not match.
+#
+#  Every agent (an agent spec, see othello_match) searches every position once
+#  with a fresh agent, so no run inherits a warm transposition table. The
+#  results give, per search: nodes, seconds, nodes per second, depth reached,
+#  the time at which each iteration of iterative deepening completed
+#  (time-to-depth), the move and the score. MCTS agents visit no nodes in
+#  that sense; their playouts and playouts per second are reported instead,
+#  in fields of their own. The results are written as JSON and can be
+#  compared with a stored baseline: speed per agent, and every position
+#  where the node or playout count, move or score changed (which a pure
+#  speed-up must not do).
+#
+#      python othello_benchmark.py --output baseline.json
+#      python othello_benchmark.py --baseline baseline.json
+#      python othello_benchmark.py --agent alphabeta:max_depth=6 --sizes 8x8 10x10 --phases midgame
+
+import argparse
+import json
+import platform
+import random
+import time
+
+import othello
+import othello_match
+
+SIZES = ((4, 4), (6, 6), (6, 10), (8, 8), (10, 10), (12, 12), (16, 16))
+# Fraction of the board filled in each phase
+PHASES = (('opening', 0.2), ('midgame', 0.5), ('endgame', 0.8))
+VICTORY_TYPES = (othello.MOST_CELLS, othello.LEAST_CELLS)
+POSITIONS_PER_PHASE = 1
+CORPUS_SEED = 'othello-benchmark-1'
+
+DEFAULT_AGENTS = ('alphabeta:max_depth=4',
+                  'alphabeta:max_depth=4,evaluator=pattern',
+                  'expectimax',
+                  'mcts:iterations=300,seed=1')
+# Node counts may differ by this fraction before a comparison reports them
+NODE_TOLERANCE = 0.0
+
+
+def corpus(sizes=SIZES, phases=PHASES, victory_types=VICTORY_TYPES,
+           per_phase: int = POSITIONS_PER_PHASE) -> [(str, tuple)]:
+    ''' Returns the benchmark positions as (name, position tuple) pairs '''
+    positions = []
+    for rows, cols in sizes:
+        for phase, filled in phases:
+            for victory_type in victory_types:
+                for number in range(per_phase):
+                    name = '{}x{}-{}-{}-{}'.format(rows, cols, phase, victory_type, number)
+                    positions.append((name, _corpus_position(name, rows, cols, filled, victory_type)))
+    return positions
+
+
+def _corpus_position(name: str, rows: int, cols: int, filled: float, victory_type: str) -> tuple:
+    ''' Plays random moves, seeded with the name, until the given fraction of
+        the board is filled, starting over whenever a game ends first '''
+    generator = random.Random(CORPUS_SEED + name)
+    discs = max(6, round(filled * rows * cols))
+    while True:
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, victory_type)
+        while not game.is_game_over() and rows * cols - game.get_empty_cells() < discs:
+            game.make_move(generator.choice(game.legal_squares()))
+        if not game.is_game_over():
+            return game.get_position()
+
+
+def benchmark_position(spec: str, position: tuple) -> dict:
+    ''' Searches one position with a fresh agent and returns the measurements '''
+    searcher = othello_match.make_agent(spec)
+    game = othello.OthelloGame.from_position(position)
+    if hasattr(searcher, 'prepare'):
+        # Table building is not part of the search being measured
+        searcher.prepare(game.get_rows(), game.get_columns())
+    if not hasattr(searcher, 'search'):
+        # Agents without search() only report their time
+        start = time.perf_counter()
+        move = searcher.get_next_action(game)
+        return {'nodes': None, 'seconds': time.perf_counter() - start, 'nps': None,
+                'playouts': None, 'pps': None,
+                'depth': None, 'time_to_depth': {}, 'move': list(move), 'score': None}
+
+    result = searcher.search(game)
+    # An MCTS result's nodes are its iterations; what it counts are playouts
+    nodes = None if hasattr(searcher, 'playouts') else result.nodes
+    playouts = getattr(searcher, 'playouts', None)
+    return {'nodes': nodes,
+            'seconds': result.elapsed,
+            'nps': _rate(nodes, result.elapsed),
+            'playouts': playouts,
+            'pps': _rate(playouts, result.elapsed),
+            'depth': result.depth,
+            'time_to_depth': {str(iteration[0]): iteration[3] for iteration in result.iterations
+                              if len(iteration) > 3},
+            'move': list(result.move),
+            'score': result.score}
+
+
+def _rate(count, seconds: float):
+    return count / seconds if count is not None and seconds > 0 else None
+
+
+def run_benchmark(specs: [str], positions: [(str, tuple)], progress=None) -> dict:
+    ''' Benchmarks every agent on every position and returns the results as
+        a JSON-ready dict. progress, if given, is called with each agent
+        spec, position name and measurement. '''
+    results = []
+    totals = {}
+    for spec in specs:
+        nodes = playouts = seconds = 0
+        for name, position in positions:
+            measurement = benchmark_position(spec, position)
+            results.append(dict(agent = spec, position = name, **measurement))
+            nodes += measurement['nodes'] or 0
+            playouts += measurement['playouts'] or 0
+            seconds += measurement['seconds']
+            if progress is not None:
+                progress(spec, name, measurement)
+        totals[spec] = {'nodes': nodes, 'seconds': seconds, 'nps': nodes / seconds if nodes and seconds else None,
+                        'playouts': playouts, 'pps': playouts / seconds if playouts and seconds else None}
+    return {'python': platform.python_version(),
+            'machine': platform.machine(),
+            'corpus': CORPUS_SEED,
+            'positions': {name: _position_json(position) for name, position in positions},
+            'results': results,
+            'totals': totals}
+
+
+def _position_json(position: tuple) -> list:
+    rows, cols, turn, victory_type, black, white = position
+    return [rows, cols, turn, victory_type, hex(black), hex(white)]
+
+
+def compare(results: dict, baseline: dict) -> [str]:
+    ''' Returns report lines comparing results with a baseline run: total
+        speed per agent, and every search whose nodes, move or score changed.
+        Positions the two runs do not share are skipped. '''
+    lines = []
+    shared = {name for name, position in results['positions'].items()
+              if baseline['positions'].get(name) == position}
+    if len(shared) < len(results['positions']):
+        lines.append('{} positions are not in the baseline and were skipped'
+                     .format(len(results['positions']) - len(shared)))
+    before = {(result['agent'], result['position']): result for result in baseline['results']}
+
+    for spec in results['totals']:
+        current = [result for result in results['results']
+                   if result['agent'] == spec and result['position'] in shared
+                   and (spec, result['position']) in before]
+        if not current:
+            lines.append('{}: not in the baseline'.format(spec))
+            continue
+        seconds = sum(result['seconds'] for result in current)
+        base_seconds = sum(before[spec, result['position']]['seconds'] for result in current)
+        counted = 'playouts' if any(result.get('playouts') is not None for result in current) else 'nodes'
+        count = sum(result.get(counted) or 0 for result in current)
+        base_count = sum(before[spec, result['position']].get(counted) or 0 for result in current)
+        lines.append('{}: {:.3f}s vs {:.3f}s ({:.2f}x), {} vs {} {}'.format(
+            spec, seconds, base_seconds, base_seconds / seconds if seconds else 0, count, base_count, counted))
+        for result in current:
+            old = before[spec, result['position']]
+            changes = []
+            for field in ('nodes', 'playouts'):
+                if (result.get(field) is not None and old.get(field) is not None
+                        and abs(result[field] - old[field]) > NODE_TOLERANCE * old[field]):
+                    changes.append('{} {} -> {}'.format(field, old[field], result[field]))
+            if result['move'] != old['move']:
+                changes.append('move {} -> {}'.format(old['move'], result['move']))
+            if result['score'] != old['score']:
+                changes.append('score {} -> {}'.format(old['score'], result['score']))
+            if changes:
+                lines.append('    {}: {}'.format(result['position'], ', '.join(changes)))
+    return lines
+
+
+def _counted(measurement: dict) -> tuple:
+    ''' Returns (count, per second, unit) of a measurement or total: its
+        playouts if it has any, else its nodes '''
+    if measurement.get('playouts'):
+        return measurement['playouts'], measurement['pps'], 'playouts'
+    return measurement['nodes'], measurement['nps'], 'nodes'
+
+
+def size_argument(text: str) -> (int, int):
+    ''' argparse type for a board size like 8x8 '''
+    try:
+        rows, cols = (int(part) for part in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('board sizes look like 8x8, not ' + repr(text))
+    if not 4 <= rows <= 16 or not 4 <= cols <= 16 or rows % 2 or cols % 2:
+        raise argparse.ArgumentTypeError('rows and columns must be even numbers from 4 to 16')
+    return rows, cols
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Benchmarks Othello search agents on a fixed set of positions.')
+    parser.add_argument('--agent', action = 'append', type = othello_match.agent_spec_argument,
+                        help = 'agent spec; repeat for several agents (default: {})'.format(', '.join(DEFAULT_AGENTS)))
+    parser.add_argument('--sizes', nargs = '+', type = size_argument, default = list(SIZES),
+                        help = 'board sizes, e.g. 8x8 6x10 (default: all)')
+    parser.add_argument('--phases', nargs = '+', choices = [phase for phase, filled in PHASES],
+                        default = [phase for phase, filled in PHASES])
+    parser.add_argument('--victory', nargs = '+', type = othello_match.victory_type_argument,
+                        default = list(VICTORY_TYPES))
+    parser.add_argument('--per-phase', type = int, default = POSITIONS_PER_PHASE,
+                        help = 'positions per size, phase and victory type')
+    parser.add_argument('--output', help = 'write the results to this JSON file')
+    parser.add_argument('--baseline', help = 'compare with the results in this JSON file')
+    parser.add_argument('--quiet', action = 'store_true', help = 'do not print every search')
+    args = parser.parse_args(argv)
+
+    positions = corpus(args.sizes, [phase for phase in PHASES if phase[0] in args.phases],
+                       args.victory, args.per_phase)
+    progress = None
+    if not args.quiet:
+        def progress(spec, name, measurement):
+            count, rate, unit = _counted(measurement)
+            print('{:45} {:22} {:>9} {:8} {:8.3f}s {:>9} {:5} depth {}  move {}  score {}'.format(
+                spec, name, str(count), unit, measurement['seconds'],
+                '-' if rate is None else int(rate), 'nps' if unit == 'nodes' else 'pps',
+                measurement['depth'], measurement['move'], measurement['score']), flush = True)
+
+    results = run_benchmark(args.agent or list(DEFAULT_AGENTS), positions, progress)
+    print()
+    for spec, total in results['totals'].items():
+        count, rate, unit = _counted(total)
+        print('{:45} {:>10} {:8} {:9.3f}s {:>9} {}'.format(
+            spec, count, unit, total['seconds'], '-' if rate is None else int(rate),
+            'nps' if unit == 'nodes' else 'pps'))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent = 1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        print()
+        print('\n'.join(compare(results, baseline)))
+
+
+if __name__ == '__main__':
+    main()
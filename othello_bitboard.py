@@ -0,0 +1,151 @@
+#  Bitboard primitives for the Othello game logic.
+#
+#  A board of any size is stored as two Python integers, one for each
+#  player. Square (row, col) is bit number row * cols + col, so the bits
+#  of a mask enumerate squares in the same raster order the old
+#  list-of-lists board was scanned in. Python integers are unbounded,
+#  which lets the same code handle every size from 4x4 up to 16x16.
+
+import functools
+
+
+class BoardGeometry:
+    '''
+    Precomputed masks and shift tables for a board with the given
+    number of rows and columns
+    '''
+
+    def __init__(self, rows: int, cols: int):
+        ''' Builds the full-board mask and the per-direction shift tables. '''
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.full = (1 << self.size) - 1
+
+        first_col = 0
+        for row in range(rows):
+            first_col |= 1 << (row * cols)
+        last_col = first_col << (cols - 1)
+
+        # Each of the 8 directions becomes a shift amount plus a mask of the
+        # squares a shifted bit may legally land on. Moving east wraps the last
+        # column onto the first column of the next row (and moving west does the
+        # opposite), so those landing squares are masked out.
+        #
+        # Left shifts (towards higher squares) and right shifts are kept in
+        # separate lists so the hot loops never branch on the shift's sign.
+        self.left_shifts = []
+        self.right_shifts = []
+        for rowdelta in range(-1, 2):
+            for coldelta in range(-1, 2):
+                if rowdelta == 0 and coldelta == 0:
+                    continue
+                mask = self.full
+                if coldelta == 1:
+                    mask &= ~first_col
+                elif coldelta == -1:
+                    mask &= ~last_col
+                amount = rowdelta * cols + coldelta
+                if amount > 0:
+                    self.left_shifts.append((amount, mask))
+                else:
+                    self.right_shifts.append((-amount, mask))
+
+    def square(self, row: int, col: int) -> int:
+        ''' Returns the square index of the given row/col position '''
+        return row * self.cols + col
+
+    def position(self, square: int) -> (int, int):
+        ''' Returns the (row, col) position of the given square index '''
+        return divmod(square, self.cols)
+
+    def is_valid_position(self, row: int, col: int) -> bool:
+        ''' Returns True if the given row/col position lies on the board '''
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+
+@functools.lru_cache(maxsize = None)
+def geometry(rows: int, cols: int) -> BoardGeometry:
+    ''' Returns the shared BoardGeometry for the given board size '''
+    return BoardGeometry(rows, cols)
+
+
+def legal_moves(geometry: BoardGeometry, player: int, opponent: int) -> int:
+    ''' Returns a mask of every empty square where player can move, i.e.
+        every square that sandwiches a line of opponent discs against
+        one of player's discs. '''
+    empty = geometry.full & ~(player | opponent)
+    moves = 0
+
+    # Grow a run of opponent discs outwards from each of player's discs;
+    # an empty square right after the run is a legal move. The loop ends
+    # as soon as every run has been broken, which on a real position is
+    # usually after two or three steps.
+    for shift, mask in geometry.left_shifts:
+        line_opponent = opponent & mask
+        line_empty = empty & mask
+        run = (player << shift) & line_opponent
+        while run:
+            run <<= shift
+            moves |= run & line_empty
+            run &= line_opponent
+
+    for shift, mask in geometry.right_shifts:
+        line_opponent = opponent & mask
+        line_empty = empty & mask
+        run = (player >> shift) & line_opponent
+        while run:
+            run >>= shift
+            moves |= run & line_empty
+            run &= line_opponent
+
+    return moves
+
+
+def flips(geometry: BoardGeometry, player: int, opponent: int, square: int) -> int:
+    ''' Returns the mask of opponent discs that would be flipped if player
+        moved to the given square. An empty mask means the move is invalid. '''
+    move = 1 << square
+    flipped = 0
+
+    for shift, mask in geometry.left_shifts:
+        line_opponent = opponent & mask
+        run = (move << shift) & line_opponent
+        line = 0
+        while run:
+            line |= run
+            run <<= shift
+            if run & player & mask:
+                flipped |= line
+                break
+            run &= line_opponent
+
+    for shift, mask in geometry.right_shifts:
+        line_opponent = opponent & mask
+        run = (move >> shift) & line_opponent
+        line = 0
+        while run:
+            line |= run
+            run >>= shift
+            if run & player & mask:
+                flipped |= line
+                break
+            run &= line_opponent
+
+    return flipped
+
+
+def squares(mask: int) -> [int]:
+    ''' Returns the square indices of every bit set in the mask, in
+        ascending (raster) order '''
+    result = []
+    while mask:
+        low = mask & -mask
+        result.append(low.bit_length() - 1)
+        mask ^= low
+    return result
+
+
+def count(mask: int) -> int:
+    ''' Returns the number of squares set in the mask '''
+    return bin(mask).count('1')
@@ -0,0 +1,356 @@
+#  Opening book.
+#
+#  A book maps positions to scored moves. It is built in memory (BookBuilder)
+#  from deep searches of the first few plies and/or from self-play games, and
+#  written to a binary file that OpeningBook reads through mmap, so a lookup
+#  touches a handful of pages and many processes using the same book share
+#  one copy of it in the page cache.
+#
+#  File layout (little-endian):
+#
+#      header   MAGIC, rows (uint16), cols (uint16), victory type (1 byte),
+#               3 bytes padding, record count (uint64)
+#      records  key (uint64), square (uint16), score (int16), depth (uint16),
+#               games (uint16), sorted by key and square
+#
+#  Positions are stored in canonical form (see othello_symmetry), seen from
+#  the side to move: the key is the Zobrist key of the canonical position with
+#  the player to move as black, and the square is the move in the canonical
+#  orientation. All the orientations of a position therefore share their
+#  records, and so do the variants of the start position: the two top_left
+#  colors are mirror images of each other and the color that moves first
+#  does not matter once the position is seen from the side to move.
+#
+#  score is the value of the move for the side to move: the search score
+#  for searched moves (depth > 0), else the average final disc difference
+#  of the games (under the book's victory type) that played it. The two are
+#  in different units and are never compared: a searched move always ranks
+#  above one only scored by games, and only searched moves report a score
+#  to the agent playing them.
+#
+#      python othello_book.py build book.bin --plies 6 --depth 6
+#      python othello_book.py build book.bin --games 500 --agent alphabeta:max_depth=4
+#      python othello_book.py build book.bin --plies 0 --records games.rec
+#      python othello_book.py show book.bin
+
+import argparse
+import bisect
+import mmap
+import struct
+
+import agent
+import othello
+import othello_parallel
+import othello_record
+import othello_rules
+import othello_symmetry
+import othello_zobrist
+
+MAGIC = b'OTHBOOK1'
+HEADER = struct.Struct('<8sHHc3xQ')
+RECORD = struct.Struct('<QHhHH')
+KEY = struct.Struct('<Q')
+
+SCORE_LIMIT = 32767
+GAMES_LIMIT = 65535
+DEFAULT_PLIES = 6
+DEFAULT_DEPTH = 4
+# Moves searched within this many points of the best move are expanded too
+DEFAULT_SPREAD = 0
+DEFAULT_GAME_PLIES = 12
+
+
+def position_key(rows: int, cols: int, player: int, opponent: int) -> (int, int):
+    ''' Returns (key, symmetry): the book key of a position with player to
+        move and the symmetry mapping it onto its canonical form '''
+    player, opponent, symmetry = othello_symmetry.canonical(rows, cols, player, opponent)
+    return othello_zobrist.keys(rows, cols).key(player, opponent, False), symmetry
+
+
+class BookBuilder:
+    '''
+    In-memory book, written to disk by write()
+    '''
+
+    def __init__(self, rows: int, cols: int, victory_type: str = othello.MOST_CELLS):
+        self.rows = rows
+        self.cols = cols
+        self.victory_type = victory_type
+        # key -> {canonical square: [score, depth, games]}
+        self.entries = {}
+
+    def __len__(self) -> int:
+        return sum(len(moves) for moves in self.entries.values())
+
+    def add_move(self, player: int, opponent: int, square: int, score: float,
+                 depth: int = 0, games: int = 0) -> None:
+        ''' Records the value of a move from the position with player to
+            move. A search result (depth > 0) replaces a shallower one; game
+            results (games > 0) are averaged with earlier games, unless the
+            move already has a search score. '''
+        key, symmetry = position_key(self.rows, self.cols, player, opponent)
+        square = othello_symmetry.transform_square(self.rows, self.cols, symmetry, square)
+        entry = self.entries.setdefault(key, {}).setdefault(square, [0, 0, 0])
+        if depth > 0:
+            if depth >= entry[1]:
+                entry[0], entry[1] = score, depth
+        elif entry[1] == 0 and games:
+            entry[0] = (entry[0] * entry[2] + score * games) / (entry[2] + games)
+        entry[2] = min(entry[2] + games, GAMES_LIMIT)
+
+    def add_game(self, game: othello.OthelloGame, squares: [int], plies: int = DEFAULT_GAME_PLIES) -> None:
+        ''' Replays the moves (square indices) from the game's position and
+            credits the first plies of them with the final result '''
+        game = game.copy()
+        played = []
+        for square in squares:
+            player, opponent = game.get_bitboards()
+            played.append((player, opponent, square, game.get_turn()))
+            game.make_move(square)
+        black, white = game.get_position()[4:]
+        result = othello_rules.score(black, white, self.victory_type)
+        for player, opponent, square, turn in played[:plies]:
+            self.add_move(player, opponent, square, result if turn == othello.BLACK else -result, games = 1)
+
+    def add_searched(self, plies: int = DEFAULT_PLIES, depth: int = DEFAULT_DEPTH,
+                     spread: int = DEFAULT_SPREAD, progress=None, **agent_kwargs) -> None:
+        ''' Scores every move of every position up to plies moves from the
+            start positions (both top_left colors) with a depth-ply
+            AlphaBetaAgent search, and goes on from the best move of each
+            position and any within spread points of it. progress, if given,
+            is called with the number of positions searched. '''
+        searcher = agent.AlphaBetaAgent(max_depth = max(depth - 1, 1), **agent_kwargs)
+        frontier = [othello.OthelloGame(self.rows, self.cols, othello.BLACK, top_left, self.victory_type)
+                    for top_left in (othello.WHITE, othello.BLACK)]
+        seen = set()
+        searched = 0
+        for ply in range(plies):
+            following = []
+            for game in frontier:
+                player, opponent = game.get_bitboards()
+                key, symmetry = position_key(self.rows, self.cols, player, opponent)
+                if key in seen or game.is_game_over():
+                    continue
+                seen.add(key)
+                scores = []
+                for square in game.legal_squares():
+                    child = game.copy()
+                    child.make_move(square)
+                    if child.is_game_over():
+                        black, white = child.get_position()[4:]
+                        score = othello_rules.score(black, white, self.victory_type)
+                        if game.get_turn() == othello.WHITE:
+                            score = -score
+                        score = _final_score(score)
+                    else:
+                        score = searcher.search(child).score
+                        if child.get_turn() != game.get_turn():
+                            score = -score
+                    score = max(-SCORE_LIMIT, min(SCORE_LIMIT, score))
+                    self.add_move(player, opponent, square, score, depth)
+                    scores.append((score, square, child))
+                searched += 1
+                if progress is not None:
+                    progress(searched)
+                best = max(score for score, square, child in scores)
+                following.extend(child for score, square, child in scores if score >= best - spread)
+            frontier = following
+
+    def write(self, path: str) -> None:
+        ''' Writes the book to a file '''
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, self.rows, self.cols, self.victory_type.encode(), len(self)))
+            for key in sorted(self.entries):
+                for square, (score, depth, games) in sorted(self.entries[key].items()):
+                    score = max(-SCORE_LIMIT, min(SCORE_LIMIT, round(score)))
+                    file.write(RECORD.pack(key, square, score, depth, games))
+
+
+class OpeningBook:
+    '''
+    Read-only view of a book file through mmap
+    '''
+
+    def __init__(self, path: str):
+        ''' Opens the book file. Raises ValueError if it is not a book. '''
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError('not an opening book: ' + path)
+        magic, self.rows, self.cols, victory_type, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.count * RECORD.size:
+            raise ValueError('not an opening book: ' + path)
+        self.victory_type = victory_type.decode()
+        self._keys = _RecordKeys(self._map, self.count)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def probe(self, player: int, opponent: int) -> [(int, int, int, int)]:
+        ''' Returns the (square, score, depth, games) records of the position
+            with player to move, squares in the position's own orientation '''
+        key, symmetry = position_key(self.rows, self.cols, player, opponent)
+        inverse = othello_symmetry.inverses(self.rows, self.cols)[symmetry]
+        moves = []
+        index = bisect.bisect_left(self._keys, key)
+        while index < self.count:
+            record_key, square, score, depth, games = RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+            if record_key != key:
+                break
+            moves.append((othello_symmetry.transform_square(self.rows, self.cols, inverse, square),
+                          score, depth, games))
+            index += 1
+        return moves
+
+    def lookup(self, game: othello.OthelloGame) -> [(int, int, int, int)]:
+        ''' Returns the book records for the game's position, or [] if there
+            are none or the book is for another board or victory type '''
+        if (game.get_rows(), game.get_columns(), game.victory_type) != (self.rows, self.cols, self.victory_type):
+            return []
+        return self.probe(*game.get_bitboards())
+
+    def best_move(self, game: othello.OthelloGame) -> (int, int, int):
+        ''' Returns (square, score, depth) of the best legal book move, or
+            None. Searched moves come first, best search score first; then
+            moves only scored by games, by their average result. score is
+            the search score, or None for a move only scored by games. '''
+        legal = game.legal_squares()
+        moves = [move for move in self.lookup(game) if move[0] in legal]
+        if not moves:
+            return None
+        square, score, depth, games = max(moves, key = lambda move: (move[2] > 0, move[1], move[3]))
+        return square, (score if depth > 0 else None), depth
+
+
+class _RecordKeys:
+    '''
+    Sequence view of the record keys, for bisect
+    '''
+
+    def __init__(self, buffer, count: int):
+        self._buffer = buffer
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index: int) -> int:
+        return KEY.unpack_from(self._buffer, HEADER.size + index * RECORD.size)[0]
+
+
+def _final_score(result: int) -> int:
+    ''' Scores a finished game like the search does: any win beats any
+        heuristic score '''
+    if result > 0:
+        return agent.WIN_SCORE + result
+    if result < 0:
+        return -agent.WIN_SCORE + result
+    return 0
+
+
+_open_books = {}
+
+
+def open_book(path: str) -> OpeningBook:
+    ''' Returns the book at path, opened once per process and shared '''
+    if path not in _open_books:
+        _open_books[path] = OpeningBook(path)
+    return _open_books[path]
+
+
+def _play_book_game(game_task: tuple) -> list:
+    ''' Worker task: plays one self-play game and returns its moves as
+        square indices '''
+    agent_class, agent_kwargs, opening = game_task
+    game = othello.OthelloGame.from_position(opening)
+    player = agent_class(**agent_kwargs)
+    squares = []
+    while not game.is_game_over():
+        row, col = player.get_next_action(game)
+        square = game.get_geometry().square(row, col)
+        game.make_move(square)
+        squares.append(square)
+    return squares
+
+
+def main(argv=None) -> None:
+    # Imported here: othello_match needs agent fully loaded, and agent loads
+    # this module for its book option
+    import othello_match
+    import othello_tournament
+
+    parser = argparse.ArgumentParser(description = 'Builds and inspects Othello opening books.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    build = commands.add_parser('build', help = 'build a book file')
+    build.add_argument('output', help = 'book file')
+    build.add_argument('--rows', type = int, default = othello_match.DEFAULT_ROWS)
+    build.add_argument('--cols', type = int, default = othello_match.DEFAULT_COLUMNS)
+    build.add_argument('--victory', type = othello_match.victory_type_argument,
+                       default = othello_match.DEFAULT_VICTORY_TYPE)
+    build.add_argument('--plies', type = int, default = DEFAULT_PLIES,
+                       help = 'search every move up to this many plies from the start (0: none)')
+    build.add_argument('--depth', type = int, default = DEFAULT_DEPTH, help = 'search depth per move')
+    build.add_argument('--spread', type = int, default = DEFAULT_SPREAD,
+                       help = 'also expand moves within this many points of the best one')
+    build.add_argument('--games', type = int, default = 0, help = 'self-play games to add')
+    build.add_argument('--game-plies', type = int, default = DEFAULT_GAME_PLIES,
+                       help = 'plies of every self-play game to add')
+    build.add_argument('--agent', type = othello_match.agent_spec_argument, default = 'alphabeta:max_depth=4',
+                       help = 'agent spec for the self-play games')
+    build.add_argument('--opening-plies', type = int, default = 2,
+                       help = 'random plies before every self-play game, for variety')
+    build.add_argument('--workers', type = int, help = 'worker processes (default: one per core)')
+    build.add_argument('--records', nargs = '+', default = [],
+                       help = 'also add the games of these record files (see othello_record) played '
+                              'on the book\'s board size and victory type')
+
+    show = commands.add_parser('show', help = 'print a book\'s size and its moves from the start position')
+    show.add_argument('book', help = 'book file')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        with OpeningBook(args.book) as book:
+            print('{}x{} board, victory type {}, {} records'.format(book.rows, book.cols,
+                                                                     book.victory_type, len(book)))
+            game = othello.OthelloGame(book.rows, book.cols, othello.BLACK, othello.WHITE, book.victory_type)
+            for square, score, depth, games in sorted(book.lookup(game), key = lambda move: (-move[2], -move[1])):
+                print('  {}: {} {}, depth {}, games {}'.format(
+                    list(game.get_geometry().position(square)),
+                    'score' if depth else 'average disc difference', score, depth, games))
+        return
+
+    builder = BookBuilder(args.rows, args.cols, args.victory)
+    if args.plies:
+        progress = lambda searched: print('\r{} positions searched'.format(searched), end = '', flush = True)
+        builder.add_searched(args.plies, args.depth, args.spread, progress)
+        print()
+    if args.games:
+        openings = othello_tournament.balanced_openings(args.games, args.opening_plies, args.rows, args.cols,
+                                                        victory_type = args.victory)
+        name, agent_kwargs = othello_match.parse_agent_spec(args.agent)
+        tasks = [(othello_match.AGENTS[name], agent_kwargs, opening) for opening in openings]
+        with othello_parallel.SearchPool(args.workers) as pool:
+            for opening, squares in zip(openings, pool.map(_play_book_game, tasks)):
+                builder.add_game(othello.OthelloGame.from_position(opening), squares, args.game_plies)
+    for path in args.records:
+        for record in othello_record.read_records(path):
+            if ((record.rows, record.cols, record.victory_type) == (args.rows, args.cols, args.victory)
+                    and record.forfeit is None):
+                builder.add_game(record.start_game(), record.squares(), args.game_plies)
+    builder.write(args.output)
+    print('{} records written to {}'.format(len(builder), args.output))
+
+
+if __name__ == '__main__':
+    main()
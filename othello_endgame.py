@@ -0,0 +1,173 @@
+#  Exact endgame solver.
+#
+#  Once few empty squares are left the whole remaining game tree can be
+#  searched, and the result is the exact final disc differential instead of a
+#  heuristic guess. The solver works directly on (player, opponent) bitboards
+#  rather than on an OthelloGame, because at this point nearly all the time goes
+#  into move generation and every saved call counts:
+#
+#    - near the root (FASTEST_FIRST_EMPTIES or more empties) moves are
+#      ordered fastest-first, i.e. by how few replies they leave the opponent
+#    - deeper down, legal moves are not generated at all. The empty squares are
+#      tried directly, those in regions (board quadrants) holding an odd number
+#      of empties first, which is the parity heuristic
+#    - the last empty square is scored without making the move
+#
+#  Scores are always from the point of view of the player to move and follow
+#  the game's victory type: disc difference for MOST_CELLS, its negation for
+#  LEAST_CELLS. In win/loss/draw mode the search only uses the window (-1, 1),
+#  so it proves the sign of the result far faster than the exact value.
+
+import functools
+import time
+
+import othello_bitboard
+import othello_rules
+
+FASTEST_FIRST_EMPTIES = 7
+# How many nodes the solver visits between two looks at the clock
+TIME_CHECK_INTERVAL = 1024
+
+
+class SolverTimeout(Exception):
+    ''' Raised when the solver runs past its deadline '''
+    pass
+
+
+@functools.lru_cache(maxsize = None)
+def parity_regions(rows: int, cols: int) -> [int]:
+    ''' Returns the masks of the four quadrants of a board of the given size '''
+    geometry = othello_bitboard.geometry(rows, cols)
+    regions = [0, 0, 0, 0]
+    for square in range(geometry.size):
+        row, col = geometry.position(square)
+        regions[(row >= rows // 2) * 2 + (col >= cols // 2)] |= 1 << square
+    return regions
+
+
+class EndgameSolver:
+    '''
+    Perfect-play solver for positions with few empty squares left
+    '''
+
+    def __init__(self, geometry, victory_type: str = othello_rules.MOST_CELLS):
+        ''' Creates a solver for boards of the given geometry and victory type '''
+        self._geometry = geometry
+        self._regions = parity_regions(geometry.rows, geometry.cols)
+        self._sign = -1 if victory_type == othello_rules.LEAST_CELLS else 1
+        self._deadline = None
+        self.nodes = 0
+
+    def solve(self, player: int, opponent: int, wld: bool = False, deadline: float = None) -> (int, int):
+        ''' Solves the position with player to move. Returns (score, square):
+            the exact final score for player under perfect play (only its
+            sign is exact in win/loss/draw mode) and the best move, or None
+            if player has to pass. deadline is a time.perf_counter() value
+            after which SolverTimeout is raised. '''
+        self.nodes = 0
+        self._deadline = deadline
+        if wld:
+            alpha, beta = -1, 1
+        else:
+            alpha, beta = -self._geometry.size - 1, self._geometry.size + 1
+
+        moves = othello_rules.legal_moves(self._geometry, player, opponent)
+        if not moves:
+            return self._solve(player, opponent, alpha, beta, False), None
+
+        best_score = None
+        best_square = None
+        for square in self._fastest_first(player, opponent, moves):
+            flipped = othello_bitboard.flips(self._geometry, player, opponent, square)
+            score = -self._solve(opponent ^ flipped, player | flipped | (1 << square),
+                                 -beta, -alpha, False)
+            if best_square is None or score > best_score:
+                best_score = score
+                best_square = square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score, best_square
+
+    def _solve(self, player: int, opponent: int, alpha: int, beta: int, passed: bool) -> int:
+        ''' Negamax alpha-beta down to the end of the game '''
+        self.nodes += 1
+        if (self._deadline is not None and self.nodes % TIME_CHECK_INTERVAL == 0
+                and time.perf_counter() > self._deadline):
+            raise SolverTimeout()
+
+        geometry = self._geometry
+        empty = geometry.full & ~(player | opponent)
+        empties = othello_bitboard.count(empty)
+
+        if empties == 1:
+            return self._solve_last(player, opponent, empty.bit_length() - 1)
+
+        if empties >= FASTEST_FIRST_EMPTIES:
+            moves = othello_rules.legal_moves(geometry, player, opponent)
+            if not moves:
+                return self._pass(player, opponent, alpha, beta, passed)
+            candidates = self._fastest_first(player, opponent, moves)
+        else:
+            candidates = self._parity_order(empty)
+
+        best_score = None
+        for square in candidates:
+            flipped = othello_bitboard.flips(geometry, player, opponent, square)
+            if not flipped:
+                continue
+            score = -self._solve(opponent ^ flipped, player | flipped | (1 << square),
+                                 -beta, -alpha, False)
+            if best_score is None or score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score is None:
+            return self._pass(player, opponent, alpha, beta, passed)
+        return best_score
+
+    def _pass(self, player: int, opponent: int, alpha: int, beta: int, passed: bool) -> int:
+        ''' Scores a node where player has no move: the game ends if the
+            opponent had just passed too, otherwise the opponent moves again '''
+        if passed:
+            return self._final_score(player, opponent)
+        return -self._solve(opponent, player, -beta, -alpha, True)
+
+    def _solve_last(self, player: int, opponent: int, square: int) -> int:
+        ''' Scores a position with exactly one empty square '''
+        geometry = self._geometry
+        flipped = othello_bitboard.flips(geometry, player, opponent, square)
+        if flipped:
+            return self._final_score(player | flipped | (1 << square), opponent ^ flipped)
+        flipped = othello_bitboard.flips(geometry, opponent, player, square)
+        if flipped:
+            return self._final_score(player ^ flipped, opponent | flipped | (1 << square))
+        return self._final_score(player, opponent)
+
+    def _final_score(self, player: int, opponent: int) -> int:
+        ''' Returns the score of a finished game for player '''
+        return self._sign * (othello_bitboard.count(player) - othello_bitboard.count(opponent))
+
+    def _fastest_first(self, player: int, opponent: int, moves: int) -> [int]:
+        ''' Returns the moves ordered by how few replies each leaves the opponent '''
+        geometry = self._geometry
+        ordered = []
+        for square in othello_bitboard.squares(moves):
+            flipped = othello_bitboard.flips(geometry, player, opponent, square)
+            replies = othello_rules.legal_moves(geometry, opponent ^ flipped,
+                                                player | flipped | (1 << square))
+            ordered.append((othello_bitboard.count(replies), square))
+        ordered.sort()
+        return [square for replies, square in ordered]
+
+    def _parity_order(self, empty: int) -> [int]:
+        ''' Returns the empty squares, those in odd-sized regions first '''
+        odd = 0
+        for region in self._regions:
+            if othello_bitboard.count(empty & region) & 1:
+                odd |= region
+        return othello_bitboard.squares(empty & odd) + othello_bitboard.squares(empty & ~odd)
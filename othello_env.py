@@ -0,0 +1,200 @@
+#  Lockstep vectorized Othello environment.
+#
+#  VectorOthelloEnv keeps K games in NumPy arrays and steps all of them with
+#  one call, using the batch rules in othello_batch. Every game starts from the
+#  same position an OthelloGame with the environment's settings starts from, and
+#  follows the same pass rule: after a move the turn only changes hands if the
+#  opponent can reply, and a game ends when neither side can move. Passes,
+#  game ends and resets are all done with array operations, so there is no
+#  per-game Python branching in step().
+#
+#  Finished games are reset straight away (auto-reset). The step that ends a
+#  game returns done = True and the reward for that slot; the observation for
+#  the slot is already the first position of the next game.
+#
+#  Observations are int8 arrays shaped (K, 2, rows, cols): plane 0 holds the
+#  discs of the player to move, plane 1 the opponent's. Legal moves come as a
+#  boolean array shaped (K, rows * cols), indexed by square (row * cols + col).
+#  Rewards are from the point of view of the player who made the step's move:
+#  +1 for a won game, -1 for a lost one, 0 for a draw or an unfinished game.
+#
+#      env = VectorOthelloEnv(1024)
+#      observations, legal = env.reset()
+#      while training:
+#          actions = policy(observations, legal)      # or env.sample_actions()
+#          observations, legal, rewards, dones, info = env.step(actions)
+
+import numpy
+
+import othello
+import othello_batch
+
+
+class VectorOthelloEnv:
+    '''
+    K Othello games stepped together
+    '''
+
+    def __init__(self, num_envs: int, rows: int = 8, cols: int = 8,
+                 first_player: str = othello.BLACK, top_left: str = othello.WHITE,
+                 victory_type: str = othello.MOST_CELLS, seed: int = None):
+        ''' Creates num_envs games with the given settings. Boards of at most
+            64 squares are stored as packed bitboards, larger ones as
+            boolean arrays. '''
+        start = othello.OthelloGame(rows, cols, first_player, top_left, victory_type)
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.victory_type = victory_type
+        self.generator = numpy.random.default_rng(seed)
+        self._geometry = start.get_geometry()
+        self._packed = self._geometry.size <= othello_batch.PACKED_MAX_SQUARES
+        self._sign = -1 if victory_type == othello.LEAST_CELLS else 1
+
+        if self._packed:
+            player, opponent = othello_batch.from_games_packed([start])
+        else:
+            player, opponent = othello_batch.from_games([start])
+        self._start_player = player[0]
+        self._start_opponent = opponent[0]
+        self._start_turn = 0 if first_player == othello.BLACK else 1
+
+        self.player = None
+        self.opponent = None
+        # 0 where black is to move, 1 where white is
+        self.turn = None
+        self.plies = None
+        self._legal = None
+
+    def reset(self) -> (numpy.ndarray, numpy.ndarray):
+        ''' Starts every game over. Returns (observations, legal moves). '''
+        shape = (self.num_envs,) + numpy.shape(self._start_player)
+        self.player = numpy.broadcast_to(self._start_player, shape).copy()
+        self.opponent = numpy.broadcast_to(self._start_opponent, shape).copy()
+        self.turn = numpy.full(self.num_envs, self._start_turn, dtype = numpy.int8)
+        self.plies = numpy.zeros(self.num_envs, dtype = numpy.int32)
+        self._legal = self._legal_moves(self.player, self.opponent)
+        return self.observations(), self.legal_moves()
+
+    def step(self, actions: numpy.ndarray):
+        ''' Plays one move (a square index) in every game. Returns
+            (observations, legal moves, rewards, dones, info), where info
+            holds the final disc difference of the finished games (from the
+            mover's point of view) and how many plies they lasted. Raises
+            ValueError if any action is not a legal move. '''
+        actions = numpy.asarray(actions, dtype = numpy.int64)
+        legal = self.legal_moves()
+        valid = (actions >= 0) & (actions < legal.shape[1])
+        valid[valid] = legal[numpy.nonzero(valid)[0], actions[valid]]
+        if not valid.all():
+            raise ValueError('illegal actions in games ' + str(numpy.nonzero(~valid)[0].tolist()))
+
+        player, opponent = self._apply_moves(self.player, self.opponent, actions)
+        self.plies += 1
+
+        # Pass rule: the turn changes hands only if the opponent can reply
+        replies = self._legal_moves(opponent, player)
+        own_moves = self._legal_moves(player, opponent)
+        switch = self._any(replies)
+        dones = ~switch & ~self._any(own_moves)
+
+        difference = self._count(player) - self._count(opponent)
+        rewards = numpy.where(dones, numpy.sign(self._sign * difference), 0).astype(numpy.float32)
+        info = {'final_difference': numpy.where(dones, difference, 0),
+                'plies': numpy.where(dones, self.plies, 0)}
+
+        self.player = self._select(switch, opponent, player)
+        self.opponent = self._select(switch, player, opponent)
+        self._legal = self._select(switch, replies, own_moves)
+        self.turn = numpy.where(switch, 1 - self.turn, self.turn).astype(numpy.int8)
+
+        # Auto-reset finished games
+        self.player = self._select(dones, self._start_player, self.player)
+        self.opponent = self._select(dones, self._start_opponent, self.opponent)
+        self._legal = self._select(dones, self._start_legal(), self._legal)
+        self.turn[dones] = self._start_turn
+        self.plies[dones] = 0
+
+        return self.observations(), self.legal_moves(), rewards, dones, info
+
+    def observations(self) -> numpy.ndarray:
+        ''' Returns the current positions as int8 planes shaped
+            (K, 2, rows, cols), player to move first '''
+        shape = (self.num_envs, self.rows, self.cols)
+        return numpy.ascontiguousarray(numpy.stack(
+            [self._boards(self.player).reshape(shape), self._boards(self.opponent).reshape(shape)],
+            axis = 1).astype(numpy.int8))
+
+    def legal_moves(self) -> numpy.ndarray:
+        ''' Returns the legal moves of every game as booleans shaped
+            (K, rows * cols) '''
+        return numpy.ascontiguousarray(self._boards(self._legal).reshape(self.num_envs, -1))
+
+    def sample_actions(self) -> numpy.ndarray:
+        ''' Returns a uniformly random legal move for every game, the policy
+            RandomAgent plays '''
+        return othello_batch.random_moves(self.legal_moves(), self.generator)
+
+    def agent_actions(self, agents) -> numpy.ndarray:
+        ''' Asks ordinary agents (anything with get_next_action(game), one
+            per game or one shared agent) for a move in every game. Slow,
+            since each game is turned back into an OthelloGame, but lets the
+            existing agents drive the environment. '''
+        if not isinstance(agents, (list, tuple)):
+            agents = [agents] * self.num_envs
+        actions = numpy.empty(self.num_envs, dtype = numpy.int64)
+        for index in range(self.num_envs):
+            row, col = agents[index].get_next_action(self.game(index))
+            actions[index] = self._geometry.square(row, col)
+        return actions
+
+    def game(self, index: int) -> othello.OthelloGame:
+        ''' Returns an OthelloGame holding the current position of one game '''
+        player = self._bitboard(self.player[index])
+        opponent = self._bitboard(self.opponent[index])
+        if self.turn[index] == 0:
+            black, white, turn = player, opponent, othello.BLACK
+        else:
+            black, white, turn = opponent, player, othello.WHITE
+        return othello.OthelloGame.from_position((self.rows, self.cols, turn, self.victory_type,
+                                                  black, white))
+
+    # The packed and boolean layouts differ only in these helpers
+    def _legal_moves(self, player, opponent):
+        if self._packed:
+            return othello_batch.legal_moves_packed(self._geometry, player, opponent)
+        return othello_batch.legal_moves(player, opponent)
+
+    def _apply_moves(self, player, opponent, actions):
+        if self._packed:
+            player, opponent, flipped = othello_batch.apply_moves_packed(self._geometry, player,
+                                                                         opponent, actions)
+        else:
+            player, opponent, flipped = othello_batch.apply_moves(player, opponent, actions)
+        return player, opponent
+
+    def _start_legal(self):
+        return self._legal_moves(self._start_player[None], self._start_opponent[None])[0]
+
+    def _any(self, masks) -> numpy.ndarray:
+        if self._packed:
+            return masks != 0
+        return masks.any(axis = (1, 2))
+
+    def _count(self, masks) -> numpy.ndarray:
+        return othello_batch.count(masks)
+
+    def _select(self, condition, chosen, other):
+        if not self._packed:
+            condition = condition[:, None, None]
+        return numpy.where(condition, chosen, other)
+
+    def _boards(self, masks) -> numpy.ndarray:
+        if self._packed:
+            return othello_batch.unpack(self._geometry, masks)
+        return masks
+
+    def _bitboard(self, board) -> int:
+        if self._packed:
+            return int(board)
+        return sum(1 << int(square) for square in numpy.flatnonzero(board))
@@ -0,0 +1,446 @@
+#  Table-driven pattern evaluation.
+#
+#  The board is scored as the sum of the values of a fixed set of line and
+#  region patterns:
+#
+#    - the four edges (for edges longer than MAX_LINE squares, the EDGE_SEGMENT
+#      squares next to each corner instead)
+#    - the diagonals running out of the corners, up to MAX_LINE squares long
+#    - the 3x3 block in each corner
+#
+#  plus a parity term. Every pattern is read in a fixed order starting from its
+#  corner, so a pattern and its rotations and reflections share one table.
+#  The contents of a pattern give a base-3 index (0 empty, 1 player to move,
+#  2 opponent) into its value table. A symmetry may still read a pattern's
+#  squares in another order (an edge from its other corner, a corner block by
+#  columns), so a table only scores every orientation of a position alike if
+#  it holds the same value for those reorderings of an index
+#  (pattern_symmetries); the default tables do, and othello_tuning keeps the
+#  fitted ones that way. The symmetric transposition table of AlphaBetaAgent
+#  (tt_symmetry) relies on it.
+#
+#  Computing an index does not loop over the pattern's squares. The bitboards
+#  are split into bytes once per evaluation (int.to_bytes), and for every byte
+#  a pattern touches there is a 256-entry table giving that byte's share of the
+#  index. An 8x8 leaf costs about a hundred list reads and no move generation.
+#
+#  All tables depend only on the board size, are built the first time a size
+#  is evaluated and are cached from then on. The default values come from the
+#  static square weights plus a bonus for discs that can never be flipped along
+#  the pattern's edge (stable discs). othello_tuning fits better ones from
+#  self-play positions, optionally a separate set per game phase (by number of
+#  empty squares); evaluator() loads them from WEIGHTS_DIRECTORY when a file
+#  for the board size is there.
+#
+#  During a search the features do not even have to be recomputed at the
+#  leaves: an IncrementalFeatures attached to an OthelloGame is updated by
+#  make_move() and unmake_move() (see below).
+
+import functools
+import gzip
+import json
+import os
+
+import othello_ordering
+import othello_symmetry
+
+MAX_LINE = 10
+EDGE_SEGMENT = 8
+CORNER_BLOCK = 3
+STABLE_WEIGHT = 30
+PARITY_WEIGHT = 8
+
+# Where evaluator() finds tuned tables (see othello_tuning)
+WEIGHTS_DIRECTORY = os.environ.get('OTHELLO_WEIGHTS_DIR',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights'))
+
+# Check every incremental feature update against a full recomputation
+DEBUG_FEATURES = os.environ.get('OTHELLO_DEBUG_FEATURES', '') not in ('', '0')
+
+# Pattern classes
+EDGE = 'edge'
+DIAGONAL = 'diagonal'
+CORNER = 'corner'
+
+
+class Pattern:
+    '''
+    One pattern instance: its class, its squares in reading order and the
+    per-byte index tables
+    '''
+
+    def __init__(self, name: str, squares: [int], edge_ends: (bool, bool)):
+        ''' edge_ends says which ends of the pattern are board corners, which
+            matters for stability along lines '''
+        self.name = name
+        self.squares = squares
+        self.edge_ends = edge_ends
+        self.parts = []
+        powers = {}
+        for position, square in enumerate(squares):
+            powers[square] = 3 ** position
+        for byte in sorted(set(square // 8 for square in squares)):
+            player_part = [0] * 256
+            for value in range(256):
+                for bit in range(8):
+                    if value >> bit & 1:
+                        player_part[value] += powers.get(byte * 8 + bit, 0)
+            self.parts.append((byte, player_part, [2 * part for part in player_part]))
+
+
+class PatternEvaluator:
+    '''
+    Pattern tables and weights for boards of one size
+    '''
+
+    def __init__(self, rows: int, cols: int, weights: dict = None, phases: [tuple] = None):
+        ''' Builds the patterns of a rows x cols board. weights maps each
+            pattern class name (and 'parity') to its value table; classes
+            that are missing get the default values. phases optionally gives
+            other tables for parts of the game, as (max_empties, weights)
+            pairs sorted by max_empties: a position uses the first phase with
+            at least as many empty squares as it has, and weights past the
+            last one. Classes missing from a phase use weights. '''
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self._bytes = (self.size + 7) // 8
+        self.patterns = _patterns(rows, cols)
+        self.weights = self._complete_weights(weights, None)
+        self.parity_weight = self.weights['parity']
+        self.phases = [(max_empties, self._complete_weights(phase_weights, self.weights))
+                       for max_empties, phase_weights in sorted(phases or [], key = lambda phase: phase[0])]
+        self.tables = [self.weights[pattern.name] for pattern in self.patterns]
+        # The (tables, parity weight) used at every number of empty squares
+        self.stages = []
+        for empties in range(self.size + 1):
+            weights = self.weights
+            for max_empties, phase_weights in self.phases:
+                if empties <= max_empties:
+                    weights = phase_weights
+                    break
+            self.stages.append(([weights[pattern.name] for pattern in self.patterns], weights['parity']))
+        self._parts = [pattern.parts for pattern in self.patterns]
+        # For incremental updates: the (pattern number, power of 3) of every
+        # pattern each square belongs to
+        self.square_patterns = [[] for square in range(self.size)]
+        for number, pattern in enumerate(self.patterns):
+            for position, square in enumerate(pattern.squares):
+                self.square_patterns[square].append((number, 3 ** position))
+
+    def evaluate(self, player: int, opponent: int) -> int:
+        ''' Returns the score of the position for player, the side to move '''
+        player_bytes = player.to_bytes(self._bytes, 'little')
+        opponent_bytes = opponent.to_bytes(self._bytes, 'little')
+        empties = self.size - bin(player | opponent).count('1')
+        tables, parity_weight = self.stages[empties]
+        score = 0
+        for table, parts in zip(tables, self._parts):
+            index = 0
+            for byte, player_part, opponent_part in parts:
+                index += player_part[player_bytes[byte]] + opponent_part[opponent_bytes[byte]]
+            score += table[index]
+
+        if empties & 1:
+            return score + parity_weight
+        return score - parity_weight
+
+    def pattern_indices(self, player: int, opponent: int) -> [(str, int)]:
+        ''' Returns the (class name, table index) of every pattern in the
+            position, the features evaluate() adds up '''
+        player_bytes = player.to_bytes(self._bytes, 'little')
+        opponent_bytes = opponent.to_bytes(self._bytes, 'little')
+        indices = []
+        for pattern in self.patterns:
+            index = 0
+            for byte, player_part, opponent_part in pattern.parts:
+                index += player_part[player_bytes[byte]] + opponent_part[opponent_bytes[byte]]
+            indices.append((pattern.name, index))
+        return indices
+
+    def save_weights(self, path: str) -> None:
+        ''' Writes the value tables to a JSON file, gzip-compressed if the
+            path ends in .gz '''
+        data = {'rows': self.rows, 'cols': self.cols, 'weights': self.weights}
+        if self.phases:
+            data['phases'] = [{'max_empties': max_empties, 'weights': weights}
+                              for max_empties, weights in self.phases]
+        with _open_weights(path, 'wt') as file:
+            json.dump(data, file, separators = (',', ':'))
+
+    def _complete_weights(self, weights: dict, fallback: dict) -> dict:
+        ''' Returns a table for every pattern class and the parity weight,
+            taken from weights, else fallback, else the defaults '''
+        complete = {}
+        for pattern in self.patterns:
+            if pattern.name in complete:
+                continue
+            if weights and pattern.name in weights:
+                table = list(weights[pattern.name])
+                if len(table) != 3 ** len(pattern.squares):
+                    raise ValueError('wrong table size for pattern ' + pattern.name)
+            elif fallback is not None:
+                table = fallback[pattern.name]
+            else:
+                table = _default_table(self.rows, self.cols, pattern)
+            complete[pattern.name] = table
+        if weights and 'parity' in weights:
+            complete['parity'] = weights['parity']
+        else:
+            complete['parity'] = PARITY_WEIGHT if fallback is None else fallback['parity']
+        return complete
+
+
+# Incremental features
+#
+# IncrementalFeatures keeps every pattern's index as seen by black (black = 1,
+# white = 2); white's view of the same pattern is one read of a digit-swapping
+# table away. A move only changes the patterns through the placed square and
+# the flipped discs, so update() touches just those, using per-square lists of
+# precomputed index changes. The previous indices are pushed on a stack and
+# undo() pops them. A leaf then costs one or two table reads per pattern.
+class IncrementalFeatures:
+    '''
+    Evaluation features kept up to date by OthelloGame.make_move()/unmake_move()
+    '''
+
+    def __init__(self, evaluator: PatternEvaluator, debug: bool = None):
+        ''' With debug (default: the OTHELLO_DEBUG_FEATURES environment
+            variable) every update is checked against a full recomputation
+            and a mismatch raises AssertionError. '''
+        self.evaluator = evaluator
+        self.debug = DEBUG_FEATURES if debug is None else debug
+        self._swaps = [_digit_swap(len(pattern.squares)) for pattern in evaluator.patterns]
+        # Index changes per square, for a disc placed or flipped to each color
+        self._place = ([[(number, power) for number, power in patterns]
+                        for patterns in evaluator.square_patterns],
+                       [[(number, 2 * power) for number, power in patterns]
+                        for patterns in evaluator.square_patterns])
+        self._flip = ([[(number, -power) for number, power in patterns]
+                       for patterns in evaluator.square_patterns],
+                      [[(number, power) for number, power in patterns]
+                       for patterns in evaluator.square_patterns])
+        self._stack = []
+        self.reset(0, 0)
+
+    def reset(self, black: int, white: int) -> None:
+        ''' Recomputes the features from the given bitboards and clears the
+            undo stack '''
+        self._stack = []
+        self.indices = self._compute(black, white)
+
+    def update(self, black_moved: bool, square: int, flipped: int, black: int, white: int) -> None:
+        ''' Applies a move: the mover's disc on square and the flipped discs.
+            black and white are the bitboards after the move. '''
+        self._stack.append(self.indices)
+        indices = self.indices[:]
+        mover = 0 if black_moved else 1
+
+        for number, change in self._place[mover][square]:
+            indices[number] += change
+        flip = self._flip[mover]
+        remaining = flipped
+        while remaining:
+            low = remaining & -remaining
+            remaining ^= low
+            for number, change in flip[low.bit_length() - 1]:
+                indices[number] += change
+
+        self.indices = indices
+        if self.debug:
+            self.check(black, white)
+
+    def undo(self) -> None:
+        ''' Restores the features from before the last update() '''
+        self.indices = self._stack.pop()
+
+    def evaluate(self, black_to_move: bool, empties: int) -> int:
+        ''' Returns the pattern evaluation for the side to move; the same
+            value PatternEvaluator.evaluate() computes from scratch '''
+        tables, parity_weight = self.evaluator.stages[empties]
+        score = 0
+        if black_to_move:
+            for table, index in zip(tables, self.indices):
+                score += table[index]
+        else:
+            for table, swap, index in zip(tables, self._swaps, self.indices):
+                score += table[swap[index]]
+        if empties & 1:
+            return score + parity_weight
+        return score - parity_weight
+
+    def check(self, black: int, white: int) -> None:
+        ''' Raises AssertionError if the features differ from a full
+            recomputation on the given bitboards '''
+        expected = self._compute(black, white)
+        if expected != self.indices:
+            raise AssertionError('incremental features out of sync: {} != {}'.format(self.indices, expected))
+
+    def _compute(self, black: int, white: int) -> [int]:
+        ''' Computes the features from scratch '''
+        return [index for name, index in self.evaluator.pattern_indices(black, white)]
+
+
+@functools.lru_cache(maxsize = None)
+def _digit_swap(length: int) -> [int]:
+    ''' Returns, for every base-3 index of the given length, the index with
+        the digits 1 and 2 swapped, i.e. the pattern seen by the other side '''
+    swap = [0]
+    for position in range(length):
+        power = 3 ** position
+        swap = swap + [index + 2 * power for index in swap] + [index + power for index in swap]
+    return swap
+
+
+def weights_path(rows: int, cols: int) -> str:
+    ''' Returns where evaluator() looks for the tuned tables of a board size '''
+    return os.path.join(WEIGHTS_DIRECTORY, 'pattern_{}x{}.json.gz'.format(rows, cols))
+
+
+@functools.lru_cache(maxsize = None)
+def evaluator(rows: int, cols: int) -> PatternEvaluator:
+    ''' Returns the shared evaluator for the given board size: the tuned
+        tables from weights_path() if that file exists, else the defaults '''
+    path = weights_path(rows, cols)
+    if os.path.exists(path):
+        return load_evaluator(path)
+    return PatternEvaluator(rows, cols)
+
+
+def load_evaluator(path: str) -> PatternEvaluator:
+    ''' Creates an evaluator from a weights file written by save_weights() '''
+    with _open_weights(path, 'rt') as file:
+        data = json.load(file)
+    phases = [(phase['max_empties'], phase['weights']) for phase in data.get('phases', [])]
+    return PatternEvaluator(data['rows'], data['cols'], data['weights'], phases)
+
+
+def _open_weights(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+@functools.lru_cache(maxsize = None)
+def _patterns(rows: int, cols: int) -> [Pattern]:
+    ''' Returns the pattern instances of a rows x cols board '''
+    corners = [(0, 0, 1, 1), (0, cols - 1, 1, -1), (rows - 1, 0, -1, 1), (rows - 1, cols - 1, -1, -1)]
+    square = lambda row, col: row * cols + col
+    patterns = []
+
+    # Edges: whole edges read from their first corner, or a segment from
+    # every corner when the edge is too long for one table
+    for length, lines in ((cols, [[(0, col) for col in range(cols)],
+                                  [(rows - 1, col) for col in range(cols)]]),
+                          (rows, [[(row, 0) for row in range(rows)],
+                                  [(row, cols - 1) for row in range(rows)]])):
+        if length <= MAX_LINE:
+            for line in lines:
+                patterns.append(Pattern(EDGE + str(length), [square(*cell) for cell in line],
+                                        (True, True)))
+    for row, col, rowstep, colstep in corners:
+        if cols > MAX_LINE:
+            patterns.append(Pattern(EDGE + '_segment',
+                                    [square(row, col + colstep * step) for step in range(EDGE_SEGMENT)],
+                                    (True, False)))
+        if rows > MAX_LINE:
+            patterns.append(Pattern(EDGE + '_segment',
+                                    [square(row + rowstep * step, col) for step in range(EDGE_SEGMENT)],
+                                    (True, False)))
+
+    # Diagonals out of the corners. On a square board no longer than MAX_LINE
+    # the diagonal from the opposite corner is the same line, so only the two
+    # top corners are used.
+    length = min(rows, cols, MAX_LINE)
+    whole = rows == cols and rows <= MAX_LINE
+    for row, col, rowstep, colstep in (corners[:2] if whole else corners):
+        patterns.append(Pattern(DIAGONAL + str(length),
+                                [square(row + rowstep * step, col + colstep * step) for step in range(length)],
+                                (True, whole)))
+
+    # Corner blocks, read row by row from the corner
+    for row, col, rowstep, colstep in corners:
+        patterns.append(Pattern(CORNER,
+                                [square(row + rowstep * i, col + colstep * j)
+                                 for i in range(CORNER_BLOCK) for j in range(CORNER_BLOCK)],
+                                (True, False)))
+    return patterns
+
+
+@functools.lru_cache(maxsize = None)
+def pattern_symmetries(rows: int, cols: int) -> dict:
+    ''' Returns, for every pattern class, the reorderings a board symmetry
+        can apply to its patterns: tuples giving, for every position in the
+        reading order, the position its square is read at in the image. A
+        table whose value does not change when an index's digits are
+        reordered by any of them scores every orientation of a position
+        alike. The identity is always included. '''
+    patterns = _patterns(rows, cols)
+    orders = {pattern.name: {tuple(range(len(pattern.squares)))} for pattern in patterns}
+    for permutation in othello_symmetry.symmetries(rows, cols):
+        for pattern in patterns:
+            image = [permutation[square] for square in pattern.squares]
+            for other in patterns:
+                if other.name == pattern.name and set(other.squares) == set(image):
+                    orders[pattern.name].add(tuple(other.squares.index(square) for square in image))
+    # Close each set under composition, so that it is a group
+    for name, order_set in orders.items():
+        added = True
+        while added:
+            added = False
+            for first in list(order_set):
+                for second in list(order_set):
+                    composed = tuple(second[position] for position in first)
+                    if composed not in order_set:
+                        order_set.add(composed)
+                        added = True
+    return {name: sorted(order_set) for name, order_set in orders.items()}
+
+
+def _default_table(rows: int, cols: int, pattern: Pattern) -> [int]:
+    ''' Builds the default value table of a pattern class: the static weights
+        of the squares held, plus STABLE_WEIGHT per stable disc '''
+    weights = othello_ordering.square_weights(rows, cols)
+    square_weights = [weights[square] for square in pattern.squares]
+    length = len(pattern.squares)
+    table = []
+    for index in range(3 ** length):
+        cells = []
+        for position in range(length):
+            cells.append(index % 3)
+            index //= 3
+        value = 0
+        for position, cell in enumerate(cells):
+            if cell == 1:
+                value += square_weights[position]
+            elif cell == 2:
+                value -= square_weights[position]
+        if pattern.name == CORNER:
+            # The edge squares of a corner block: first row, then first column
+            lines = [cells[0:CORNER_BLOCK], cells[0::CORNER_BLOCK]]
+            stable = [_line_stability(line, (True, False)) for line in lines]
+            # The corner itself is in both lines
+            value += STABLE_WEIGHT * (stable[0] + stable[1] - (1 if cells[0] == 1 else -1 if cells[0] == 2 else 0))
+        elif not pattern.name.startswith(DIAGONAL):
+            value += STABLE_WEIGHT * _line_stability(cells, pattern.edge_ends)
+        table.append(value)
+    return table
+
+
+def _line_stability(cells: [int], edge_ends: (bool, bool)) -> int:
+    ''' Returns player's minus opponent's stable discs on an edge line: every
+        disc of a full line, and every run of one color anchored to a corner '''
+    if 0 not in cells:
+        return cells.count(1) - cells.count(2)
+    stable = [False] * len(cells)
+    for anchored, order in ((edge_ends[0], range(len(cells))),
+                            (edge_ends[1], range(len(cells) - 1, -1, -1))):
+        if not anchored:
+            continue
+        color = None
+        for position in order:
+            if cells[position] == 0 or (color is not None and cells[position] != color):
+                break
+            color = cells[position]
+            stable[position] = True
+    return sum((1 if cells[position] == 1 else -1) for position in range(len(cells)) if stable[position])
@@ -2,7 +2,9 @@
 
 import othello
 import othello_models
+import othello_record
 import tkinter
+import time
 import agent
 
 
@@ -27,6 +29,8 @@ DEFAULT_FIRST_PLAYER = othello.BLACK
 DEFAULT_TOP_LEFT_PLAYER = othello.WHITE
 DEFAULT_VICTORY_TYPE = othello.MOST_CELLS
 STEP_DELAY = 1
+# Every game played from the command line is appended to this record file
+GAME_RECORDS = 'gui_games.rec'
 
 # GUI Constants
 BACKGROUND_COLOR = othello_models.BACKGROUND_COLOR
@@ -55,6 +59,10 @@ class OthelloGUI:
         self._game_state = othello.OthelloGame(self._rows, self._columns,
                                                self._first_player, self._top_left_player,
                                                self._victory_type)
+        # Record of the game (see othello_record), and the search stats of the move being played
+        self.record = None
+        self._move_stats = None
+        self._new_record()
 
         
         # Initialize all my widgets and window here
@@ -125,13 +133,21 @@ class OthelloGUI:
     def _next_step(self):
         if not self._game_state.is_game_over():
             if self._player_turn._player == BLACK:
-                self._next_move(self._agent_b.get_next_action(self._game_state))
+                self._next_move(self._agent_action(self._agent_b))
 
             else:
-                self._next_move(self._agent_w.get_next_action(self._game_state))
+                self._next_move(self._agent_action(self._agent_w))
 
             self._root_window.after(STEP_DELAY, self._next_step)
 
+    def _agent_action(self, player):
+        ''' Asks an agent for its move, keeping what its search reported '''
+        previous_result = getattr(player, 'last_result', None)
+        start = time.perf_counter()
+        action = player.get_next_action(self._game_state)
+        self._move_stats = othello_record.move_stats(player, previous_result, time.perf_counter() - start)
+        return action
+
     def _configure_game_settings(self) -> None:
         ''' Pops out an options window to configure the game settings '''
         dialog = othello_models.OptionDialog(self._rows, self._columns,
@@ -161,27 +177,40 @@ class OthelloGUI:
         self._black_score.update_score(self._game_state)
         self._white_score.update_score(self._game_state)
         self._player_turn.update_turn(self._game_state.get_turn())
+        self._new_record()
+
+
+    def _new_record(self) -> None:
+        ''' Starts the record of the current game '''
+        self.record = othello_record.GameRecord.from_game(self._game_state, type(self._agent_b).__name__,
+                                                          type(self._agent_w).__name__)
         
 
     def _next_move(self, action) -> None:
         ''' Attempt to play a move on the board if it's valid '''
         row = action[0]
         col = action[1]
+        turn = self._game_state.get_turn()
         try:
             self._game_state.move(row, col)
-            self._board.update_game_state(self._game_state)
-            self._board.redraw_board()
-            self._black_score.update_score(self._game_state)
-            self._white_score.update_score(self._game_state)
-
-            if self._game_state.is_game_over():
-                self._player_turn.display_winner(self._game_state.return_winner())
-                WINNER = self._game_state.return_winner()
-                self._root_window.destroy()
-            else:
-                self._player_turn.switch_turn(self._game_state)
-        except:
-            pass
+        except (othello.InvalidMoveException, TypeError, IndexError):
+            # The agent is asked again on the next step
+            return
+
+        self.record.add_move(self._game_state, turn, self._game_state.get_geometry().square(row, col),
+                             self._move_stats)
+        self._board.update_game_state(self._game_state)
+        self._board.redraw_board()
+        self._black_score.update_score(self._game_state)
+        self._white_score.update_score(self._game_state)
+
+        if self._game_state.is_game_over():
+            self.record.finish(self._game_state)
+            self._player_turn.display_winner(self._game_state.return_winner())
+            WINNER = self._game_state.return_winner()
+            self._root_window.destroy()
+        else:
+            self._player_turn.switch_turn(self._game_state)
 
     def findWinner(self):
         return self._game_state.return_winner()
@@ -228,9 +257,13 @@ class OthelloGUI:
 if __name__ == '__main__':
     black_wins = 0
     white_wins = 0
+    writer = othello_record.RecordWriter(GAME_RECORDS)
     for i in range(20):
         gui = OthelloGUI(agent.AlphaBetaAgent(), agent.RandomAgent())
         gui.start()
+        # A window closed in the middle of a game leaves it unfinished
+        if gui.record.finished:
+            writer.write(gui.record)
         winner = gui.findWinner()
         if winner == 'B':
             black_wins = black_wins + 1
@@ -240,6 +273,7 @@ if __name__ == '__main__':
     print(black_wins)
     print("white wins:")
     print(white_wins)
+    writer.close()
 
 
 
@@ -0,0 +1,297 @@
+#  Headless match runner.
+#
+#  Plays games between two agents straight on an OthelloGame, with no window,
+#  canvas or event loop, so matches run as fast as the agents can move and work
+#  on machines without a display. From the command line:
+#
+#      python othello_match.py alphabeta random --games 20
+#      python othello_match.py alphabeta:max_depth=3 expectimax --rows 6 --cols 6 --swap
+#
+#  An agent is given as a name from AGENTS, optionally followed by a colon and
+#  comma-separated keyword arguments for its constructor
+#  (e.g. alphabeta:time_budget_ms=200,endgame_empties=12).
+
+import argparse
+import ast
+import random
+import time
+
+import agent
+import othello
+import othello_record
+
+DEFAULT_ROWS = 8
+DEFAULT_COLUMNS = 8
+DEFAULT_FIRST_PLAYER = othello.BLACK
+DEFAULT_TOP_LEFT_PLAYER = othello.WHITE
+DEFAULT_VICTORY_TYPE = othello.MOST_CELLS
+DEFAULT_GAMES = 20
+
+# Agents that can be named on the command line
+AGENTS = {'random': agent.RandomAgent,
+          'alphabeta': agent.AlphaBetaAgent,
+          'expectimax': agent.ExpectimaxAgent,
+          'mcts': agent.MCTSAgent}
+
+
+def register_agent(name: str, agent_class) -> None:
+    ''' Makes an agent class available by name to the match runner '''
+    AGENTS[name] = agent_class
+
+
+def parse_agent_spec(spec: str) -> (str, dict):
+    ''' Splits an agent spec such as 'alphabeta:max_depth=3' into the agent's
+        name and its keyword arguments '''
+    name, _, arguments = spec.partition(':')
+    if name not in AGENTS:
+        raise ValueError('unknown agent: ' + name + ' (choose from ' + ', '.join(sorted(AGENTS)) + ')')
+    kwargs = {}
+    for argument in filter(None, arguments.split(',')):
+        key, equals, value = argument.partition('=')
+        if not equals:
+            raise ValueError('agent arguments must look like key=value: ' + argument)
+        try:
+            kwargs[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            kwargs[key.strip()] = value.strip()
+    return name, kwargs
+
+
+def make_agent(spec: str):
+    ''' Creates a fresh agent from an agent spec '''
+    name, kwargs = parse_agent_spec(spec)
+    return AGENTS[name](**kwargs)
+
+
+class GameResult:
+    '''
+    The outcome of one finished game
+    '''
+
+    def __init__(self, winner, black_cells, white_cells, moves, black_time, white_time, forfeit=None,
+                 record=None):
+        ''' winner is BLACK, WHITE or None for a draw. black_time and
+            white_time are the seconds each side spent choosing moves.
+            forfeit is the color that lost by playing an invalid move.
+            record is the game's othello_record.GameRecord. '''
+        self.winner = winner
+        self.black_cells = black_cells
+        self.white_cells = white_cells
+        self.moves = moves
+        self.black_time = black_time
+        self.white_time = white_time
+        self.forfeit = forfeit
+        self.record = record
+
+    def __repr__(self):
+        return ('GameResult(winner={}, black={}, white={}, moves={}, forfeit={})'
+                .format(self.winner, self.black_cells, self.white_cells, self.moves, self.forfeit))
+
+
+def new_game(rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLUMNS,
+             first_player: str = DEFAULT_FIRST_PLAYER,
+             top_left: str = DEFAULT_TOP_LEFT_PLAYER,
+             victory_type: str = DEFAULT_VICTORY_TYPE) -> othello.OthelloGame:
+    ''' Creates a game with the given settings '''
+    return othello.OthelloGame(rows, cols, first_player, top_left, victory_type)
+
+
+def play_game(agent_b, agent_w, game: othello.OthelloGame) -> GameResult:
+    ''' Plays the game out between the two agents and returns the result,
+        with a record of every move. An agent that plays an invalid move
+        forfeits the game. Agents with a prepare(rows, cols) method are
+        prepared for the board before the game starts. '''
+    agents = {othello.BLACK: agent_b, othello.WHITE: agent_w}
+    for player in (agent_b, agent_w):
+        if hasattr(player, 'prepare'):
+            player.prepare(game.get_rows(), game.get_columns())
+    thinking = {othello.BLACK: 0.0, othello.WHITE: 0.0}
+    moves = 0
+    record = othello_record.GameRecord.from_game(game)
+
+    while not game.is_game_over():
+        turn = game.get_turn()
+        previous_result = getattr(agents[turn], 'last_result', None)
+        start = time.perf_counter()
+        action = agents[turn].get_next_action(game)
+        seconds = time.perf_counter() - start
+        thinking[turn] += seconds
+        try:
+            game.move(action[0], action[1])
+        except (othello.InvalidMoveException, TypeError, IndexError):
+            record.finish(game, turn)
+            return GameResult(othello.OPPOSITE_TURN[turn],
+                              game.get_total_cells(othello.BLACK), game.get_total_cells(othello.WHITE),
+                              moves, thinking[othello.BLACK], thinking[othello.WHITE], turn, record)
+        record.add_move(game, turn, game.get_geometry().square(action[0], action[1]),
+                        othello_record.move_stats(agents[turn], previous_result, seconds))
+        moves += 1
+
+    record.finish(game)
+    return GameResult(game.return_winner(),
+                      game.get_total_cells(othello.BLACK), game.get_total_cells(othello.WHITE),
+                      moves, thinking[othello.BLACK], thinking[othello.WHITE], record = record)
+
+
+class MatchStats:
+    '''
+    Win/loss/draw totals of agent A against agent B over a match
+    '''
+
+    def __init__(self, name_a: str, name_b: str):
+        self.name_a = name_a
+        self.name_b = name_b
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        self.forfeits = 0
+        # Wins of agent A by the color it played
+        self.wins_as = {othello.BLACK: 0, othello.WHITE: 0}
+        self.games_as = {othello.BLACK: 0, othello.WHITE: 0}
+        self.disc_margin = 0
+        self.time_a = 0.0
+        self.time_b = 0.0
+        self.moves = 0
+
+    def add(self, result: GameResult, color_a: str) -> None:
+        ''' Adds a game in which agent A played color_a '''
+        color_b = othello.OPPOSITE_TURN[color_a]
+        self.games += 1
+        self.games_as[color_a] += 1
+        self.moves += result.moves
+        if result.winner is None:
+            self.draws += 1
+        elif result.winner == color_a:
+            self.wins += 1
+            self.wins_as[color_a] += 1
+        else:
+            self.losses += 1
+        if result.forfeit is not None:
+            self.forfeits += 1
+
+        cells = {othello.BLACK: result.black_cells, othello.WHITE: result.white_cells}
+        self.disc_margin += cells[color_a] - cells[color_b]
+        times = {othello.BLACK: result.black_time, othello.WHITE: result.white_time}
+        self.time_a += times[color_a]
+        self.time_b += times[color_b]
+
+    def score(self) -> float:
+        ''' Returns agent A's score: wins plus half the draws, per game '''
+        if self.games == 0:
+            return 0.0
+        return (self.wins + 0.5 * self.draws) / self.games
+
+    def summary(self) -> str:
+        ''' Returns the totals as printable text '''
+        games = max(self.games, 1)
+        lines = ['{} vs {}: {} games'.format(self.name_a, self.name_b, self.games),
+                 '  {} wins {}, losses {}, draws {} (score {:.3f})'.format(
+                     self.name_a, self.wins, self.losses, self.draws, self.score()),
+                 '  as black {}/{}, as white {}/{}'.format(
+                     self.wins_as[othello.BLACK], self.games_as[othello.BLACK],
+                     self.wins_as[othello.WHITE], self.games_as[othello.WHITE]),
+                 '  average disc margin {:+.2f}, forfeits {}'.format(
+                     float(self.disc_margin) / games, self.forfeits),
+                 '  seconds per game: {} {:.3f}, {} {:.3f}'.format(
+                     self.name_a, self.time_a / games, self.name_b, self.time_b / games)]
+        return '\n'.join(lines)
+
+
+def play_match(spec_a: str, spec_b: str, games: int = DEFAULT_GAMES,
+               rows: int = DEFAULT_ROWS, cols: int = DEFAULT_COLUMNS,
+               first_player: str = DEFAULT_FIRST_PLAYER,
+               top_left: str = DEFAULT_TOP_LEFT_PLAYER,
+               victory_type: str = DEFAULT_VICTORY_TYPE,
+               swap_colors: bool = False, progress=None, writer=None) -> MatchStats:
+    ''' Plays games between two agents given as agent specs, with fresh agents
+        for every game. Agent A plays black unless swap_colors is set, in which
+        case the agents change colors every game. progress, if given, is
+        called with (game number, color of agent A, GameResult) after each game.
+        writer, an othello_record.RecordWriter, is given every game. '''
+    stats = MatchStats(spec_a, spec_b)
+    for number in range(games):
+        color_a = othello.WHITE if swap_colors and number % 2 else othello.BLACK
+        agent_a = make_agent(spec_a)
+        agent_b = make_agent(spec_b)
+        game = new_game(rows, cols, first_player, top_left, victory_type)
+        if color_a == othello.BLACK:
+            result = play_game(agent_a, agent_b, game)
+        else:
+            result = play_game(agent_b, agent_a, game)
+        if writer is not None:
+            result.record.black, result.record.white = ((spec_a, spec_b) if color_a == othello.BLACK
+                                                        else (spec_b, spec_a))
+            writer.write(result.record)
+        stats.add(result, color_a)
+        if progress is not None:
+            progress(number + 1, color_a, result)
+    return stats
+
+
+def color_argument(text: str) -> str:
+    ''' argparse type for a color option '''
+    text = text.upper()
+    if text not in (othello.BLACK, othello.WHITE):
+        raise argparse.ArgumentTypeError('color must be B or W')
+    return text
+
+
+def victory_type_argument(text: str) -> str:
+    ''' argparse type for the victory type option '''
+    text = text.upper()
+    if text not in (othello.MOST_CELLS, othello.LEAST_CELLS):
+        raise argparse.ArgumentTypeError('victory type must be M or L')
+    return text
+
+
+def agent_spec_argument(text: str) -> str:
+    ''' argparse type that checks an agent spec '''
+    try:
+        parse_agent_spec(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    return text
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Plays Othello games between two agents without a display.')
+    parser.add_argument('agent_a', type = agent_spec_argument, help = 'first agent, plays black unless --swap')
+    parser.add_argument('agent_b', type = agent_spec_argument, help = 'second agent')
+    parser.add_argument('--games', type = int, default = DEFAULT_GAMES)
+    parser.add_argument('--rows', type = int, default = DEFAULT_ROWS)
+    parser.add_argument('--cols', type = int, default = DEFAULT_COLUMNS)
+    parser.add_argument('--first', type = color_argument, default = DEFAULT_FIRST_PLAYER,
+                        help = 'color that moves first (B or W)')
+    parser.add_argument('--top-left', type = color_argument, default = DEFAULT_TOP_LEFT_PLAYER,
+                        help = 'color of the top-left center disc (B or W)')
+    parser.add_argument('--victory', type = victory_type_argument, default = DEFAULT_VICTORY_TYPE,
+                        help = 'M: most cells wins, L: least cells wins')
+    parser.add_argument('--swap', action = 'store_true', help = 'agents change colors every game')
+    parser.add_argument('--seed', type = int, help = 'random seed, for repeatable matches')
+    parser.add_argument('--verbose', action = 'store_true', help = 'print every game result')
+    parser.add_argument('--record', help = 'append every game to this record file (see othello_record)')
+    args = parser.parse_args(argv)
+
+    if not 4 <= args.rows <= 16 or not 4 <= args.cols <= 16 or args.rows % 2 or args.cols % 2:
+        parser.error('rows and columns must be even numbers from 4 to 16')
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    progress = None
+    if args.verbose:
+        progress = lambda number, color_a, result: print(
+            'game {}: {} played {}, {}'.format(number, args.agent_a, color_a, result))
+
+    writer = othello_record.RecordWriter(args.record) if args.record else None
+    try:
+        stats = play_match(args.agent_a, args.agent_b, args.games, args.rows, args.cols,
+                           args.first, args.top_left, args.victory, args.swap, progress, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(stats.summary())
+
+
+if __name__ == '__main__':
+    main()
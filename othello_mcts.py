@@ -0,0 +1,266 @@
+#  Array-backed search tree and playouts for the Monte Carlo tree search agent.
+#
+#  The tree does not create one Python object per node. Node n is index n into
+#  a set of parallel arrays (the array module's typed arrays for the numbers,
+#  plain lists for the bitboards, which can be wider than 64 bits). The
+#  children of a node are always created together, so they sit next to each
+#  other and a node only needs the index of its first child and their count.
+#  The tree has a fixed capacity; once it is full, leaves are no longer
+#  expanded and the search carries on with playouts from them.
+#
+#  Every node holds its position as (player, opponent) bitboards with player to
+#  move, plus the color of the player to move (0 black, 1 white) and the color
+#  that moved into it. wins[n] counts the playouts won by that mover (draws
+#  count half), so a parent picks its best child directly by wins / visits.
+
+import array
+import functools
+
+import othello_bitboard
+import othello_ordering
+import othello_rules
+
+try:
+    import numpy
+    import othello_batch
+except ImportError:
+    # Batched playouts need NumPy; without it they run one at a time
+    numpy = None
+
+BLACK = 0
+WHITE = 1
+NO_NODE = -1
+
+# Fewest playouts worth playing as one NumPy batch. Every step of a batch
+# costs a few hundred NumPy calls whatever its size, so small batches are
+# slower per playout than playing one after another: on 8x8, 4000 us per
+# playout in a batch of 8 and 930 in one of 32, against 1000 one at a time,
+# and 480 in a batch of 64.
+BATCH_MIN_PLAYOUTS = 64
+
+
+class SearchTree:
+    '''
+    Fixed-capacity MCTS tree stored in parallel arrays
+    '''
+
+    def __init__(self, capacity: int):
+        ''' Creates an empty tree with room for capacity nodes '''
+        self.capacity = capacity
+        self.parent = array.array('l')
+        self.move = array.array('l')
+        self.turn = array.array('b')
+        self.mover = array.array('b')
+        self.terminal = array.array('b')
+        self.first_child = array.array('l')
+        self.child_count = array.array('l')
+        self.visits = array.array('l')
+        self.wins = array.array('d')
+        self.prior = array.array('d')
+        self.player = []
+        self.opponent = []
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def is_full(self) -> bool:
+        ''' Returns True if no more nodes fit in the tree '''
+        return len(self.parent) >= self.capacity
+
+    def add_node(self, parent: int, move: int, player: int, opponent: int,
+                 turn: int, mover: int, terminal: bool, prior: float = 1.0) -> int:
+        ''' Appends a node and returns its index '''
+        self.parent.append(parent)
+        self.move.append(move)
+        self.turn.append(turn)
+        self.mover.append(mover)
+        self.terminal.append(terminal)
+        self.first_child.append(NO_NODE)
+        self.child_count.append(0)
+        self.visits.append(0)
+        self.wins.append(0.0)
+        self.prior.append(prior)
+        self.player.append(player)
+        self.opponent.append(opponent)
+        return len(self.parent) - 1
+
+    def expand(self, node: int, geometry) -> bool:
+        ''' Creates every child of the node, following the pass rule. Returns
+            False if the tree has no room for them. '''
+        player = self.player[node]
+        opponent = self.opponent[node]
+        turn = self.turn[node]
+        moves = othello_bitboard.squares(othello_rules.legal_moves(geometry, player, opponent))
+        if len(self.parent) + len(moves) > self.capacity:
+            return False
+
+        priors = move_priors(geometry.rows, geometry.cols)
+        total = sum(priors[move] for move in moves)
+        self.first_child[node] = len(self.parent)
+        self.child_count[node] = len(moves)
+        for move in moves:
+            new_player, new_opponent, flipped = othello_rules.apply_move(geometry, player, opponent, move)
+            if othello_rules.legal_moves(geometry, new_opponent, new_player):
+                child = (new_opponent, new_player, 1 - turn, False)
+            elif othello_rules.legal_moves(geometry, new_player, new_opponent):
+                child = (new_player, new_opponent, turn, False)
+            else:
+                child = (new_opponent, new_player, 1 - turn, True)
+            self.add_node(node, move, child[0], child[1], child[2], turn, child[3],
+                          priors[move] / total)
+        return True
+
+    def children(self, node: int) -> range:
+        ''' Returns the indices of the node's children '''
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node])
+
+    def find(self, player: int, opponent: int, turn: int, max_depth: int) -> int:
+        ''' Returns the node at most max_depth moves below the root holding
+            the given position, or NO_NODE '''
+        level = [0] if len(self.parent) else []
+        for depth in range(max_depth + 1):
+            following = []
+            for node in level:
+                if (self.player[node] == player and self.opponent[node] == opponent
+                        and self.turn[node] == turn):
+                    return node
+                following.extend(self.children(node))
+            level = following
+        return NO_NODE
+
+    def subtree(self, node: int) -> 'SearchTree':
+        ''' Returns a new tree of the same capacity holding the subtree under
+            the node, with the node as its root. Everything else is dropped. '''
+        tree = SearchTree(self.capacity)
+        tree.add_node(NO_NODE, self.move[node], self.player[node], self.opponent[node],
+                      self.turn[node], self.mover[node], self.terminal[node], 1.0)
+        tree.visits[0] = self.visits[node]
+        tree.wins[0] = self.wins[node]
+
+        # Breadth-first copy keeps every family of children contiguous
+        queue = [(node, 0)]
+        for old, new in queue:
+            if self.child_count[old] == 0:
+                continue
+            tree.first_child[new] = len(tree.parent)
+            tree.child_count[new] = self.child_count[old]
+            for child in self.children(old):
+                index = tree.add_node(new, self.move[child], self.player[child], self.opponent[child],
+                                      self.turn[child], self.mover[child], self.terminal[child],
+                                      self.prior[child])
+                tree.visits[index] = self.visits[child]
+                tree.wins[index] = self.wins[child]
+                queue.append((child, index))
+        return tree
+
+
+@functools.lru_cache(maxsize = None)
+def move_priors(rows: int, cols: int) -> [float]:
+    ''' Returns a positive prior weight per square derived from the static
+        square weights: corners most likely, squares next to them least '''
+    weights = othello_ordering.square_weights(rows, cols)
+    lowest = min(weights)
+    return [float(weight - lowest + 10) for weight in weights]
+
+
+@functools.lru_cache(maxsize = None)
+def corner_mask(rows: int, cols: int) -> int:
+    ''' Returns the mask of the four corner squares '''
+    geometry = othello_bitboard.geometry(rows, cols)
+    mask = 0
+    for row in (0, rows - 1):
+        for col in (0, cols - 1):
+            mask |= 1 << geometry.square(row, col)
+    return mask
+
+
+def playout(geometry, player: int, opponent: int, turn: int, victory_type: str,
+            generator, take_corners: bool = False) -> float:
+    ''' Plays random moves from the position to the end of the game and
+        returns the result for black: 1 for a win, 0.5 for a draw, 0 for a
+        loss. With take_corners a corner is always taken when one is legal. '''
+    corners = corner_mask(geometry.rows, geometry.cols) if take_corners else 0
+    passed = False
+    while True:
+        moves = othello_bitboard.legal_moves(geometry, player, opponent)
+        if not moves:
+            if passed:
+                break
+            player, opponent = opponent, player
+            turn = 1 - turn
+            passed = True
+            continue
+        passed = False
+        if moves & corners:
+            moves &= corners
+        square = generator.choice(othello_bitboard.squares(moves))
+        flipped = othello_bitboard.flips(geometry, player, opponent, square)
+        player, opponent = opponent ^ flipped, player | flipped | (1 << square)
+        turn = 1 - turn
+
+    return final_result(player, opponent, turn, victory_type)
+
+
+def batch_playouts(geometry, player: int, opponent: int, turn: int, victory_type: str,
+                   count: int, generator, take_corners: bool = False) -> float:
+    ''' Plays count random playouts from the same position and returns the
+        sum of their results for black. With NumPy, a board of at most 64
+        squares and at least BATCH_MIN_PLAYOUTS playouts all of them are
+        played in lockstep on packed bitboards (see othello_batch);
+        otherwise they are played one after another. generator is a
+        random.Random, used to seed the batch. '''
+    if (numpy is None or geometry.size > othello_batch.PACKED_MAX_SQUARES
+            or count < BATCH_MIN_PLAYOUTS):
+        return sum(playout(geometry, player, opponent, turn, victory_type, generator, take_corners)
+                   for index in range(count))
+
+    batch_generator = numpy.random.default_rng(generator.getrandbits(64))
+    corners = numpy.uint64(corner_mask(geometry.rows, geometry.cols) if take_corners else 0)
+    zero = numpy.uint64(0)
+    players = numpy.full(count, player, dtype = numpy.uint64)
+    opponents = numpy.full(count, opponent, dtype = numpy.uint64)
+    turns = numpy.full(count, turn, dtype = numpy.int8)
+
+    moves = othello_batch.legal_moves_packed(geometry, players, opponents)
+    while True:
+        if not moves.all():
+            replies = othello_batch.legal_moves_packed(geometry, opponents, players)
+            # Boards where the player to move has to pass hand the move over
+            passing = (moves == 0) & (replies != 0)
+            players, opponents = (numpy.where(passing, opponents, players),
+                                  numpy.where(passing, players, opponents))
+            turns = numpy.where(passing, 1 - turns, turns)
+            moves = numpy.where(passing, replies, moves)
+            if not moves.any():
+                break
+
+        preferred = moves & corners
+        moves = numpy.where(preferred != 0, preferred, moves)
+        squares = othello_batch.random_moves(othello_batch.unpack(geometry, moves), batch_generator)
+        new_players, new_opponents, flipped = othello_batch.apply_moves_packed(
+            geometry, players, opponents, squares)
+        moving = squares >= 0
+        players = numpy.where(moving, new_opponents, players)
+        opponents = numpy.where(moving, new_players, opponents)
+        turns = numpy.where(moving, 1 - turns, turns)
+        moves = othello_batch.legal_moves_packed(geometry, players, opponents)
+
+    difference = othello_batch.count(players) - othello_batch.count(opponents)
+    if victory_type == othello_rules.LEAST_CELLS:
+        difference = -difference
+    difference = numpy.where(turns == WHITE, -difference, difference)
+    return float((difference > 0).sum() + 0.5 * (difference == 0).sum())
+
+
+def final_result(player: int, opponent: int, turn: int, victory_type: str) -> float:
+    ''' Returns the result for black of a finished game, given with player
+        (of color turn) first: 1 for a win, 0.5 for a draw, 0 for a loss '''
+    score = othello_rules.score(player, opponent, victory_type)
+    if turn == WHITE:
+        score = -score
+    if score > 0:
+        return 1.0
+    if score < 0:
+        return 0.0
+    return 0.5
@@ -0,0 +1,134 @@
+#  Move ordering for the alpha-beta search.
+#
+#  Alpha-beta prunes the most when the best move is searched first. Moves at a
+#  node are ordered:
+#
+#    1. the hash move (best move stored in the transposition table)
+#    2. the killer moves of this ply (moves that caused a cutoff in a
+#       sibling node)
+#    3. everything else by history score (how often and how deep a move
+#       has caused cutoffs anywhere in the tree), with a static square
+#       weight (corners good, squares next to corners bad) breaking ties
+#       and ordering moves that have no history yet.
+
+import functools
+
+import othello_bitboard
+
+KILLERS_PER_PLY = 2
+
+# Static square weights
+CORNER_WEIGHT = 100
+X_SQUARE_WEIGHT = -50
+C_SQUARE_WEIGHT = -20
+EDGE_WEIGHT = 10
+INNER_EDGE_WEIGHT = -5
+CENTER_WEIGHT = 1
+
+
+@functools.lru_cache(maxsize = None)
+def square_weights(rows: int, cols: int) -> [int]:
+    ''' Returns the static weight of every square on a board of the given
+        size. Works for any size, including non-square boards. '''
+    geometry = othello_bitboard.geometry(rows, cols)
+    weights = []
+    for square in range(geometry.size):
+        row, col = geometry.position(square)
+        row_edge = row == 0 or row == rows - 1
+        col_edge = col == 0 or col == cols - 1
+        row_next = row == 1 or row == rows - 2
+        col_next = col == 1 or col == cols - 2
+
+        if row_edge and col_edge:
+            weights.append(CORNER_WEIGHT)
+        elif row_next and col_next:
+            weights.append(X_SQUARE_WEIGHT)
+        elif (row_edge and col_next) or (col_edge and row_next):
+            weights.append(C_SQUARE_WEIGHT)
+        elif row_edge or col_edge:
+            weights.append(EDGE_WEIGHT)
+        elif row_next or col_next:
+            weights.append(INNER_EDGE_WEIGHT)
+        else:
+            weights.append(CENTER_WEIGHT)
+    return weights
+
+
+class MoveOrderer:
+    '''
+    Killer moves, history table and static weights for one search agent
+    '''
+
+    def __init__(self):
+        ''' Creates an orderer with empty killer and history tables '''
+        self._geometry = None
+        self._weights = []
+        self._history = ([], [])
+        self._killers = []
+        self.reset_stats()
+
+    def start_search(self, geometry) -> None:
+        ''' Prepares the tables for a new search on the given board. History
+            is kept between searches on the same board but halved, so
+            old cutoffs slowly fade; killers are only kept for one search. '''
+        if geometry is not self._geometry:
+            self._geometry = geometry
+            self._weights = square_weights(geometry.rows, geometry.cols)
+            self._history = ([0] * geometry.size, [0] * geometry.size)
+        else:
+            for history in self._history:
+                for square in range(len(history)):
+                    history[square] >>= 1
+        self._killers = []
+
+    def order(self, moves: [int], ply: int, side: int, hash_move) -> [int]:
+        ''' Returns the moves (square indices) in the order they should be
+            searched. side is 0 or 1 depending on which player is to move. '''
+        if len(moves) < 2:
+            return moves
+
+        first = []
+        if hash_move is not None and hash_move in moves:
+            first.append(hash_move)
+        if ply < len(self._killers):
+            for killer in self._killers[ply]:
+                if killer in moves and killer not in first:
+                    first.append(killer)
+
+        history = self._history[side]
+        weights = self._weights
+        rest = [move for move in moves if move not in first]
+        rest.sort(key = lambda move: history[move] * 256 + weights[move], reverse = True)
+        return first + rest
+
+    def record_cutoff(self, move: int, ply: int, side: int, depth: int, index: int) -> None:
+        ''' Records that the move caused a beta cutoff at the given ply, with
+            depth plies left to search, as the index-th move tried there. '''
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        while len(self.cutoff_indices) <= index:
+            self.cutoff_indices.append(0)
+        self.cutoff_indices[index] += 1
+
+        self._history[side][move] += depth * depth
+
+        while len(self._killers) <= ply:
+            self._killers.append([])
+        killers = self._killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+
+    def reset_stats(self) -> None:
+        ''' Sets the cutoff counters back to zero '''
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # cutoff_indices[i] counts the cutoffs caused by the i-th move tried
+        self.cutoff_indices = []
+
+    def first_move_cutoff_rate(self) -> float:
+        ''' Returns the share of cutoffs that happened on the first move tried '''
+        if self.cutoffs == 0:
+            return 0.0
+        return float(self.first_move_cutoffs) / self.cutoffs
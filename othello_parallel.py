@@ -0,0 +1,254 @@
+#  Parallel root search across worker processes.
+#
+#  The search agents are pure Python, so a single search only ever uses one
+#  core. ParallelAgent wraps an agent class (AlphaBetaAgent or ExpectimaxAgent)
+#  and splits the moves at the root between the processes of a SearchPool.
+#  Every worker searches the same position restricted to its share of the root
+#  moves (the agents' root_moves option) and the best result wins.
+#
+#  The pool is persistent: worker processes are started on the first search and
+#  reused for every later move, so process start-up is paid once per game or
+#  tournament rather than once per move. Each worker also keeps its own agent
+#  instance between tasks, so its transposition table and history tables stay
+#  warm from one move to the next.
+#
+#  Root splitting gives up the alpha-beta bound that a serial search would pass
+#  from the first root moves to the later ones, so the workers together search
+#  more nodes than a serial search of the same depth. In exchange they search
+#  them at the same time. With a time budget this usually means one or two plies
+#  of extra depth on a many-core machine.
+#
+#  ParallelMCTSAgent uses root parallelism instead: every worker grows its own
+#  MCTSAgent tree from the same position with a different random stream, and
+#  the visit counts and wins at the roots are summed. The worker agents are
+#  kept between moves as well, so each of them can reuse its tree.
+
+import itertools
+import multiprocessing
+import os
+import random
+import time
+
+import agent
+import othello
+import othello_ordering
+
+
+class SearchPool:
+    '''
+    A persistent pool of worker processes shared by parallel searches
+    '''
+
+    def __init__(self, workers: int = None):
+        ''' Creates a pool of the given number of workers (default: one per
+            CPU core). The processes are only started on first use. '''
+        self.workers = workers or multiprocessing.cpu_count()
+        self._pool = None
+
+    def map(self, function, tasks: list) -> list:
+        ''' Runs function on every task in the worker processes and returns
+            the results in the same order '''
+        return self._get_pool().map(function, tasks, chunksize = 1)
+
+    def imap_unordered(self, function, tasks: list):
+        ''' Runs function on every task in the worker processes and yields
+            the results as they finish '''
+        return self._get_pool().imap_unordered(function, tasks, chunksize = 1)
+
+    def close(self) -> None:
+        ''' Shuts the worker processes down '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def _get_pool(self):
+        ''' Returns the process pool, starting it on first use '''
+        if self._pool is None:
+            # Reseed every worker, or forked workers would all draw the
+            # same random numbers
+            self._pool = multiprocessing.Pool(self.workers, initializer = random.seed)
+        return self._pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParallelAgent:
+    '''
+    Runs one of the search agents with its root moves split across a SearchPool
+    '''
+
+    def __init__(self, agent_class, workers: int = None, pool: SearchPool = None, **agent_kwargs):
+        ''' agent_kwargs are passed to agent_class in every worker. Give an
+            existing pool to share its processes between several agents. '''
+        self.pool = pool or SearchPool(workers)
+        self.last_result = None
+        self._agent_class = agent_class
+        self._agent_kwargs = agent_kwargs
+        self._agent_id = _new_agent_id()
+        # Used for positions that are not worth splitting
+        self._local_agent = agent_class(**agent_kwargs)
+
+    def get_next_action(self, board_state, time_budget_ms=None):
+        return self.search(board_state, time_budget_ms).move
+
+    def search(self, board_state, time_budget_ms=None):
+        ''' Searches the game's current position in parallel and returns
+            the merged SearchResult '''
+        start = time.perf_counter()
+        moves = board_state.legal_squares()
+        endgame_empties = getattr(self._local_agent, 'endgame_empties', None)
+
+        # Splitting a single move is pointless, and the endgame solver is not
+        # split because it needs the whole root to prove its result
+        if (self.pool.workers < 2 or len(moves) < 2
+                or (endgame_empties and board_state.get_empty_cells() <= endgame_empties)):
+            self.last_result = self._local_agent.search(board_state, time_budget_ms = time_budget_ms)
+            return self.last_result
+
+        position = board_state.get_position()
+        tasks = [(self._agent_id, self._agent_class, self._agent_kwargs, position, share, time_budget_ms)
+                 for share in self._split(board_state, moves)]
+        results = self.pool.map(_search_root_moves, tasks)
+        self.last_result = _merge_results(board_state.get_geometry(), results,
+                                          time.perf_counter() - start)
+        return self.last_result
+
+    def close(self) -> None:
+        ''' Shuts the agent's worker processes down '''
+        self.pool.close()
+
+    def _split(self, board_state, moves: [int]) -> [[int]]:
+        ''' Deals the root moves out to the workers, best-looking moves first,
+            so every worker gets a similar mix of promising and poor moves '''
+        weights = othello_ordering.square_weights(board_state.get_rows(), board_state.get_columns())
+        moves = sorted(moves, key = lambda move: weights[move], reverse = True)
+        shares = min(self.pool.workers, len(moves))
+        return [moves[index::shares] for index in range(shares)]
+
+
+class ParallelMCTSAgent:
+    '''
+    Root-parallel Monte Carlo tree search over a SearchPool
+    '''
+
+    def __init__(self, workers: int = None, pool: SearchPool = None, **mcts_kwargs):
+        ''' mcts_kwargs are passed to the MCTSAgent in every worker. Set
+            leaf_playouts to othello_mcts.BATCH_MIN_PLAYOUTS or more to also
+            batch playouts inside each worker. '''
+        self.pool = pool or SearchPool(workers)
+        self.last_result = None
+        self._mcts_kwargs = mcts_kwargs
+        self._agent_id = _new_agent_id()
+
+    def get_next_action(self, board_state, time_budget_ms=None):
+        return self.search(board_state, time_budget_ms).move
+
+    def search(self, board_state, time_budget_ms=None):
+        ''' Searches the position in every worker and returns a SearchResult
+            for the move with the most visits over all the workers' trees '''
+        start = time.perf_counter()
+        seed = self._mcts_kwargs.get('seed')
+        position = board_state.get_position()
+        # Each tree is tied to a slot rather than a process, so a process
+        # that happens to run two slots never merges the same tree twice
+        tasks = [(self._agent_id, slot, self._mcts_kwargs, position, time_budget_ms,
+                  None if seed is None else seed + slot)
+                 for slot in range(self.pool.workers)]
+        results = self.pool.map(_search_mcts, tasks)
+
+        visits = {}
+        wins = {}
+        for statistics, nodes, depth in results:
+            for square, square_visits, square_wins in statistics:
+                visits[square] = visits.get(square, 0) + square_visits
+                wins[square] = wins.get(square, 0.0) + square_wins
+        square = max(visits, key = lambda square: visits[square])
+        move = list(board_state.get_geometry().position(square))
+        self.last_result = agent.SearchResult(move, wins[square] / max(visits[square], 1), [move],
+                                              sum(nodes for statistics, nodes, depth in results),
+                                              max(depth for statistics, nodes, depth in results),
+                                              time.perf_counter() - start)
+        return self.last_result
+
+    def close(self) -> None:
+        ''' Shuts the agent's worker processes down '''
+        self.pool.close()
+
+
+# Agent instances kept in each worker process, keyed by the id of the
+# ParallelAgent or ParallelMCTSAgent they search for (and the slot). The
+# arguments themselves may be unhashable or arrive as new objects with every
+# task, so they cannot serve as the key.
+_worker_agents = {}
+_agent_ids = itertools.count()
+
+
+def _new_agent_id() -> tuple:
+    ''' Returns an id for a parallel agent, unique among the agents of every
+        process that may share a pool '''
+    return os.getpid(), next(_agent_ids)
+
+
+def _search_mcts(task):
+    ''' Worker task: grows one slot's MCTS tree and returns its root statistics '''
+    agent_id, slot, mcts_kwargs, position, time_budget_ms, seed = task
+    key = (agent_id, slot)
+    if key not in _worker_agents:
+        kwargs = dict(mcts_kwargs)
+        kwargs['seed'] = seed
+        _worker_agents[key] = agent.MCTSAgent(**kwargs)
+    searcher = _worker_agents[key]
+
+    result = searcher.search(othello.OthelloGame.from_position(position), time_budget_ms = time_budget_ms)
+    return searcher.root_statistics(), result.nodes, result.depth
+
+
+def _search_root_moves(task):
+    ''' Worker task: searches a position restricted to some of its root moves '''
+    agent_id, agent_class, agent_kwargs, position, root_moves, time_budget_ms = task
+    key = agent_id
+    if key not in _worker_agents:
+        _worker_agents[key] = agent_class(**agent_kwargs)
+    searcher = _worker_agents[key]
+
+    game = othello.OthelloGame.from_position(position)
+    return searcher.search(game, time_budget_ms = time_budget_ms, root_moves = root_moves)
+
+
+def _merge_results(geometry, results: list, elapsed: float):
+    ''' Combines the workers' results. With a time budget the workers may have
+        reached different depths, and scores from different depths are not
+        comparable, so the best move is chosen at the deepest depth every
+        worker completed. '''
+    common_depth = min(len(result.iterations) and result.iterations[-1][0] for result in results)
+    merged = None
+    iterations = []
+
+    for depth in range(1, common_depth + 1):
+        best = None
+        for result in results:
+            for iteration in result.iterations:
+                if iteration[0] == depth and (best is None or iteration[1] > best[0][1]):
+                    best = (iteration, result)
+        if best is not None:
+            iterations.append(best[0])
+            merged = best
+
+    if merged is None:
+        best_result = results[0]
+        move, score = best_result.move, None
+    else:
+        iteration, best_result = merged
+        move, score = list(geometry.position(iteration[2])), iteration[1]
+
+    if best_result.depth == common_depth and best_result.pv and best_result.pv[0] == move:
+        pv = best_result.pv
+    else:
+        pv = [move]
+    return results[0].__class__(move, score, pv, sum(result.nodes for result in results),
+                                common_depth, elapsed, iterations)
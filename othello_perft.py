@@ -0,0 +1,291 @@
+#  Perft: move generator counts, cross-checks and throughput.
+#
+#  perft(d) is the number of leaves of the game tree d plies below a position:
+#  every legal move is a ply, and so is a pass (when the side to move has no
+#  move but the other side does). A game that ends before ply d is one leaf,
+#  at the ply where it ended. Counting every tree down to some depth exercises
+#  move generation, flipping and the pass rule on a very large number of
+#  positions, so two implementations that agree on perft almost certainly
+#  play the same game.
+#
+#  The engines:
+#
+#      rules      othello_rules on bitboards (what the agents search with)
+#      game       OthelloGame.make_move() / unmake_move()
+#      batch      othello_batch, one NumPy batch per ply (packed bitboards
+#                 up to 64 squares, boolean boards above)
+#      reference  othello_reference, the original list-of-lists game
+#
+#  Every engine walks the same tree and reports the perft of every depth up
+#  to the one asked for, plus the nodes it visited and how fast. With --check
+#  the engines are compared with each other, and the standard 8x8 start
+#  position with the published counts, and the exit status is 1 on any
+#  difference.
+#
+#      python othello_perft.py --depth 6
+#      python othello_perft.py --depth 5 --sizes 4x4 6x10 16x16 --check
+#      python othello_perft.py --depth 4 --corpus --engines rules batch reference --check
+
+import argparse
+import sys
+import time
+
+import othello
+import othello_benchmark
+import othello_bitboard
+import othello_reference
+import othello_rules
+
+try:
+    import numpy
+    import othello_batch
+except ImportError:
+    # The batch engine needs NumPy
+    numpy = None
+
+RULES = 'rules'
+GAME = 'game'
+BATCH = 'batch'
+REFERENCE = 'reference'
+ENGINES = (RULES, GAME, BATCH, REFERENCE)
+
+DEFAULT_DEPTH = 5
+# perft(1) ... perft(8) of the standard 8x8 start position
+STANDARD_8X8 = [4, 12, 56, 244, 1396, 8200, 55092, 390216]
+
+
+class PerftResult:
+    '''
+    Counts from one perft run
+    '''
+
+    def __init__(self, engine: str, nodes: [int], ends: [int], elapsed: float):
+        ''' nodes[ply] is the number of positions reached at each ply (the
+            root is ply 0) and ends[ply] the number of those where the game
+            was over, for plies below the depth searched '''
+        self.engine = engine
+        self.nodes = nodes
+        self.ends = ends
+        self.elapsed = elapsed
+
+    def counts(self) -> [int]:
+        ''' Returns perft(1), perft(2), ... up to the depth searched '''
+        counts = []
+        ended = self.ends[0]
+        for ply in range(1, len(self.nodes)):
+            counts.append(self.nodes[ply] + ended)
+            ended += self.ends[ply] if ply < len(self.ends) else 0
+        return counts
+
+    def total_nodes(self) -> int:
+        return sum(self.nodes[1:])
+
+    def nodes_per_second(self) -> float:
+        return self.total_nodes() / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def perft(position: tuple, depth: int, engine: str = RULES) -> PerftResult:
+    ''' Runs perft to the given depth from a position tuple (see
+        OthelloGame.get_position) with one of the ENGINES '''
+    nodes = [1] + [0] * depth
+    ends = [0] * depth
+    start = time.perf_counter()
+    if engine == RULES:
+        rows, cols, turn, victory_type, black, white = position
+        player, opponent = (black, white) if turn == othello.BLACK else (white, black)
+        _perft_rules(othello_bitboard.geometry(rows, cols), player, opponent, depth, 0, nodes, ends)
+    elif engine == GAME:
+        _perft_game(othello.OthelloGame.from_position(position), depth, 0, nodes, ends)
+    elif engine == BATCH:
+        if numpy is None:
+            raise ValueError('the batch engine needs NumPy')
+        _perft_batch(position, depth, nodes, ends)
+    elif engine == REFERENCE:
+        _perft_game(_reference_game(position), depth, 0, nodes, ends)
+    else:
+        raise ValueError('unknown perft engine: ' + str(engine))
+    return PerftResult(engine, nodes, ends, time.perf_counter() - start)
+
+
+def _perft_rules(geometry, player: int, opponent: int, depth: int, ply: int,
+                 nodes: [int], ends: [int]) -> None:
+    moves = othello_rules.legal_moves(geometry, player, opponent)
+    if not moves:
+        if not othello_rules.legal_moves(geometry, opponent, player):
+            ends[ply] += 1
+            return
+        nodes[ply + 1] += 1
+        if ply + 1 < depth:
+            _perft_rules(geometry, opponent, player, depth, ply + 1, nodes, ends)
+        return
+
+    for square in othello_bitboard.squares(moves):
+        new_player, new_opponent, flipped = othello_rules.apply_move(geometry, player, opponent, square)
+        nodes[ply + 1] += 1
+        if ply + 1 < depth:
+            _perft_rules(geometry, new_opponent, new_player, depth, ply + 1, nodes, ends)
+
+
+# The game engines pass on their own: after a move the turn stays with the
+# mover when the opponent cannot reply. The position in between, where the
+# opponent has to pass, is a ply of its own here.
+def _perft_game(game, depth: int, ply: int, nodes: [int], ends: [int]) -> None:
+    moves = _game_moves(game)
+    if not moves:
+        if game.is_game_over():
+            ends[ply] += 1
+            return
+        # Only possible at the root, which nothing has moved into
+        game.switch_turn()
+        nodes[ply + 1] += 1
+        if ply + 1 < depth:
+            _perft_game(game, depth, ply + 1, nodes, ends)
+        game.switch_turn()
+        return
+
+    for square in moves:
+        mover = game.get_turn()
+        child = _game_play(game, square)
+        nodes[ply + 1] += 1
+        if ply + 1 < depth:
+            if child.get_turn() == mover and not child.is_game_over():
+                # The opponent passed
+                nodes[ply + 2] += 1
+                if ply + 2 < depth:
+                    _perft_game(child, depth, ply + 2, nodes, ends)
+            else:
+                _perft_game(child, depth, ply + 1, nodes, ends)
+        _game_unplay(game, child)
+
+
+def _game_moves(game) -> [int]:
+    if isinstance(game, othello_reference.OthelloGame):
+        game.can_move(game.get_turn())
+        return sorted(set(row * game.get_columns() + col for row, col in game.possible_moves))
+    return game.legal_squares()
+
+
+def _game_play(game, square: int):
+    ''' Plays a move: in place on an OthelloGame, on a copy of a reference game '''
+    if isinstance(game, othello_reference.OthelloGame):
+        child = othello_reference.OthelloGame(game.rows, game.cols, game.turn, othello.WHITE, game.victory_type)
+        child.current_board = [row[:] for row in game.current_board]
+        child.move(square // game.cols, square % game.cols)
+        return child
+    game.make_move(square)
+    return game
+
+
+def _game_unplay(game, child) -> None:
+    if child is game:
+        game.unmake_move()
+
+
+def _reference_game(position: tuple) -> othello_reference.OthelloGame:
+    ''' Creates a reference game holding a position tuple '''
+    rows, cols, turn, victory_type, black, white = position
+    game = othello_reference.OthelloGame(rows, cols, turn, othello.WHITE, victory_type)
+    for row in range(rows):
+        for col in range(cols):
+            square = row * cols + col
+            if black >> square & 1:
+                game.current_board[row][col] = othello.BLACK
+            elif white >> square & 1:
+                game.current_board[row][col] = othello.WHITE
+            else:
+                game.current_board[row][col] = othello.NONE
+    return game
+
+
+def _perft_batch(position: tuple, depth: int, nodes: [int], ends: [int]) -> None:
+    ''' Expands the tree one ply at a time, every position of a ply in one
+        batch '''
+    rows, cols, turn, victory_type, black, white = position
+    geometry = othello_bitboard.geometry(rows, cols)
+    game = othello.OthelloGame.from_position(position)
+    packed = geometry.size <= othello_batch.PACKED_MAX_SQUARES
+    if packed:
+        player, opponent = othello_batch.from_games_packed([game])
+        legal = lambda player, opponent: othello_batch.legal_moves_packed(geometry, player, opponent)
+        apply = lambda player, opponent, moves: othello_batch.apply_moves_packed(geometry, player, opponent, moves)
+        any_move = lambda moves: moves != 0
+        squares = lambda moves: othello_batch.unpack(geometry, moves).reshape(len(moves), -1)
+    else:
+        player, opponent = othello_batch.from_games([game])
+        legal = othello_batch.legal_moves
+        apply = othello_batch.apply_moves
+        any_move = lambda moves: moves.any(axis = (1, 2))
+        squares = lambda moves: moves.reshape(len(moves), -1)
+
+    for ply in range(depth):
+        if not len(player):
+            # Every game ended
+            break
+        moves = legal(player, opponent)
+        moving = any_move(moves)
+        passing = ~moving & any_move(legal(opponent, player))
+        ends[ply] += int((~moving & ~passing).sum())
+        boards, moved = numpy.nonzero(squares(moves))
+        new_player, new_opponent, flipped = apply(player[boards], opponent[boards], moved)
+        # Children are seen from the side to move: the opponent after a move,
+        # the same side after a pass
+        player, opponent = (numpy.concatenate([new_opponent, opponent[passing]]),
+                            numpy.concatenate([new_player, player[passing]]))
+        nodes[ply + 1] = len(player)
+
+
+def check(position: tuple, depth: int, engines=ENGINES) -> ([PerftResult], [str]):
+    ''' Runs every engine on the position and returns their results and a
+        line for every engine whose counts differ from the first one's '''
+    results = [perft(position, depth, engine) for engine in engines]
+    problems = []
+    for result in results[1:]:
+        if result.counts() != results[0].counts():
+            problems.append('{} gives {}, {} gives {}'.format(results[0].engine, results[0].counts(),
+                                                              result.engine, result.counts()))
+    return results, problems
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Counts Othello game trees to check and time move generators.')
+    parser.add_argument('--depth', type = int, default = DEFAULT_DEPTH)
+    parser.add_argument('--engines', nargs = '+', choices = ENGINES,
+                        default = [engine for engine in ENGINES if engine != BATCH or numpy is not None])
+    parser.add_argument('--sizes', nargs = '+', type = othello_benchmark.size_argument, default = [(8, 8)],
+                        help = 'start positions of these board sizes (default: 8x8)')
+    parser.add_argument('--corpus', action = 'store_true',
+                        help = 'use the benchmark corpus positions instead of start positions')
+    parser.add_argument('--check', action = 'store_true',
+                        help = 'compare the engines and the known 8x8 counts; exit with status 1 on a difference')
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        positions = othello_benchmark.corpus(args.sizes)
+    else:
+        positions = [('{}x{}-start'.format(rows, cols),
+                      othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+                      .get_position())
+                     for rows, cols in args.sizes]
+
+    failed = False
+    for name, position in positions:
+        results, problems = check(position, args.depth, args.engines)
+        print(name)
+        for result in results:
+            print('  {:10} {:8.3f}s {:>10} nodes/s  {}'.format(
+                result.engine, result.elapsed, int(result.nodes_per_second()), result.counts()))
+        if args.check:
+            if name == '8x8-start':
+                known = STANDARD_8X8[:args.depth]
+                if results[0].counts()[:len(known)] != known:
+                    problems.append('{} gives {}, the known counts are {}'.format(
+                        results[0].engine, results[0].counts()[:len(known)], known))
+            for problem in problems:
+                print('  MISMATCH: ' + problem)
+            failed = failed or bool(problems)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,434 @@
+#  Game records.
+#
+#  A record file holds finished games one after another: every game's settings
+#  (board size, the color that moved first, the top-left center disc, the
+#  victory type), the names of the two players, every ply (a move or a pass),
+#  what the player's search reported for each move, and the result. Files are
+#  only ever appended to, a game at a time (RecordWriter), and read back one
+#  game at a time (read_records), so a log of any size is written and scanned
+#  in constant memory. A path ending in .gz is written and read through gzip.
+#
+#  File layout (little-endian):
+#
+#      header   MAGIC, once at the start of the file
+#      games    byte length of the game (uint32), then the game:
+#
+#                   rows (uint8), cols (uint8), first player (1 byte),
+#                   top-left color (1 byte), victory type (1 byte), flags (uint8),
+#                   plies (uint16), black discs (uint16), white discs (uint16),
+#                   winner (1 byte, NONE for a draw), forfeit (1 byte, NONE if none)
+#                   black player, white player: length (uint8) and UTF-8 name
+#                   with START_POSITION: black and white bitboards of the start
+#                   position, (rows * cols + 7) // 8 bytes each
+#                   plies: the square of every move, one byte per ply on boards
+#                   of fewer than 255 squares and two above, all ones for a pass
+#                   with STATS: nodes (int64), seconds (float32), depth (int16),
+#                   score (float32) for every ply; -1 and NaN where unknown
+#
+#  Games that did not start from the usual four discs (tournament openings,
+#  say) carry their start position and a top-left color of NONE. Every game
+#  is flushed as soon as it is written. A game cut off by a crash in the
+#  middle of writing it is skipped by the reader and removed by the next
+#  RecordWriter to open the file, before it appends anything.
+#
+#      python othello_match.py alphabeta random --games 100 --record games.rec
+#      python othello_record.py games.rec
+#      python othello_record.py games.rec --print 3
+
+import argparse
+import gzip
+import math
+import os
+import struct
+
+import othello
+
+MAGIC = b'OTHREC01'
+LENGTH = struct.Struct('<I')
+GAME = struct.Struct('<BBcccBHHHcc')
+MOVE_STATS = struct.Struct('<qfhf')
+
+# Flags
+START_POSITION = 1
+STATS = 2
+
+# A pass in a record's list of plies
+PASS = -1
+NAME_LIMIT = 255
+
+
+class GameRecord:
+    '''
+    One game: its settings, players, plies, per-move search stats and result
+    '''
+
+    def __init__(self, rows: int, cols: int, first_player: str, top_left: str, victory_type: str,
+                 black: str = '', white: str = '', start=None):
+        ''' start is the (black, white) bitboards the game started from, or
+            None for the usual four discs of top_left. moves lists the square
+            of every ply, PASS for a pass, and stats holds, for every ply,
+            (nodes, depth, seconds, score) or None. '''
+        self.rows = rows
+        self.cols = cols
+        self.first_player = first_player
+        self.top_left = top_left
+        self.victory_type = victory_type
+        self.black = black
+        self.white = white
+        self.start = start
+        self.moves = []
+        self.stats = []
+        self.black_cells = 0
+        self.white_cells = 0
+        self.winner = None
+        self.forfeit = None
+        # Set by finish(): only finished games are written to record files
+        self.finished = False
+
+    def __repr__(self):
+        return ('GameRecord({}x{}, {} vs {}, {} plies, winner={}, black={}, white={})'
+                .format(self.rows, self.cols, self.black or '?', self.white or '?', len(self.moves),
+                        self.winner, self.black_cells, self.white_cells))
+
+    @classmethod
+    def from_game(cls, game: othello.OthelloGame, black: str = '', white: str = '') -> 'GameRecord':
+        ''' Starts a record of a game about to be played from its current
+            position '''
+        position = game.get_position()
+        rows, cols, turn, victory_type, black_discs, white_discs = position
+        for top_left in (othello.WHITE, othello.BLACK):
+            if othello.OthelloGame(rows, cols, turn, top_left, victory_type).get_position() == position:
+                return cls(rows, cols, turn, top_left, victory_type, black, white)
+        return cls(rows, cols, turn, othello.NONE, victory_type, black, white, (black_discs, white_discs))
+
+    def add_move(self, game: othello.OthelloGame, mover: str, square: int, stats=None) -> None:
+        ''' Records a move mover just played on the square. game is the game
+            after the move: if mover is still to move, the opponent passed,
+            which is recorded too. '''
+        self.moves.append(square)
+        self.stats.append(stats)
+        if game.get_turn() == mover and not game.is_game_over():
+            self.moves.append(PASS)
+            self.stats.append(None)
+
+    def finish(self, game: othello.OthelloGame, forfeit: str = None) -> None:
+        ''' Records the result of the game as it stands. forfeit is the color
+            that lost by playing an invalid move. '''
+        self.black_cells = game.get_total_cells(othello.BLACK)
+        self.white_cells = game.get_total_cells(othello.WHITE)
+        self.forfeit = forfeit
+        if forfeit is not None:
+            self.winner = othello.OPPOSITE_TURN[forfeit]
+        else:
+            self.winner = game.return_winner()
+        self.finished = True
+
+    def start_game(self) -> othello.OthelloGame:
+        ''' Returns a new game in the record's start position '''
+        if self.start is None:
+            return othello.OthelloGame(self.rows, self.cols, self.first_player, self.top_left, self.victory_type)
+        black, white = self.start
+        return othello.OthelloGame.from_position((self.rows, self.cols, self.first_player,
+                                                  self.victory_type, black, white))
+
+    def squares(self) -> [int]:
+        ''' Returns the squares of the moves, without the passes '''
+        return [square for square in self.moves if square != PASS]
+
+    def replay(self):
+        ''' Yields (game, square, stats) for every move, game being the game
+            before the move. It is one game played forward in place, so copy
+            it to keep a position. Passes are checked but not yielded: the
+            game passes by itself. Raises ValueError if the record does not
+            replay. '''
+        game = self.start_game()
+        for ply, square in enumerate(self.moves):
+            if square == PASS:
+                continue
+            if square not in game.legal_squares():
+                raise ValueError('ply {} of the record is not a legal move'.format(ply))
+            yield game, square, self.stats[ply] if self.stats else None
+            mover = game.get_turn()
+            game.make_move(square)
+            passed = ply + 1 < len(self.moves) and self.moves[ply + 1] == PASS
+            if passed != (game.get_turn() == mover and not game.is_game_over()):
+                raise ValueError('the passes in the record do not match the moves after ply {}'.format(ply))
+
+    def final_game(self) -> othello.OthelloGame:
+        ''' Returns the game after the last recorded move '''
+        game = self.start_game()
+        for square in self.squares():
+            game.make_move(square)
+        return game
+
+
+def move_stats(searcher, previous_result, seconds: float) -> tuple:
+    ''' Returns the (nodes, depth, seconds, score) of a move an agent just
+        chose in seconds. previous_result is the agent's last_result from
+        before the move: agents that did not report a new SearchResult only
+        get their time recorded. '''
+    result = getattr(searcher, 'last_result', None)
+    if result is None or result is previous_result:
+        return (None, None, seconds, None)
+    return (result.nodes, result.depth, seconds, result.score)
+
+
+def encode(record: GameRecord) -> bytes:
+    ''' Returns a game as it is stored in a record file, without its length '''
+    size = record.rows * record.cols
+    flags = STATS if any(stats is not None for stats in record.stats) else 0
+    if record.start is not None:
+        flags |= START_POSITION
+    parts = [GAME.pack(record.rows, record.cols, record.first_player.encode(), record.top_left.encode(),
+                       record.victory_type.encode(), flags, len(record.moves),
+                       record.black_cells, record.white_cells,
+                       (record.winner or othello.NONE).encode(), (record.forfeit or othello.NONE).encode())]
+    for name in (record.black, record.white):
+        encoded = name.encode()[:NAME_LIMIT]
+        parts.append(bytes([len(encoded)]) + encoded)
+    if record.start is not None:
+        length = (size + 7) // 8
+        parts.extend(board.to_bytes(length, 'little') for board in record.start)
+    square_format, square_pass = _square_format(size)
+    parts.append(struct.pack('<{}{}'.format(len(record.moves), square_format),
+                             *(square_pass if square == PASS else square for square in record.moves)))
+    if flags & STATS:
+        for stats in record.stats:
+            nodes, depth, seconds, score = stats or (None, None, None, None)
+            parts.append(MOVE_STATS.pack(-1 if nodes is None else nodes,
+                                         math.nan if seconds is None else seconds,
+                                         -1 if depth is None else depth,
+                                         math.nan if score is None else score))
+    return b''.join(parts)
+
+
+def decode(data: bytes) -> GameRecord:
+    ''' Returns the game stored in data, as written by encode() '''
+    (rows, cols, first_player, top_left, victory_type, flags, plies,
+     black_cells, white_cells, winner, forfeit) = GAME.unpack_from(data)
+    offset = GAME.size
+    names = []
+    for player in range(2):
+        length = data[offset]
+        names.append(data[offset + 1:offset + 1 + length].decode(errors = 'replace'))
+        offset += 1 + length
+    start = None
+    if flags & START_POSITION:
+        length = (rows * cols + 7) // 8
+        start = (int.from_bytes(data[offset:offset + length], 'little'),
+                 int.from_bytes(data[offset + length:offset + 2 * length], 'little'))
+        offset += 2 * length
+
+    record = GameRecord(rows, cols, first_player.decode(), top_left.decode(), victory_type.decode(),
+                        names[0], names[1], start)
+    square_format, square_pass = _square_format(rows * cols)
+    squares = struct.unpack_from('<{}{}'.format(plies, square_format), data, offset)
+    record.moves = [PASS if square == square_pass else square for square in squares]
+    offset += struct.calcsize('<{}{}'.format(plies, square_format))
+    record.stats = [None] * plies
+    if flags & STATS:
+        for ply in range(plies):
+            nodes, seconds, depth, score = MOVE_STATS.unpack_from(data, offset)
+            offset += MOVE_STATS.size
+            stats = (None if nodes < 0 else nodes, None if depth < 0 else depth,
+                     None if math.isnan(seconds) else seconds,
+                     None if math.isnan(score) else score)
+            # A ply without stats was written as all unknown
+            if record.moves[ply] != PASS and stats != (None, None, None, None):
+                record.stats[ply] = stats
+    record.black_cells = black_cells
+    record.white_cells = white_cells
+    record.winner = None if winner.decode() == othello.NONE else winner.decode()
+    record.forfeit = None if forfeit.decode() == othello.NONE else forfeit.decode()
+    # Every finished game has discs on the board
+    record.finished = black_cells + white_cells > 0
+    return record
+
+
+def _square_format(size: int) -> (str, int):
+    ''' Returns the struct format of a square on a board of the given size
+        and the value standing for a pass '''
+    if size < 0xff:
+        return 'B', 0xff
+    return 'H', 0xffff
+
+
+def _open(path: str, mode: str):
+    ''' Opens a record file, through gzip if its name ends in .gz '''
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+class RecordWriter:
+    '''
+    Appends games to a record file
+    '''
+
+    def __init__(self, path: str):
+        ''' Opens the file for appending, creating it if needed. A game left
+            half written at the end of the file is cut off first. Raises
+            ValueError if the file exists but is not a record file. '''
+        self.path = path
+        self.games = 0
+        end = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            end = _complete_end(path)
+        if end is None:
+            self._file = _open(path, 'wb')
+            self._file.write(MAGIC)
+            self._file.flush()
+            return
+        if path.endswith('.gz'):
+            if _readable_end(path) != end:
+                _rewrite_prefix(path, end)
+        elif os.path.getsize(path) != end:
+            os.truncate(path, end)
+        self._file = _open(path, 'ab')
+
+    def write(self, record: GameRecord) -> None:
+        ''' Appends one game and flushes it. Raises ValueError if the game
+            was not finished (see GameRecord.finish), which would read back
+            as a draw with no discs. '''
+        if not record.finished:
+            raise ValueError('only finished games can be recorded')
+        data = encode(record)
+        self._file.write(LENGTH.pack(len(data)) + data)
+        self._file.flush()
+        self.games += 1
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _complete_end(path: str):
+    ''' Returns the (uncompressed) offset just past the last complete game
+        of a record file, or None if the file holds less than MAGIC, which
+        happens when a writer was stopped right after creating it. Raises
+        ValueError if the file is not a record file. '''
+    with _open(path, 'rb') as file:
+        magic = _read(file, len(MAGIC))
+        if magic != MAGIC:
+            if MAGIC.startswith(magic):
+                return None
+            raise ValueError(path + ' is not a game record file')
+        end = len(MAGIC)
+        while True:
+            header = _read(file, LENGTH.size)
+            if len(header) < LENGTH.size:
+                return end
+            length = LENGTH.unpack(header)[0]
+            if len(_read(file, length)) < length:
+                return end
+            end += LENGTH.size + length
+
+
+def _readable_end(path: str):
+    ''' Returns how many uncompressed bytes a gzip file holds, or None if
+        its compressed stream was cut off '''
+    total = 0
+    with _open(path, 'rb') as file:
+        while True:
+            try:
+                chunk = file.read(1 << 16)
+            except EOFError:
+                return None
+            if not chunk:
+                return total
+            total += len(chunk)
+
+
+def _rewrite_prefix(path: str, end: int) -> None:
+    ''' Replaces a gzip record file with its first end uncompressed bytes,
+        copying through a temporary file in constant memory '''
+    temporary = path + '.tmp.gz'
+    with _open(path, 'rb') as source, _open(temporary, 'wb') as target:
+        left = end
+        while left:
+            chunk = source.read(min(left, 1 << 16))
+            target.write(chunk)
+            left -= len(chunk)
+    os.replace(temporary, path)
+
+
+def _read(file, size: int) -> bytes:
+    ''' Reads up to size bytes, stopping at a gzip stream that was cut off
+        instead of raising '''
+    try:
+        return file.read(size)
+    except EOFError:
+        return b''
+
+
+def read_records(path: str):
+    ''' Yields every finished game in a record file, in the order they were
+        written '''
+    with _open(path, 'rb') as file:
+        if _read(file, len(MAGIC)) != MAGIC:
+            raise ValueError(path + ' is not a game record file')
+        while True:
+            header = _read(file, LENGTH.size)
+            if len(header) < LENGTH.size:
+                return
+            length = LENGTH.unpack(header)[0]
+            data = _read(file, length)
+            if len(data) < length:
+                # The last game was cut off while it was being written
+                return
+            record = decode(data)
+            if record.finished:
+                yield record
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Summarizes Othello game record files.')
+    parser.add_argument('records', nargs = '+', help = 'record files')
+    parser.add_argument('--print', type = int, default = 0, metavar = 'N', dest = 'games',
+                        help = 'also print the first N games move by move')
+    args = parser.parse_args(argv)
+
+    totals = {}
+    printed = 0
+    for path in args.records:
+        for record in read_records(path):
+            key = (record.rows, record.cols, record.victory_type)
+            total = totals.setdefault(key, {'games': 0, othello.BLACK: 0, othello.WHITE: 0, None: 0,
+                                            'plies': 0, 'passes': 0, 'forfeits': 0})
+            total['games'] += 1
+            total[record.winner] += 1
+            total['plies'] += len(record.moves)
+            total['passes'] += record.moves.count(PASS)
+            total['forfeits'] += record.forfeit is not None
+            if printed < args.games:
+                printed += 1
+                print(record)
+                for ply, square in enumerate(record.moves):
+                    stats = record.stats[ply] if record.stats else None
+                    if square == PASS:
+                        print('  {:3} pass'.format(ply + 1))
+                    else:
+                        print('  {:3} {}  {}'.format(ply + 1, list(divmod(square, record.cols)),
+                                                     '' if stats is None else 'nodes {} depth {} seconds {} score {}'
+                                                     .format(stats[0], stats[1],
+                                                             None if stats[2] is None else round(stats[2], 3),
+                                                             stats[3])))
+
+    for (rows, cols, victory_type), total in sorted(totals.items()):
+        games = total['games']
+        print('{}x{} {}: {} games, black wins {}, white wins {}, draws {}, {:.1f} plies and {:.2f} passes'
+              ' per game, forfeits {}'.format(rows, cols, victory_type, games, total[othello.BLACK],
+                                              total[othello.WHITE], total[None], total['plies'] / games,
+                                              total['passes'] / games, total['forfeits']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#  Stateless Othello rules kernel.
+#
+#  Every function here works on a BoardGeometry and a pair of bitboards,
+#  (player, opponent), where player is the side about to move. Nothing is
+#  stored between calls, so the game (othello.OthelloGame) and every search
+#  agent (agent.py) can share the exact same rules and hot paths.
+
+import othello_bitboard
+
+MOST_CELLS = 'M'
+LEAST_CELLS = 'L'
+
+
+def legal_moves(geometry, player: int, opponent: int) -> int:
+    ''' Returns the mask of every square where player can move '''
+    return othello_bitboard.legal_moves(geometry, player, opponent)
+
+
+def move_list(geometry, player: int, opponent: int) -> [int]:
+    ''' Returns the squares where player can move, in raster order '''
+    return othello_bitboard.squares(othello_bitboard.legal_moves(geometry, player, opponent))
+
+
+def apply_move(geometry, player: int, opponent: int, square: int) -> (int, int, int):
+    ''' Plays player's move on the given square. Returns the new
+        (player, opponent) bitboards and the mask of flipped discs.
+        If the move is invalid the flipped mask is 0 and the bitboards
+        are returned unchanged. '''
+    if (player | opponent) >> square & 1:
+        return player, opponent, 0
+    flipped = othello_bitboard.flips(geometry, player, opponent, square)
+    if not flipped:
+        return player, opponent, 0
+    return player | flipped | (1 << square), opponent ^ flipped, flipped
+
+
+def undo_move(player: int, opponent: int, square: int, flipped: int) -> (int, int):
+    ''' Reverts a move made with apply_move(). Takes and returns the
+        bitboards from the point of view of the player who made the move. '''
+    return player & ~(flipped | (1 << square)), opponent | flipped
+
+
+def opponent_moves_next(geometry, player: int, opponent: int) -> bool:
+    ''' Given the bitboards right after player moved, returns True if the
+        turn passes to the opponent, or False if the opponent has no move
+        and player must move again. '''
+    return othello_bitboard.legal_moves(geometry, opponent, player) != 0
+
+
+def is_terminal(geometry, player: int, opponent: int) -> bool:
+    ''' Returns True if neither side can move '''
+    return (othello_bitboard.legal_moves(geometry, player, opponent) == 0
+            and othello_bitboard.legal_moves(geometry, opponent, player) == 0)
+
+
+def disc_difference(player: int, opponent: int) -> int:
+    ''' Returns player's disc count minus opponent's disc count '''
+    return othello_bitboard.count(player) - othello_bitboard.count(opponent)
+
+
+def score(player: int, opponent: int, victory_type: str) -> int:
+    ''' Returns the final score from player's point of view: positive if
+        player is winning under the given victory type, negative if
+        losing and 0 for a tie. '''
+    difference = disc_difference(player, opponent)
+    if victory_type == LEAST_CELLS:
+        return -difference
+    return difference
@@ -0,0 +1,255 @@
+#  Search instrumentation: per-move statistics, hooks and a structured log.
+#
+#  An AlphaBetaAgent created with instrument= (see agent.py) builds a
+#  SearchStats for every move it chooses: where the move came from (search,
+#  endgame solver or opening book), the nodes visited, leaves evaluated,
+#  beta cutoffs by the index of the move that caused them, transposition
+#  table probes and hits, the depth reached, the time taken, the principal
+#  variation, and the nodes and time of every iteration of iterative
+#  deepening. The stats are attached to the SearchResult and passed to every
+#  hook: any callable taking a SearchStats. SearchLog is a hook that appends
+#  every search to a log file as one JSON object per line.
+#
+#  Without instrument= none of this runs: the counters the agent keeps anyway
+#  (nodes, and the cutoff and table counters of othello_ordering and
+#  othello_transposition, and the count of scored leaves) are only read once
+#  per search.
+#
+#  The command line summarizes a log, grouped by the number of empty squares,
+#  to show where search time goes:
+#
+#      python othello_match.py alphabeta:time_budget_ms=500,instrument=search.jsonl random
+#      python othello_stats.py search.jsonl
+
+import argparse
+import json
+
+SEARCH = 'search'
+ENDGAME = 'endgame'
+BOOK = 'book'
+SOURCES = (SEARCH, ENDGAME, BOOK)
+
+# Summaries group searches into buckets of this many empty squares
+EMPTIES_BUCKET = 10
+
+
+class SearchStats:
+    '''
+    What one search did, move by move
+    '''
+
+    def __init__(self, source: str, move: [int], score, pv: [[int]], depth: int, elapsed: float,
+                 nodes: int, leaves=None, cutoffs=None, tt_probes: int = 0, tt_hits: int = 0,
+                 iterations=None, empties: int = None, turn: str = None):
+        ''' source is SEARCH, ENDGAME or BOOK. move, score, pv, depth and
+            elapsed are as in SearchResult. leaves is the number of positions
+            scored by the evaluation or as finished games (None where the
+            source does not count them), cutoffs[i] the number of beta cutoffs
+            caused by the i-th move tried at a node, and iterations lists
+            (depth, nodes, seconds) for every completed iteration, nodes and
+            seconds being that iteration's own. empties and turn describe the
+            searched position. '''
+        self.source = source
+        self.move = move
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.elapsed = elapsed
+        self.nodes = nodes
+        self.leaves = leaves
+        self.cutoffs = cutoffs or []
+        self.tt_probes = tt_probes
+        self.tt_hits = tt_hits
+        self.iterations = iterations or []
+        self.empties = empties
+        self.turn = turn
+
+    def __repr__(self):
+        return ('SearchStats(source={}, move={}, nodes={}, leaves={}, depth={}, elapsed={:.3f}, ebf={})'
+                .format(self.source, self.move, self.nodes, self.leaves, self.depth, self.elapsed,
+                        self.effective_branching_factor()))
+
+    def effective_branching_factor(self):
+        ''' Returns the branching factor of a uniform tree as deep as the last
+            iteration and with as many nodes, or None without iterations.
+            (The ratio between two iterations' nodes says the same but is
+            thrown off when the transposition table from the previous move
+            makes the early iterations almost free.) '''
+        if not self.iterations:
+            return None
+        depth, nodes, seconds = self.iterations[-1]
+        if depth < 1 or nodes < 1:
+            return None
+        return float(nodes) ** (1.0 / depth)
+
+    def cutoff_count(self) -> int:
+        return sum(self.cutoffs)
+
+    def first_move_cutoff_rate(self) -> float:
+        ''' Returns the share of cutoffs caused by the first move tried '''
+        cutoffs = self.cutoff_count()
+        return float(self.cutoffs[0]) / cutoffs if cutoffs else 0.0
+
+    def tt_hit_rate(self) -> float:
+        return float(self.tt_hits) / self.tt_probes if self.tt_probes else 0.0
+
+    def nodes_per_second(self):
+        return self.nodes / self.elapsed if self.elapsed > 0 else None
+
+    def as_dict(self) -> dict:
+        ''' Returns the stats as a JSON-ready dict '''
+        return {'source': self.source,
+                'move': self.move,
+                'score': self.score,
+                'pv': self.pv,
+                'depth': self.depth,
+                'elapsed': self.elapsed,
+                'nodes': self.nodes,
+                'leaves': self.leaves,
+                'cutoffs': self.cutoffs,
+                'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits,
+                'iterations': [list(iteration) for iteration in self.iterations],
+                'empties': self.empties,
+                'turn': self.turn,
+                'ebf': self.effective_branching_factor()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'SearchStats':
+        ''' Creates stats from a dict written by as_dict() '''
+        return cls(data['source'], data['move'], data['score'], data['pv'], data['depth'],
+                   data['elapsed'], data['nodes'], data['leaves'], data['cutoffs'],
+                   data['tt_probes'], data['tt_hits'],
+                   [tuple(iteration) for iteration in data['iterations']],
+                   data['empties'], data['turn'])
+
+
+class SearchLog:
+    '''
+    A hook appending every search's stats to a file, one JSON object per line
+    '''
+
+    def __init__(self, path: str):
+        ''' The file is opened for appending on the first search, so creating
+            a log that is never used leaves no file behind '''
+        self.path = path
+        self._file = None
+
+    def __call__(self, stats: SearchStats) -> None:
+        if self._file is None:
+            self._file = open(self.path, 'a')
+        # One write per line, flushed, so several processes can share a log
+        self._file.write(json.dumps(stats.as_dict()) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __getstate__(self):
+        # Agents are copied into worker processes; every copy opens its own file
+        return {'path': self.path, '_file': None}
+
+
+def read_log(path: str):
+    ''' Yields the SearchStats of every search in a log written by SearchLog '''
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield SearchStats.from_dict(json.loads(line))
+
+
+def make_hooks(instrument) -> list:
+    ''' Returns the hook list for an agent's instrument argument, or None
+        when instrumentation is off. instrument may be True (collect stats
+        without hooks), a callable, the path of a SearchLog, or a list of
+        callables and paths. '''
+    if instrument is None or instrument is False:
+        return None
+    if instrument is True:
+        return []
+    if isinstance(instrument, (str, bytes)) or callable(instrument):
+        instrument = [instrument]
+    hooks = []
+    for hook in instrument:
+        if isinstance(hook, (str, bytes)):
+            hook = SearchLog(hook)
+        elif not callable(hook):
+            raise ValueError('search hooks must be callables or log paths, not ' + repr(hook))
+        hooks.append(hook)
+    return hooks
+
+
+def summarize(searches) -> [dict]:
+    ''' Returns per-bucket totals of an iterable of SearchStats, grouped by
+        source and by EMPTIES_BUCKET empty squares, in order '''
+    buckets = {}
+    for stats in searches:
+        low = None if stats.empties is None else stats.empties // EMPTIES_BUCKET * EMPTIES_BUCKET
+        bucket = buckets.get((stats.source, low))
+        if bucket is None:
+            bucket = buckets[stats.source, low] = {
+                'source': stats.source, 'empties': low, 'searches': 0, 'nodes': 0, 'leaves': None,
+                'seconds': 0.0, 'depth': 0, 'ebf': [], 'cutoffs': [], 'tt_probes': 0, 'tt_hits': 0}
+        bucket['searches'] += 1
+        bucket['nodes'] += stats.nodes
+        if stats.leaves is not None:
+            bucket['leaves'] = (bucket['leaves'] or 0) + stats.leaves
+        bucket['seconds'] += stats.elapsed
+        bucket['depth'] += stats.depth or 0
+        ebf = stats.effective_branching_factor()
+        if ebf is not None:
+            bucket['ebf'].append(ebf)
+        for index, count in enumerate(stats.cutoffs):
+            if index == len(bucket['cutoffs']):
+                bucket['cutoffs'].append(0)
+            bucket['cutoffs'][index] += count
+        bucket['tt_probes'] += stats.tt_probes
+        bucket['tt_hits'] += stats.tt_hits
+
+    summary = []
+    for key in sorted(buckets, key = lambda key: (SOURCES.index(key[0]) if key[0] in SOURCES else len(SOURCES),
+                                                  -1 if key[1] is None else key[1])):
+        bucket = buckets[key]
+        searches = bucket['searches']
+        cutoffs = sum(bucket['cutoffs'])
+        summary.append({'source': bucket['source'],
+                        'empties': bucket['empties'],
+                        'searches': searches,
+                        'nodes': bucket['nodes'] / searches,
+                        'leaves': None if bucket['leaves'] is None else bucket['leaves'] / searches,
+                        'seconds': bucket['seconds'] / searches,
+                        'depth': bucket['depth'] / searches,
+                        'nps': bucket['nodes'] / bucket['seconds'] if bucket['seconds'] > 0 else None,
+                        'ebf': sum(bucket['ebf']) / len(bucket['ebf']) if bucket['ebf'] else None,
+                        'first_move_cutoffs': bucket['cutoffs'][0] / cutoffs if cutoffs else None,
+                        'tt_hit_rate': bucket['tt_hits'] / bucket['tt_probes'] if bucket['tt_probes'] else None})
+    return summary
+
+
+def _format(value, pattern: str) -> str:
+    return '-' if value is None else pattern.format(value)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Summarizes search logs written by instrumented agents.')
+    parser.add_argument('logs', nargs = '+', help = 'log files written by SearchLog')
+    args = parser.parse_args(argv)
+
+    searches = (stats for path in args.logs for stats in read_log(path))
+    print('{:8} {:>7} {:>8} {:>10} {:>10} {:>8} {:>9} {:>6} {:>5} {:>7} {:>7}'.format(
+        'source', 'empties', 'searches', 'nodes', 'leaves', 'seconds', 'nps', 'depth', 'ebf',
+        'first%', 'tthit%'))
+    for bucket in summarize(searches):
+        empties = '-' if bucket['empties'] is None else '{}-{}'.format(bucket['empties'],
+                                                                      bucket['empties'] + EMPTIES_BUCKET - 1)
+        print('{:8} {:>7} {:>8} {:>10.0f} {:>10} {:>8.3f} {:>9} {:>6.1f} {:>5} {:>7} {:>7}'.format(
+            bucket['source'], empties, bucket['searches'], bucket['nodes'], _format(bucket['leaves'], '{:.0f}'),
+            bucket['seconds'], _format(bucket['nps'], '{:.0f}'), bucket['depth'],
+            _format(bucket['ebf'], '{:.2f}'), _format(bucket['first_move_cutoffs'], '{:.1%}'),
+            _format(bucket['tt_hit_rate'], '{:.1%}')))
+
+
+if __name__ == '__main__':
+    main()
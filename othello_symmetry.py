@@ -0,0 +1,109 @@
+#  Board symmetries.
+#
+#  Rotating or reflecting an Othello position gives a position with the same
+#  value and the same best moves (rotated or reflected the same way). A square
+#  board has 8 such symmetries (4 rotations, each optionally mirrored), a
+#  rectangular one has 4 (identity, the two mirrors and the half turn).
+#
+#  Every symmetry is stored as a permutation of the squares, and for speed as
+#  one 256-entry table per byte of the bitboard giving the image of that
+#  byte's discs, so transforming a bitboard is one table read per byte
+#  (int.to_bytes) instead of one step per disc. Both are built once per board
+#  size.
+#
+#  The canonical form of a position is its smallest image under all the
+#  symmetries (comparing the player's bitboard first, and the opponent's only
+#  to break ties), so all the orientations of a position share one canonical
+#  form. The opening book, and the transposition table of AlphaBetaAgent with
+#  tt_symmetry, key positions by it, so every orientation of a position hits
+#  the same entry; moves stored with an entry are kept in the canonical
+#  orientation and mapped back with the inverse symmetry.
+
+import functools
+
+import othello_bitboard
+
+
+@functools.lru_cache(maxsize = None)
+def symmetries(rows: int, cols: int) -> [[int]]:
+    ''' Returns the symmetries of a rows x cols board, each as a list giving
+        the image of every square. The identity comes first. '''
+    geometry = othello_bitboard.geometry(rows, cols)
+    mappings = [lambda row, col: (row, col),
+                lambda row, col: (row, cols - 1 - col),
+                lambda row, col: (rows - 1 - row, col),
+                lambda row, col: (rows - 1 - row, cols - 1 - col)]
+    if rows == cols:
+        mappings += [lambda row, col: (col, row),
+                     lambda row, col: (col, rows - 1 - row),
+                     lambda row, col: (cols - 1 - col, row),
+                     lambda row, col: (cols - 1 - col, rows - 1 - row)]
+    return [[geometry.square(*mapping(*geometry.position(square))) for square in range(geometry.size)]
+            for mapping in mappings]
+
+
+@functools.lru_cache(maxsize = None)
+def inverses(rows: int, cols: int) -> [int]:
+    ''' Returns, for every symmetry, the number of the symmetry undoing it '''
+    transforms = symmetries(rows, cols)
+    identity = list(range(rows * cols))
+    return [next(number for number, other in enumerate(transforms)
+                 if [other[square] for square in transform] == identity)
+            for transform in transforms]
+
+
+@functools.lru_cache(maxsize = None)
+def byte_tables(rows: int, cols: int) -> [[[int]]]:
+    ''' Returns, for every symmetry and every byte of a bitboard, the table
+        of the images of the 256 values of that byte '''
+    size = rows * cols
+    tables = []
+    for permutation in symmetries(rows, cols):
+        symmetry_tables = []
+        for byte in range((size + 7) // 8):
+            table = [0] * 256
+            for value in range(1, 256):
+                low = value & -value
+                square = byte * 8 + low.bit_length() - 1
+                table[value] = table[value ^ low] | (1 << permutation[square] if square < size else 0)
+            symmetry_tables.append(table)
+        tables.append(symmetry_tables)
+    return tables
+
+
+def transform_board(rows: int, cols: int, symmetry: int, board: int) -> int:
+    ''' Returns the image of a bitboard under a symmetry '''
+    tables = byte_tables(rows, cols)[symmetry]
+    image = 0
+    for table, byte in zip(tables, board.to_bytes(len(tables), 'little')):
+        image |= table[byte]
+    return image
+
+
+def transform_square(rows: int, cols: int, symmetry: int, square: int) -> int:
+    ''' Returns the image of a square under a symmetry '''
+    return symmetries(rows, cols)[symmetry][square]
+
+
+def canonical(rows: int, cols: int, player: int, opponent: int) -> (int, int, int):
+    ''' Returns (player, opponent, symmetry): the canonical form of the
+        position and the symmetry that maps the position onto it '''
+    tables = byte_tables(rows, cols)
+    player_bytes = player.to_bytes(len(tables[0]), 'little')
+    best = player
+    candidates = [0]
+    for symmetry in range(1, len(tables)):
+        image = 0
+        for table, byte in zip(tables[symmetry], player_bytes):
+            image |= table[byte]
+        if image < best:
+            best = image
+            candidates = [symmetry]
+        elif image == best:
+            candidates.append(symmetry)
+    if len(candidates) == 1:
+        symmetry = candidates[0]
+        return best, transform_board(rows, cols, symmetry, opponent), symmetry
+
+    # The player's discs look the same under several symmetries
+    return min((best, transform_board(rows, cols, symmetry, opponent), symmetry) for symmetry in candidates)
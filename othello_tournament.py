@@ -0,0 +1,251 @@
+#  Tournaments between agents over a process pool.
+#
+#  A tournament is a list of games, each one pair of agents (given as agent
+#  specs, see othello_match) playing from one opening position. Games are
+#  independent, so they are handed to the worker processes of a SearchPool and
+#  their results are folded into a TournamentTable as they come back.
+#
+#  Every opening is played twice by each pair of agents, once with each agent
+#  on each color, so neither agent gains from a lucky opening or from moving
+#  first. Openings are short random move sequences from the start position,
+#  kept only when the disc count is close to even and both sides can move.
+#
+#  Ratings are Elo estimates fitted to all the results at once (a Bradley-Terry
+#  maximum likelihood fit with one virtual draw per pairing, so agents that
+#  won or lost every game still get finite ratings) and centred on zero. The
+#  interval given with each rating is its 95% confidence interval from the
+#  fit's standard error.
+#
+#      python othello_tournament.py random alphabeta:max_depth=2 expectimax --openings 8
+#      python othello_tournament.py alphabeta:time_budget_ms=100 random expectimax --gauntlet
+
+import argparse
+import itertools
+import math
+import random
+
+import othello
+import othello_match
+import othello_parallel
+import othello_record
+
+ROUND_ROBIN = 'round-robin'
+GAUNTLET = 'gauntlet'
+
+DEFAULT_OPENINGS = 4
+DEFAULT_OPENING_PLIES = 4
+# Largest disc difference an opening may have to count as balanced
+OPENING_MAX_DISC_DIFFERENCE = 2
+ELO_ITERATIONS = 200
+CONFIDENCE_Z = 1.96
+
+
+def balanced_openings(count: int, plies: int, rows: int = othello_match.DEFAULT_ROWS,
+                      cols: int = othello_match.DEFAULT_COLUMNS,
+                      first_player: str = othello_match.DEFAULT_FIRST_PLAYER,
+                      top_left: str = othello_match.DEFAULT_TOP_LEFT_PLAYER,
+                      victory_type: str = othello_match.DEFAULT_VICTORY_TYPE,
+                      seed: int = 0) -> [tuple]:
+    ''' Returns up to count different opening positions (position tuples, see
+        OthelloGame.get_position), each reached by plies random moves. The
+        same seed always gives the same openings. '''
+    generator = random.Random(seed)
+    openings = []
+    seen = set()
+    attempts = 0
+    while len(openings) < count and attempts < count * 100:
+        attempts += 1
+        game = othello_match.new_game(rows, cols, first_player, top_left, victory_type)
+        for ply in range(plies):
+            if game.is_game_over():
+                break
+            game.make_move(generator.choice(game.legal_squares()))
+        black = game.get_total_cells(othello.BLACK)
+        white = game.get_total_cells(othello.WHITE)
+        if (game.is_game_over() or abs(black - white) > OPENING_MAX_DISC_DIFFERENCE
+                or not game.can_move(othello.OPPOSITE_TURN[game.get_turn()])):
+            continue
+        position = game.get_position()
+        if position not in seen:
+            seen.add(position)
+            openings.append(position)
+    return openings
+
+
+def schedule(specs: [str], openings: [tuple], mode: str = ROUND_ROBIN) -> [tuple]:
+    ''' Returns the games of a tournament as (black spec, white spec, opening)
+        tuples. In a round robin every agent meets every other one; in a
+        gauntlet the first agent meets each of the others. '''
+    if mode == ROUND_ROBIN:
+        pairs = list(itertools.combinations(specs, 2))
+    elif mode == GAUNTLET:
+        pairs = [(specs[0], other) for other in specs[1:]]
+    else:
+        raise ValueError('unknown tournament mode: ' + str(mode))
+
+    games = []
+    for opening in openings:
+        for spec_a, spec_b in pairs:
+            games.append((spec_a, spec_b, opening))
+            games.append((spec_b, spec_a, opening))
+    return games
+
+
+def _play_scheduled_game(game_task: tuple) -> tuple:
+    ''' Worker task: plays one scheduled game with fresh agents '''
+    spec_black, spec_white, opening = game_task
+    game = othello.OthelloGame.from_position(opening)
+    result = othello_match.play_game(othello_match.make_agent(spec_black),
+                                     othello_match.make_agent(spec_white), game)
+    result.record.black, result.record.white = spec_black, spec_white
+    return spec_black, spec_white, result
+
+
+class TournamentTable:
+    '''
+    Results of a tournament so far, by agent and by pairing
+    '''
+
+    def __init__(self, specs: [str]):
+        self.specs = list(specs)
+        self.games = 0
+        self.totals = {spec: [0, 0, 0] for spec in self.specs}
+        # (agent, opponent) -> [wins, draws, losses] of agent against opponent
+        self.pairings = {}
+
+    def add(self, spec_black: str, spec_white: str, result: othello_match.GameResult) -> None:
+        ''' Adds the result of one game '''
+        self.games += 1
+        if result.winner is None:
+            outcome = 1
+        elif result.winner == othello.BLACK:
+            outcome = 0
+        else:
+            outcome = 2
+        for spec, opponent, index in ((spec_black, spec_white, outcome),
+                                      (spec_white, spec_black, 2 - outcome)):
+            self.totals[spec][index] += 1
+            self.pairings.setdefault((spec, opponent), [0, 0, 0])[index] += 1
+
+    def ratings(self) -> {str: (float, float)}:
+        ''' Returns every agent's Elo rating and the half-width of its 95%
+            confidence interval '''
+        scale = 400.0 / math.log(10)
+        ratings = {spec: 0.0 for spec in self.specs}
+        information = {spec: 0.0 for spec in self.specs}
+
+        for iteration in range(ELO_ITERATIONS):
+            for spec in self.specs:
+                actual = expected = variance = 0.0
+                for (player, opponent), (wins, draws, losses) in self.pairings.items():
+                    if player != spec:
+                        continue
+                    # One virtual draw keeps perfect scores finite
+                    games = wins + draws + losses + 1
+                    actual += wins + 0.5 * (draws + 1)
+                    p = 1.0 / (1.0 + 10 ** ((ratings[opponent] - ratings[spec]) / 400.0))
+                    expected += games * p
+                    variance += games * p * (1.0 - p)
+                if variance:
+                    # Newton step on the log-likelihood
+                    ratings[spec] += scale * (actual - expected) / variance
+                information[spec] = variance
+
+            mean = sum(ratings.values()) / len(ratings)
+            for spec in self.specs:
+                ratings[spec] -= mean
+
+        return {spec: (ratings[spec],
+                       CONFIDENCE_Z * scale / math.sqrt(information[spec]) if information[spec] else float('inf'))
+                for spec in self.specs}
+
+    def summary(self) -> str:
+        ''' Returns the standings as printable text, best rating first '''
+        ratings = self.ratings()
+        width = max(len(spec) for spec in self.specs)
+        lines = ['{} games'.format(self.games),
+                 '{:<{}}  {:>6} {:>6} {:>6} {:>7} {:>13}'.format(
+                     'agent', width, 'wins', 'draws', 'losses', 'score', 'elo')]
+        for spec in sorted(self.specs, key = lambda spec: ratings[spec][0], reverse = True):
+            wins, draws, losses = self.totals[spec]
+            games = wins + draws + losses
+            score = (wins + 0.5 * draws) / games if games else 0.0
+            elo, interval = ratings[spec]
+            lines.append('{:<{}}  {:>6} {:>6} {:>6} {:>7.3f} {:>+6.0f} +/-{:<4.0f}'.format(
+                spec, width, wins, draws, losses, score, elo, interval))
+        return '\n'.join(lines)
+
+
+def run_tournament(specs: [str], openings: [tuple], mode: str = ROUND_ROBIN,
+                   pool: othello_parallel.SearchPool = None, progress=None, writer=None) -> TournamentTable:
+    ''' Plays every scheduled game over the pool (a new one if none is given)
+        and returns the final table. progress, if given, is called with the
+        table after every game. writer, an othello_record.RecordWriter, is
+        given every game as it finishes. '''
+    table = TournamentTable(specs)
+    games = schedule(specs, openings, mode)
+    own_pool = pool is None
+    if own_pool:
+        pool = othello_parallel.SearchPool()
+    try:
+        for spec_black, spec_white, result in pool.imap_unordered(_play_scheduled_game, games):
+            table.add(spec_black, spec_white, result)
+            if writer is not None:
+                writer.write(result.record)
+            if progress is not None:
+                progress(table)
+    finally:
+        if own_pool:
+            pool.close()
+    return table
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Plays a tournament between Othello agents.')
+    parser.add_argument('agents', nargs = '+', type = othello_match.agent_spec_argument,
+                        help = 'agent specs, e.g. random alphabeta:max_depth=3')
+    parser.add_argument('--gauntlet', action = 'store_true',
+                        help = 'the first agent plays each of the others, instead of a round robin')
+    parser.add_argument('--openings', type = int, default = DEFAULT_OPENINGS,
+                        help = 'opening positions, each played with both colors by every pairing')
+    parser.add_argument('--opening-plies', type = int, default = DEFAULT_OPENING_PLIES)
+    parser.add_argument('--workers', type = int, help = 'worker processes (default: one per core)')
+    parser.add_argument('--rows', type = int, default = othello_match.DEFAULT_ROWS)
+    parser.add_argument('--cols', type = int, default = othello_match.DEFAULT_COLUMNS)
+    parser.add_argument('--first', type = othello_match.color_argument, default = othello_match.DEFAULT_FIRST_PLAYER)
+    parser.add_argument('--top-left', type = othello_match.color_argument, default = othello_match.DEFAULT_TOP_LEFT_PLAYER)
+    parser.add_argument('--victory', type = othello_match.victory_type_argument, default = othello_match.DEFAULT_VICTORY_TYPE)
+    parser.add_argument('--seed', type = int, default = 0, help = 'seed for the openings')
+    parser.add_argument('--progress', type = int, default = 0, metavar = 'N',
+                        help = 'print the standings every N games')
+    parser.add_argument('--record', help = 'append every game to this record file (see othello_record)')
+    args = parser.parse_args(argv)
+
+    if len(set(args.agents)) < 2:
+        parser.error('a tournament needs at least two different agents')
+    if not 4 <= args.rows <= 16 or not 4 <= args.cols <= 16 or args.rows % 2 or args.cols % 2:
+        parser.error('rows and columns must be even numbers from 4 to 16')
+    openings = balanced_openings(args.openings, args.opening_plies, args.rows, args.cols,
+                                 args.first, args.top_left, args.victory, args.seed)
+    if not openings:
+        parser.error('no balanced openings found; try fewer opening plies')
+
+    progress = None
+    if args.progress:
+        def progress(table):
+            if table.games % args.progress == 0:
+                print(table.summary() + '\n', flush = True)
+
+    writer = othello_record.RecordWriter(args.record) if args.record else None
+    try:
+        with othello_parallel.SearchPool(args.workers) as pool:
+            table = run_tournament(list(dict.fromkeys(args.agents)), openings,
+                                   GAUNTLET if args.gauntlet else ROUND_ROBIN, pool, progress, writer)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(table.summary())
+
+
+if __name__ == '__main__':
+    main()
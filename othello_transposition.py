@@ -0,0 +1,112 @@
+#  Bounded transposition table for the search agents.
+#
+#  The table is a fixed number of slots indexed by the low bits of a
+#  position's Zobrist key (see othello_zobrist). Each slot holds at most one
+#  entry, stored as a tuple:
+#
+#      (key, depth, bound, score, move, generation)
+#
+#  depth is the remaining search depth the score was computed with, bound
+#  says whether the score is exact or only a lower/upper bound, move is the
+#  best move found (a square index, or None) and generation is the search
+#  the entry was written in.
+
+# Bound types
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Replacement policies
+ALWAYS_REPLACE = 'always'
+DEPTH_PREFERRED = 'depth'
+AGING = 'aging'
+REPLACEMENT_POLICIES = (ALWAYS_REPLACE, DEPTH_PREFERRED, AGING)
+
+DEFAULT_SIZE = 1 << 16
+
+
+class TranspositionTable:
+    '''
+    Fixed-size table of search results keyed by Zobrist key
+    '''
+
+    def __init__(self, size: int = DEFAULT_SIZE, replacement: str = AGING):
+        ''' Creates an empty table with room for size entries (rounded
+            down to a power of two) and the given replacement policy:
+
+            ALWAYS_REPLACE  - a new entry always overwrites its slot
+            DEPTH_PREFERRED - a new entry only overwrites a shallower one
+            AGING           - like DEPTH_PREFERRED, but entries left over
+                              from an earlier search are always replaced '''
+        if size < 1:
+            raise ValueError('transposition table size must be at least 1')
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError('unknown replacement policy: ' + str(replacement))
+
+        self.size = 1 << (size.bit_length() - 1)
+        self.replacement = replacement
+        self._mask = self.size - 1
+        self._entries = [None] * self.size
+        self._generation = 0
+        self.reset_stats()
+
+    def probe(self, key: int) -> tuple:
+        ''' Returns the entry stored for the key, or None if there is none.
+            A slot holding a different position counts as a collision. '''
+        entry = self._entries[key & self._mask]
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key: int, depth: int, bound: int, score, move) -> None:
+        ''' Stores a search result, subject to the replacement policy '''
+        index = key & self._mask
+        old = self._entries[index]
+        if old is not None and old[0] != key:
+            if self.replacement == DEPTH_PREFERRED:
+                if old[1] > depth:
+                    return
+            elif self.replacement == AGING:
+                if old[5] == self._generation and old[1] > depth:
+                    return
+            self.overwrites += 1
+        elif old is not None and move is None:
+            # Keep the best move of an earlier search of the same position
+            move = old[4]
+        self._entries[index] = (key, depth, bound, score, move, self._generation)
+        self.stores += 1
+
+    def new_search(self) -> None:
+        ''' Marks the start of a new search, which ages every stored entry '''
+        self._generation += 1
+
+    def clear(self) -> None:
+        ''' Removes every entry from the table '''
+        self._entries = [None] * self.size
+
+    def reset_stats(self) -> None:
+        ''' Sets the hit/miss/collision counters back to zero '''
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def stats(self) -> dict:
+        ''' Returns the table's counters and how full it is '''
+        used = self.size - self._entries.count(None)
+        probes = self.hits + self.misses
+        return {'size': self.size,
+                'used': used,
+                'hits': self.hits,
+                'misses': self.misses,
+                'collisions': self.collisions,
+                'stores': self.stores,
+                'overwrites': self.overwrites,
+                'hit_rate': float(self.hits) / probes if probes else 0.0}
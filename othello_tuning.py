@@ -0,0 +1,457 @@
+#  Offline tuning of the pattern evaluation tables.
+#
+#  Tuning runs in two steps:
+#
+#    1. generate: agents play games headless (over a SearchPool) from random
+#       balanced openings, and every position they are asked to move from is
+#       kept, seen from the side to move. Each position is labelled with the
+#       final disc difference of its game or, with few enough empty squares,
+#       with the exact disc difference under perfect play from the endgame
+#       solver. Positions are saved as a NumPy .npz file. The positions of
+#       games already played and kept in record files (see othello_record)
+#       can be labelled and saved the same way.
+#
+#    2. fit: the tables of othello_eval are fitted to the labels, separately
+#       for each game phase (a range of empty squares), either by least
+#       squares on the disc difference or logistically on win/draw/loss. The
+#       fit starts from the current tables, scaled to the labels, and is
+#       regularized towards them, so pattern configurations that never occur
+#       in the data keep their old values. The result is written as a
+#       weights file (gzip-compressed JSON) that othello_eval.evaluator(), and
+#       so AlphaBetaAgent(evaluator='pattern'), loads when it exists.
+#
+#  Every position is one row of pattern indices (offset into one long weight
+#  vector holding all the tables), so the fit is a few array operations per
+#  iteration: a gather for the predictions and a bincount for the gradient.
+#  Each step divides the gradient by how often every entry occurs (a diagonal
+#  Newton step), which keeps rare and frequent configurations converging at
+#  the same rate.
+#
+#      python othello_tuning.py generate positions.npz --games 400 --agent alphabeta:max_depth=2
+#      python othello_tuning.py records positions.npz games.rec --rows 8 --cols 8
+#      python othello_tuning.py fit positions.npz --phases 4
+
+import argparse
+import os
+
+import numpy
+
+import othello
+import othello_bitboard
+import othello_endgame
+import othello_eval
+import othello_match
+import othello_parallel
+import othello_record
+import othello_tournament
+
+LEAST_SQUARES = 'least-squares'
+LOGISTIC = 'logistic'
+
+DEFAULT_GAMES = 200
+DEFAULT_OPENING_PLIES = 8
+DEFAULT_SOLVE_EMPTIES = 12
+DEFAULT_PHASES = 4
+DEFAULT_ITERATIONS = 300
+DEFAULT_REGULARIZATION = 50.0
+# Evaluation units per disc of the least squares fit
+DISC_VALUE = 10
+# Evaluation units per unit of log-odds of the logistic fit
+LOGISTIC_SCALE = 100
+VALIDATION_FRACTION = 0.1
+
+
+class _RecordingAgent:
+    '''
+    Wraps an agent and records every position it is asked to move from
+    '''
+
+    def __init__(self, agent, positions: list):
+        self.agent = agent
+        self.positions = positions
+
+    def prepare(self, rows: int, cols: int) -> None:
+        if hasattr(self.agent, 'prepare'):
+            self.agent.prepare(rows, cols)
+
+    def get_next_action(self, board_state):
+        player, opponent = board_state.get_bitboards()
+        self.positions.append((player, opponent, board_state.get_turn()))
+        return self.agent.get_next_action(board_state)
+
+
+def _play_recorded_game(game_task: tuple) -> list:
+    ''' Worker task: plays one game and returns its labelled positions as
+        (player, opponent, result, label, solved) tuples '''
+    spec_black, spec_white, opening, solve_empties = game_task
+    game = othello.OthelloGame.from_position(opening)
+    recorded = []
+    result = othello_match.play_game(_RecordingAgent(othello_match.make_agent(spec_black), recorded),
+                                     _RecordingAgent(othello_match.make_agent(spec_white), recorded),
+                                     game)
+    if result.forfeit is not None:
+        return []
+    return _label_positions(game.get_geometry(), recorded, result.black_cells - result.white_cells,
+                            solve_empties)
+
+
+def _label_positions(geometry, recorded: list, difference: int, solve_empties: int) -> list:
+    ''' Labels a game's (player, opponent, turn) positions given its final
+        disc difference, and returns them as (player, opponent, result,
+        label, solved) tuples '''
+    solver = othello_endgame.EndgameSolver(geometry, othello.MOST_CELLS)
+    size = geometry.size
+    samples = []
+    for player, opponent, turn in recorded:
+        final = difference if turn == othello.BLACK else -difference
+        label, solved = final, False
+        if size - bin(player | opponent).count('1') <= solve_empties:
+            label, square = solver.solve(player, opponent)
+            solved = True
+        samples.append((player, opponent, final, label, solved))
+    return samples
+
+
+def generate_positions(specs: [str], games: int = DEFAULT_GAMES,
+                       rows: int = othello_match.DEFAULT_ROWS, cols: int = othello_match.DEFAULT_COLUMNS,
+                       opening_plies: int = DEFAULT_OPENING_PLIES,
+                       solve_empties: int = DEFAULT_SOLVE_EMPTIES, seed: int = 0,
+                       pool: othello_parallel.SearchPool = None, progress=None) -> dict:
+    ''' Plays up to games games (one per balanced opening; every opening
+        is played by each agent against itself, or once per pairing and
+        color with several agents) and returns their positions as a dict
+        of arrays (see save_positions). progress, if given, is called
+        with the number of games finished. '''
+    openings = othello_tournament.balanced_openings(games, opening_plies, rows, cols, seed = seed)
+    if len(specs) == 1:
+        scheduled = [(specs[0], specs[0], opening) for opening in openings]
+    else:
+        scheduled = othello_tournament.schedule(specs, openings)[:games]
+    tasks = [(spec_black, spec_white, opening, solve_empties)
+             for spec_black, spec_white, opening in scheduled]
+
+    samples = []
+    own_pool = pool is None
+    if own_pool:
+        pool = othello_parallel.SearchPool()
+    try:
+        for finished, game_samples in enumerate(pool.imap_unordered(_play_recorded_game, tasks), 1):
+            samples.extend(game_samples)
+            if progress is not None:
+                progress(finished)
+    finally:
+        if own_pool:
+            pool.close()
+    return _positions(rows, cols, samples)
+
+
+def record_positions(paths: [str], rows: int, cols: int,
+                     solve_empties: int = DEFAULT_SOLVE_EMPTIES) -> dict:
+    ''' Returns the positions of every game of the given board size in the
+        record files, labelled like generate_positions() labels them.
+        Forfeited games are skipped. '''
+    geometry = othello_bitboard.geometry(rows, cols)
+    samples = []
+    for path in paths:
+        for record in othello_record.read_records(path):
+            if ((record.rows, record.cols, record.victory_type) != (rows, cols, othello.MOST_CELLS)
+                    or record.forfeit is not None):
+                continue
+            recorded = [game.get_bitboards() + (game.get_turn(),) for game, square, stats in record.replay()]
+            samples.extend(_label_positions(geometry, recorded, record.black_cells - record.white_cells,
+                                            solve_empties))
+    return _positions(rows, cols, samples)
+
+
+def _positions(rows: int, cols: int, samples: list) -> dict:
+    ''' Packs (player, opponent, result, label, solved) tuples into arrays '''
+    size = rows * cols
+    length = (size + 7) // 8
+    player = numpy.frombuffer(b''.join(sample[0].to_bytes(length, 'little') for sample in samples),
+                              dtype = numpy.uint8).reshape(len(samples), length)
+    opponent = numpy.frombuffer(b''.join(sample[1].to_bytes(length, 'little') for sample in samples),
+                                dtype = numpy.uint8).reshape(len(samples), length)
+    occupied = numpy.unpackbits(player | opponent, axis = 1).sum(axis = 1)
+    return {'rows': numpy.int32(rows), 'cols': numpy.int32(cols),
+            'player': player, 'opponent': opponent,
+            'empties': (size - occupied).astype(numpy.int16),
+            'result': numpy.array([sample[2] for sample in samples], dtype = numpy.int16),
+            'label': numpy.array([sample[3] for sample in samples], dtype = numpy.float32),
+            'solved': numpy.array([sample[4] for sample in samples], dtype = bool)}
+
+
+def save_positions(path: str, positions: dict) -> None:
+    ''' Writes positions to a compressed .npz file. The arrays are: rows and
+        cols; player and opponent, the bitboards of the side to move and the
+        other side as little-endian bytes; empties; result, the final disc
+        difference of the game for the side to move; label, the value the
+        fit aims for (the solved disc difference where solved, else result). '''
+    numpy.savez_compressed(path, **positions)
+
+
+def load_positions(path: str) -> dict:
+    ''' Reads positions written by save_positions() '''
+    with numpy.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def split_positions(positions: dict, fraction: float, seed: int = 0) -> (dict, dict):
+    ''' Splits positions at random into a training and a validation set with
+        about fraction of the positions '''
+    count = len(positions['label'])
+    validation = numpy.random.default_rng(seed).random(count) < fraction
+    return (_subset(positions, ~validation), _subset(positions, validation))
+
+
+def _subset(positions: dict, selected: numpy.ndarray) -> dict:
+    return {name: (values[selected] if numpy.ndim(values) else values) for name, values in positions.items()}
+
+
+def phase_limits(size: int, phases: int) -> [int]:
+    ''' Returns the max_empties of every phase but the last when the game
+        (from size - 4 empty squares down to none) is cut into phases equal
+        parts '''
+    return [round((size - 4) * (phase + 1) / phases) for phase in range(phases - 1)]
+
+
+def feature_matrix(evaluator: othello_eval.PatternEvaluator, positions: dict) -> (numpy.ndarray, dict, int):
+    ''' Returns the pattern indices of every position as a (positions,
+        patterns) array of offsets into one weight vector holding every
+        table, the offset of each pattern class and the vector's length '''
+    offsets = {}
+    total = 0
+    for pattern in evaluator.patterns:
+        if pattern.name not in offsets:
+            offsets[pattern.name] = total
+            total += 3 ** len(pattern.squares)
+
+    columns = []
+    for pattern in evaluator.patterns:
+        index = numpy.full(len(positions['label']), offsets[pattern.name], dtype = numpy.int64)
+        for byte, player_part, opponent_part in pattern.parts:
+            index += numpy.array(player_part)[positions['player'][:, byte]]
+            index += numpy.array(opponent_part)[positions['opponent'][:, byte]]
+        columns.append(index)
+    return numpy.stack(columns, axis = 1), offsets, total
+
+
+def fit_evaluator(positions: dict, phases: int = DEFAULT_PHASES, loss: str = LEAST_SQUARES,
+                  iterations: int = DEFAULT_ITERATIONS, regularization: float = DEFAULT_REGULARIZATION,
+                  base: othello_eval.PatternEvaluator = None) -> othello_eval.PatternEvaluator:
+    ''' Fits the tables of every phase to the positions' labels and returns
+        the new evaluator. base (default: the default tables) supplies the
+        starting values. '''
+    if loss not in (LEAST_SQUARES, LOGISTIC):
+        raise ValueError('unknown loss: ' + str(loss))
+    rows, cols = int(positions['rows']), int(positions['cols'])
+    if base is None:
+        base = othello_eval.PatternEvaluator(rows, cols)
+    features, offsets, total = feature_matrix(base, positions)
+    orbits = symmetry_orbits(base, offsets, total)
+    # +1 where the side to move gets the parity bonus, -1 where it loses it
+    parity = numpy.where(positions['empties'] % 2 == 1, 1.0, -1.0)
+    if loss == LEAST_SQUARES:
+        targets = positions['label'].astype(numpy.float64) * DISC_VALUE
+    else:
+        targets = 0.5 + 0.5 * numpy.sign(positions['label']).astype(numpy.float64)
+
+    limits = phase_limits(base.size, phases)
+    fitted = []
+    low = -1
+    for max_empties in limits + [base.size]:
+        selected = (positions['empties'] > low) & (positions['empties'] <= max_empties)
+        tables, parity_weight = base.stages[max_empties]
+        start = numpy.zeros(total)
+        for pattern, table in zip(base.patterns, tables):
+            start[offsets[pattern.name]:offsets[pattern.name] + len(table)] = table
+        weights, parity_weight = _fit_phase(features[selected], parity[selected], targets[selected],
+                                            start, float(parity_weight), loss, iterations, regularization,
+                                            orbits)
+        phase_weights = {name: [int(value) for value in numpy.rint(weights[offset:offset + 3 ** length])]
+                         for name, offset, length in ((pattern.name, offsets[pattern.name], len(pattern.squares))
+                                                      for pattern in base.patterns)}
+        phase_weights['parity'] = int(round(parity_weight))
+        fitted.append((max_empties, phase_weights))
+        low = max_empties
+
+    return othello_eval.PatternEvaluator(rows, cols, fitted[-1][1], fitted[:-1])
+
+
+def symmetry_orbits(evaluator: othello_eval.PatternEvaluator, offsets: dict, total: int) -> numpy.ndarray:
+    ''' Returns, for every entry of the weight vector laid out by
+        feature_matrix(), the first entry of its orbit: the entries a board
+        symmetry maps it onto (see othello_eval.pattern_symmetries), which
+        must hold the same value for the evaluation to be symmetric '''
+    orbits = numpy.arange(total)
+    for name, orders in othello_eval.pattern_symmetries(evaluator.rows, evaluator.cols).items():
+        length = len(orders[0])
+        indices = numpy.arange(3 ** length)
+        digits = [indices // 3 ** position % 3 for position in range(length)]
+        first = indices
+        for order in orders:
+            image = sum(digits[position] * 3 ** order[position] for position in range(length))
+            first = numpy.minimum(first, image)
+        orbits[offsets[name]:offsets[name] + 3 ** length] = offsets[name] + first
+    return orbits
+
+
+def _tie(weights: numpy.ndarray, orbits: numpy.ndarray, importance: numpy.ndarray = None) -> numpy.ndarray:
+    ''' Returns the weights with every entry replaced by its orbit's mean,
+        weighted by importance if given '''
+    if importance is None:
+        importance = numpy.ones(len(weights))
+    sums = numpy.bincount(orbits, weights = weights * importance, minlength = len(weights))
+    totals = numpy.bincount(orbits, weights = importance, minlength = len(weights))
+    return (sums / numpy.where(totals > 0, totals, 1.0))[orbits]
+
+
+def _fit_phase(features: numpy.ndarray, parity: numpy.ndarray, targets: numpy.ndarray,
+               start: numpy.ndarray, start_parity: float, loss: str, iterations: int,
+               regularization: float, orbits: numpy.ndarray) -> (numpy.ndarray, float):
+    ''' Fits one phase's weight vector and parity weight. The entries of
+        every orbit are averaged after every step, which keeps the tables
+        symmetric although each position is seen in one orientation only. '''
+    start = _tie(start, orbits)
+    if len(targets) == 0:
+        return start, start_parity
+    flat = features.ravel()
+    count, patterns = features.shape
+
+    # Start from the given tables, scaled as well as one factor can to the labels
+    scale = _fit_scale(start[features].sum(axis = 1) + start_parity * parity, targets, loss)
+    prior = start * scale
+    prior_parity = start_parity * scale
+    weights = prior.copy()
+    parity_weight = prior_parity
+
+    # Curvature of the loss per occurrence of an entry. The regularization
+    # weighs like that many extra occurrences of the prior value.
+    curvature = 1.0 if loss == LEAST_SQUARES else 0.25 / LOGISTIC_SCALE ** 2
+    regularization *= curvature
+    occurrences = numpy.bincount(flat, minlength = len(weights)) * curvature + regularization
+    step = 1.0 / (patterns + 1)
+    for iteration in range(iterations):
+        residuals = _residuals(weights[features].sum(axis = 1) + parity_weight * parity, targets, loss)
+        gradient = numpy.bincount(flat, weights = numpy.broadcast_to(residuals[:, None], features.shape).ravel(),
+                                  minlength = len(weights))
+        weights -= step * (gradient + regularization * (weights - prior)) / occurrences
+        # Weighted by occurrences this is the Newton step of the orbit's
+        # shared value
+        weights = _tie(weights, orbits, occurrences)
+        parity_gradient = (residuals * parity).sum() + regularization * (parity_weight - prior_parity)
+        parity_weight -= step * parity_gradient / (count * curvature + regularization)
+    return weights, parity_weight
+
+
+def _residuals(predictions: numpy.ndarray, targets: numpy.ndarray, loss: str) -> numpy.ndarray:
+    ''' Returns the derivative of the loss by each prediction '''
+    if loss == LEAST_SQUARES:
+        return predictions - targets
+    return (1.0 / (1.0 + numpy.exp(-predictions / LOGISTIC_SCALE)) - targets) / LOGISTIC_SCALE
+
+
+def _fit_scale(predictions: numpy.ndarray, targets: numpy.ndarray, loss: str) -> float:
+    ''' Returns the factor on the predictions that best fits the targets '''
+    if loss == LEAST_SQUARES:
+        norm = (predictions * predictions).sum()
+        return float((predictions * targets).sum() / norm) if norm else 1.0
+    scale = 0.0
+    for iteration in range(20):
+        residuals = _residuals(scale * predictions, targets, loss)
+        probabilities = 1.0 / (1.0 + numpy.exp(-scale * predictions / LOGISTIC_SCALE))
+        curvature = (probabilities * (1 - probabilities) * (predictions / LOGISTIC_SCALE) ** 2).sum()
+        if not curvature:
+            break
+        scale -= (residuals * predictions).sum() / curvature
+    return float(scale)
+
+
+def accuracy(evaluator: othello_eval.PatternEvaluator, positions: dict) -> float:
+    ''' Returns the fraction of positions with a decided label where the
+        evaluation has the label's sign, a measure that does not depend on
+        the evaluation's scale '''
+    decided = positions['label'] != 0
+    correct = 0
+    for player, opponent, label in zip(positions['player'][decided], positions['opponent'][decided],
+                                       positions['label'][decided]):
+        score = evaluator.evaluate(int.from_bytes(player.tobytes(), 'little'),
+                                   int.from_bytes(opponent.tobytes(), 'little'))
+        correct += (score > 0) == (label > 0)
+    return correct / max(int(decided.sum()), 1)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description = 'Tunes the pattern evaluation tables from self-play positions.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    generate = commands.add_parser('generate', help = 'play games and save labelled positions')
+    generate.add_argument('output', help = 'positions file (.npz)')
+    generate.add_argument('--agent', action = 'append', type = othello_match.agent_spec_argument,
+                          help = 'agent spec; repeat for several agents (default: alphabeta:max_depth=2)')
+    generate.add_argument('--games', type = int, default = DEFAULT_GAMES)
+    generate.add_argument('--rows', type = int, default = othello_match.DEFAULT_ROWS)
+    generate.add_argument('--cols', type = int, default = othello_match.DEFAULT_COLUMNS)
+    generate.add_argument('--opening-plies', type = int, default = DEFAULT_OPENING_PLIES)
+    generate.add_argument('--solve-empties', type = int, default = DEFAULT_SOLVE_EMPTIES,
+                          help = 'label positions with at most this many empty squares by solving them')
+    generate.add_argument('--workers', type = int, help = 'worker processes (default: one per core)')
+    generate.add_argument('--seed', type = int, default = 0, help = 'seed for the openings')
+
+    records = commands.add_parser('records', help = 'save the labelled positions of recorded games')
+    records.add_argument('output', help = 'positions file (.npz)')
+    records.add_argument('records', nargs = '+', help = 'record files (see othello_record)')
+    records.add_argument('--rows', type = int, default = othello_match.DEFAULT_ROWS)
+    records.add_argument('--cols', type = int, default = othello_match.DEFAULT_COLUMNS)
+    records.add_argument('--solve-empties', type = int, default = DEFAULT_SOLVE_EMPTIES,
+                         help = 'label positions with at most this many empty squares by solving them')
+
+    fit = commands.add_parser('fit', help = 'fit the tables to saved positions')
+    fit.add_argument('positions', nargs = '+', help = 'positions files (.npz) of one board size')
+    fit.add_argument('--output', help = 'weights file (default: where the agents load it from)')
+    fit.add_argument('--phases', type = int, default = DEFAULT_PHASES)
+    fit.add_argument('--logistic', action = 'store_true', help = 'fit win/draw/loss instead of disc difference')
+    fit.add_argument('--iterations', type = int, default = DEFAULT_ITERATIONS)
+    fit.add_argument('--regularization', type = float, default = DEFAULT_REGULARIZATION)
+    fit.add_argument('--base', help = 'weights file to start from (default: the default tables)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        if not 4 <= args.rows <= 16 or not 4 <= args.cols <= 16 or args.rows % 2 or args.cols % 2:
+            parser.error('rows and columns must be even numbers from 4 to 16')
+        progress = lambda finished: print('\r{} games'.format(finished), end = '', flush = True)
+        with othello_parallel.SearchPool(args.workers) as pool:
+            positions = generate_positions(args.agent or ['alphabeta:max_depth=2'], args.games,
+                                           args.rows, args.cols, args.opening_plies,
+                                           args.solve_empties, args.seed, pool, progress)
+        save_positions(args.output, positions)
+        print('\n{} positions, {} solved'.format(len(positions['label']), int(positions['solved'].sum())))
+        return
+    if args.command == 'records':
+        positions = record_positions(args.records, args.rows, args.cols, args.solve_empties)
+        save_positions(args.output, positions)
+        print('{} positions, {} solved'.format(len(positions['label']), int(positions['solved'].sum())))
+        return
+
+    loaded = [load_positions(path) for path in args.positions]
+    if len(set((int(data['rows']), int(data['cols'])) for data in loaded)) != 1:
+        parser.error('all positions files must be for the same board size')
+    positions = {name: (numpy.concatenate([data[name] for data in loaded]) if numpy.ndim(loaded[0][name])
+                        else loaded[0][name])
+                 for name in loaded[0]}
+    rows, cols = int(positions['rows']), int(positions['cols'])
+    base = othello_eval.load_evaluator(args.base) if args.base else othello_eval.PatternEvaluator(rows, cols)
+    training, validation = split_positions(positions, VALIDATION_FRACTION)
+    tuned = fit_evaluator(training, args.phases, LOGISTIC if args.logistic else LEAST_SQUARES,
+                          args.iterations, args.regularization, base)
+    output = args.output or othello_eval.weights_path(rows, cols)
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok = True)
+    tuned.save_weights(output)
+    print('{} training, {} validation positions'.format(len(training['label']), len(validation['label'])))
+    print('validation sign accuracy: {:.3f} before, {:.3f} after'.format(accuracy(base, validation),
+                                                                        accuracy(tuned, validation)))
+    print('weights written to ' + output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#  Zobrist hashing for Othello positions.
+#
+#  A position's key is the XOR of one random 64-bit number per occupied
+#  (square, color) pair, plus one more number when white is to move. Flipping
+#  a disc XORs out its old color and XORs in the new one, so the game can keep
+#  the key up to date in make_move() at the cost of one XOR per flipped disc.
+#
+#  The random numbers are drawn from a generator seeded with the board size,
+#  so every process computes the same keys for the same position. Keys can
+#  therefore be shared between worker processes and stored on disk.
+
+import functools
+import random
+
+import othello_bitboard
+
+
+class ZobristKeys:
+    '''
+    The random numbers used to hash positions on a board of one size
+    '''
+
+    def __init__(self, rows: int, cols: int):
+        ''' Draws the per-square keys for both colors and the side key. '''
+        generator = random.Random(rows * 1000 + cols)
+        size = rows * cols
+        self.black = [generator.getrandbits(64) for square in range(size)]
+        self.white = [generator.getrandbits(64) for square in range(size)]
+        self.flip = [self.black[square] ^ self.white[square] for square in range(size)]
+        self.white_to_move = generator.getrandbits(64)
+
+    def key(self, black: int, white: int, white_to_move: bool) -> int:
+        ''' Computes the key of a position from scratch '''
+        key = 0
+        for square in othello_bitboard.squares(black):
+            key ^= self.black[square]
+        for square in othello_bitboard.squares(white):
+            key ^= self.white[square]
+        if white_to_move:
+            key ^= self.white_to_move
+        return key
+
+    def flip_key(self, flipped: int) -> int:
+        ''' Returns the XOR difference caused by flipping every disc in the mask '''
+        key = 0
+        while flipped:
+            low = flipped & -flipped
+            key ^= self.flip[low.bit_length() - 1]
+            flipped ^= low
+        return key
+
+
+@functools.lru_cache(maxsize = None)
+def keys(rows: int, cols: int) -> ZobristKeys:
+    ''' Returns the shared ZobristKeys for the given board size '''
+    return ZobristKeys(rows, cols)
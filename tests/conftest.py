@@ -0,0 +1,7 @@
+#  The modules under test live at the top of the repository; make them
+#  importable however pytest is started.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,111 @@
+#  The NumPy batch kernels against othello_rules, board by board: legal
+#  moves, flips and played moves must match for boolean boards of every
+#  size and for packed bitboards up to 64 squares.
+
+import random
+
+import numpy
+import pytest
+
+import othello
+import othello_batch
+import othello_bitboard
+import othello_rules
+
+
+def _mask(board: numpy.ndarray) -> int:
+    ''' Bitboard of a boolean board '''
+    return sum(1 << int(square) for square in numpy.flatnonzero(board))
+
+
+def _games(rows: int, cols: int, count: int, seed: int) -> [othello.OthelloGame]:
+    generator = random.Random(seed)
+    games = []
+    for index in range(count):
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        for ply in range(generator.randrange(rows * cols)):
+            if game.is_game_over():
+                break
+            game.make_move(generator.choice(game.legal_squares()))
+        games.append(game)
+    return games
+
+
+def _moves(games: [othello.OthelloGame], seed: int) -> numpy.ndarray:
+    ''' A move per game: legal, occupied, merely empty or NO_MOVE '''
+    generator = random.Random(seed)
+    moves = []
+    for game in games:
+        legal = game.legal_squares()
+        if legal and generator.random() < 0.6:
+            moves.append(generator.choice(legal))
+        elif generator.random() < 0.8:
+            moves.append(generator.randrange(game.get_geometry().size))
+        else:
+            moves.append(othello_batch.NO_MOVE)
+    return numpy.array(moves)
+
+
+def _expected(game: othello.OthelloGame, move: int) -> (int, int, int):
+    player, opponent = game.get_bitboards()
+    if move == othello_batch.NO_MOVE or (player | opponent) >> move & 1:
+        return player, opponent, 0
+    return othello_rules.apply_move(game.get_geometry(), player, opponent, move)
+
+
+@pytest.mark.parametrize('rows, cols', [(4, 4), (6, 10), (8, 8), (10, 10), (16, 16)])
+def test_boolean_kernels_match_rules(rows, cols):
+    games = _games(rows, cols, 60, rows * cols)
+    geometry = games[0].get_geometry()
+    player, opponent = othello_batch.from_games(games)
+    legal = othello_batch.legal_moves(player, opponent)
+    moves = _moves(games, rows + cols)
+    new_player, new_opponent, flipped = othello_batch.apply_moves(player, opponent, moves)
+    counts = othello_batch.count(player)
+
+    for index, game in enumerate(games):
+        game_player, game_opponent = game.get_bitboards()
+        assert _mask(legal[index]) == othello_rules.legal_moves(geometry, game_player, game_opponent)
+        assert counts[index] == othello_bitboard.count(game_player)
+        expected = _expected(game, int(moves[index]))
+        assert (_mask(new_player[index]), _mask(new_opponent[index]), _mask(flipped[index])) == expected
+
+
+@pytest.mark.parametrize('rows, cols', [(4, 4), (4, 8), (6, 6), (8, 8)])
+def test_packed_kernels_match_rules(rows, cols):
+    games = _games(rows, cols, 60, rows * cols + 1)
+    geometry = games[0].get_geometry()
+    player, opponent = othello_batch.from_games_packed(games)
+    legal = othello_batch.legal_moves_packed(geometry, player, opponent)
+    moves = _moves(games, rows + cols + 1)
+    new_player, new_opponent, flipped = othello_batch.apply_moves_packed(geometry, player, opponent, moves)
+    counts = othello_batch.count(player)
+
+    for index, game in enumerate(games):
+        game_player, game_opponent = game.get_bitboards()
+        assert int(legal[index]) == othello_rules.legal_moves(geometry, game_player, game_opponent)
+        assert counts[index] == othello_bitboard.count(game_player)
+        expected = _expected(game, int(moves[index]))
+        assert (int(new_player[index]), int(new_opponent[index]), int(flipped[index])) == expected
+
+
+def test_pack_round_trip():
+    games = _games(8, 8, 20, 3)
+    player, opponent = othello_batch.from_games(games)
+    packed = othello_batch.pack(player)
+    assert [int(mask) for mask in packed] == [game.get_bitboards()[0] for game in games]
+    assert numpy.array_equal(othello_batch.unpack(games[0].get_geometry(), packed), player)
+    with pytest.raises(ValueError):
+        othello_batch.pack(numpy.zeros((1, 10, 10), dtype=bool))
+
+
+def test_random_moves_are_legal():
+    games = _games(6, 6, 100, 4)
+    player, opponent = othello_batch.from_games(games)
+    legal = othello_batch.legal_moves(player, opponent)
+    moves = othello_batch.random_moves(legal, numpy.random.default_rng(0))
+    for index, game in enumerate(games):
+        if game.legal_squares():
+            assert moves[index] in game.legal_squares()
+        else:
+            assert moves[index] == othello_batch.NO_MOVE
@@ -0,0 +1,132 @@
+#  The opening book: what BookBuilder writes, OpeningBook must read back for
+#  every orientation of a position, and best_move() must never rank a game
+#  average against a search score.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_book
+import othello_symmetry
+
+
+def _position(rows: int, cols: int, plies: int, seed: int) -> othello.OthelloGame:
+    generator = random.Random(seed)
+    game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    for ply in range(plies):
+        game.make_move(generator.choice(game.legal_squares()))
+    return game
+
+
+def _write(builder: othello_book.BookBuilder, tmp_path) -> str:
+    path = str(tmp_path / 'book.bin')
+    builder.write(path)
+    return path
+
+
+@pytest.mark.parametrize('rows, cols', [(8, 8), (6, 8)])
+def test_every_orientation_finds_the_moves(rows, cols, tmp_path):
+    game = _position(rows, cols, 5, rows * cols)
+    player, opponent = game.get_bitboards()
+    builder = othello_book.BookBuilder(rows, cols)
+    moves = game.legal_squares()
+    for score, square in enumerate(moves):
+        builder.add_move(player, opponent, square, score, depth=3)
+
+    with othello_book.OpeningBook(_write(builder, tmp_path)) as book:
+        assert len(book) == len(moves)
+        for symmetry in range(len(othello_symmetry.symmetries(rows, cols))):
+            image = (othello_symmetry.transform_board(rows, cols, symmetry, player),
+                     othello_symmetry.transform_board(rows, cols, symmetry, opponent))
+            expected = sorted((othello_symmetry.transform_square(rows, cols, symmetry, square), score, 3, 0)
+                              for score, square in enumerate(moves))
+            assert sorted(book.probe(*image)) == expected
+
+
+def test_start_positions_share_records(tmp_path):
+    builder = othello_book.BookBuilder(8, 8)
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    builder.add_move(*game.get_bitboards(), game.legal_squares()[0], 5, depth=2)
+    with othello_book.OpeningBook(_write(builder, tmp_path)) as book:
+        for turn in (othello.BLACK, othello.WHITE):
+            for top_left in (othello.BLACK, othello.WHITE):
+                start = othello.OthelloGame(8, 8, turn, top_left, othello.MOST_CELLS)
+                square, score, depth = book.best_move(start)
+                assert square in start.legal_squares()
+                assert (score, depth) == (5, 2)
+
+
+def test_searched_moves_rank_above_game_averages(tmp_path):
+    game = _position(8, 8, 0, 0)
+    player, opponent = game.get_bitboards()
+    searched, played, unplayed = game.legal_squares()[:3]
+    builder = othello_book.BookBuilder(8, 8)
+    # A game average far above the search score must not win
+    builder.add_move(player, opponent, played, 40, games=3)
+    builder.add_move(player, opponent, searched, -2, depth=4)
+    with othello_book.OpeningBook(_write(builder, tmp_path)) as book:
+        assert book.best_move(game) == (searched, -2, 4)
+
+    builder = othello_book.BookBuilder(8, 8)
+    builder.add_move(player, opponent, played, 40, games=1)
+    builder.add_move(player, opponent, played, 20, games=1)
+    builder.add_move(player, opponent, unplayed, 10, games=5)
+    with othello_book.OpeningBook(_write(builder, tmp_path)) as book:
+        assert book.best_move(game) == (played, None, 0)
+        assert (played, 30, 0, 2) in book.probe(player, opponent)
+
+
+def test_search_scores_replace_game_averages():
+    builder = othello_book.BookBuilder(8, 8)
+    game = _position(8, 8, 0, 0)
+    square = game.legal_squares()[0]
+    builder.add_move(*game.get_bitboards(), square, 12, games=2)
+    builder.add_move(*game.get_bitboards(), square, 3, depth=2)
+    builder.add_move(*game.get_bitboards(), square, 50, games=1)
+    builder.add_move(*game.get_bitboards(), square, 7, depth=1)
+    (moves,) = builder.entries.values()
+    assert list(moves.values()) == [[3, 2, 3]]
+
+
+def test_lookup_checks_the_book_matches_the_game(tmp_path):
+    game = _position(6, 6, 0, 0)
+    builder = othello_book.BookBuilder(6, 6, othello.LEAST_CELLS)
+    builder.add_move(*game.get_bitboards(), game.legal_squares()[0], 1, depth=1)
+    with othello_book.OpeningBook(_write(builder, tmp_path)) as book:
+        assert book.lookup(game) == []
+        least = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.LEAST_CELLS)
+        assert len(book.lookup(least)) == 1
+        assert book.lookup(othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.LEAST_CELLS)) == []
+
+
+def test_not_a_book(tmp_path):
+    path = tmp_path / 'junk.bin'
+    path.write_bytes(b'not a book at all, just some bytes')
+    with pytest.raises(ValueError):
+        othello_book.OpeningBook(str(path))
+    builder = othello_book.BookBuilder(6, 6)
+    builder.add_move(*_position(6, 6, 0, 0).get_bitboards(), 8, 1, depth=1)
+    truncated = _write(builder, tmp_path)
+    with open(truncated, 'rb+') as file:
+        file.truncate(othello_book.HEADER.size + 3)
+    with pytest.raises(ValueError):
+        othello_book.OpeningBook(truncated)
+
+
+def test_agent_plays_searched_book_moves(tmp_path):
+    builder = othello_book.BookBuilder(6, 6)
+    builder.add_searched(plies=2, depth=2, endgame_empties=0)
+    path = _write(builder, tmp_path)
+    searcher = agent.AlphaBetaAgent(max_depth=2, endgame_empties=0, book=path)
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    result = searcher.search(game)
+    assert result.nodes == 0
+    with othello_book.OpeningBook(path) as book:
+        assert game.get_geometry().square(*result.move) == book.best_move(game)[0]
+    # Out of the book the agent searches
+    game.move(*result.move)
+    for ply in range(3):
+        game.move(*agent.AlphaBetaAgent(max_depth=1).search(game).move)
+    assert searcher.search(game).nodes > 0
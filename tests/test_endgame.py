@@ -0,0 +1,97 @@
+#  The endgame solver against an exhaustive search of the whole remaining
+#  game: its score must be exact (only the sign in win/loss/draw mode) and
+#  its move must achieve that score.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_endgame
+import othello_rules
+
+
+def _exact(game: othello.OthelloGame) -> int:
+    ''' Final score for the player to move under perfect play, by trying
+        every line to the end of the game '''
+    if game.is_game_over():
+        player, opponent = game.get_bitboards()
+        return othello_rules.score(player, opponent, game.victory_type)
+    return max(_child_score(game, square) for square in game.legal_squares())
+
+
+def _child_score(game: othello.OthelloGame, square: int) -> int:
+    ''' Exact score for the player to move after playing square '''
+    turn = game.get_turn()
+    game.make_move(square)
+    score = _exact(game)
+    same_player = game.get_turn() == turn
+    game.unmake_move()
+    return score if same_player else -score
+
+
+def _endgame_positions(rows: int, cols: int, victory_type: str, empties: int,
+                       count: int, seed: int) -> [othello.OthelloGame]:
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, victory_type)
+        while not game.is_game_over() and game.get_empty_cells() > empties:
+            game.make_move(generator.choice(game.legal_squares()))
+        if not game.is_game_over():
+            positions.append(game)
+    return positions
+
+
+@pytest.mark.parametrize('victory_type', [othello.MOST_CELLS, othello.LEAST_CELLS])
+@pytest.mark.parametrize('rows, cols, empties', [(4, 4, 9), (6, 6, 8), (8, 8, 7)])
+def test_solver_is_exact(rows, cols, empties, victory_type):
+    for game in _endgame_positions(rows, cols, victory_type, empties, 6, rows * cols + empties):
+        solver = othello_endgame.EndgameSolver(game.get_geometry(), victory_type)
+        score, square = solver.solve(*game.get_bitboards())
+        assert score == _exact(game)
+        assert _child_score(game, square) == score
+
+        wld_score, wld_square = solver.solve(*game.get_bitboards(), wld=True)
+        assert (wld_score > 0) - (wld_score < 0) == (score > 0) - (score < 0)
+        # The move must keep the proven result
+        child = _child_score(game, wld_square)
+        assert (child > 0) - (child < 0) == (score > 0) - (score < 0)
+
+
+def test_solver_handles_a_pass_at_the_root():
+    found = 0
+    for game in _endgame_positions(4, 6, othello.MOST_CELLS, 6, 200, 10):
+        player, opponent = game.get_bitboards()
+        # A position where the player to move has no move comes after a pass;
+        # build it by handing the move to the other side
+        if othello_rules.legal_moves(game.get_geometry(), opponent, player):
+            continue
+        found += 1
+        solver = othello_endgame.EndgameSolver(game.get_geometry())
+        score, square = solver.solve(opponent, player)
+        assert square is None
+        assert score == -_exact(game)
+    assert found > 0
+
+
+def test_solver_times_out():
+    game = _endgame_positions(8, 8, othello.MOST_CELLS, 20, 1, 11)[0]
+    solver = othello_endgame.EndgameSolver(game.get_geometry())
+    with pytest.raises(othello_endgame.SolverTimeout):
+        solver.solve(*game.get_bitboards(), deadline=0.0)
+
+
+def test_agent_uses_the_solver_near_the_end():
+    for game in _endgame_positions(6, 6, othello.LEAST_CELLS, 8, 4, 12):
+        result = agent.AlphaBetaAgent(max_depth=1, endgame_empties=8).search(game)
+        exact = _exact(game)
+        assert result.depth == game.get_empty_cells()
+        if exact > 0:
+            assert result.score == agent.WIN_SCORE + exact
+        elif exact < 0:
+            assert result.score == -agent.WIN_SCORE + exact
+        else:
+            assert result.score == 0
+        assert _child_score(game, game.get_geometry().square(*result.move)) == exact
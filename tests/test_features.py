@@ -0,0 +1,80 @@
+#  IncrementalFeatures kept up to date by make_move()/unmake_move() against
+#  PatternEvaluator's evaluation from scratch, along random lines and back.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_eval
+
+
+def _scratch(evaluator: othello_eval.PatternEvaluator, game: othello.OthelloGame) -> int:
+    return evaluator.evaluate(*game.get_bitboards())
+
+
+def _incremental(game: othello.OthelloGame) -> int:
+    return game.get_features().evaluate(game.get_turn() == othello.BLACK, game.get_empty_cells())
+
+
+@pytest.mark.parametrize('rows, cols', [(4, 4), (6, 8), (8, 8), (10, 6)])
+def test_features_follow_make_and_unmake(rows, cols):
+    evaluator = othello_eval.evaluator(rows, cols)
+    generator = random.Random(rows * cols)
+    for game_number in range(3):
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        game.attach_features(othello_eval.IncrementalFeatures(evaluator, debug=True))
+        scores = []
+        while not game.is_game_over():
+            assert _incremental(game) == _scratch(evaluator, game)
+            scores.append(_incremental(game))
+            game.make_move(generator.choice(game.legal_squares()))
+        while scores:
+            game.unmake_move()
+            assert _incremental(game) == scores.pop()
+
+
+def test_features_attach_to_a_position_in_progress():
+    evaluator = othello_eval.evaluator(8, 8)
+    generator = random.Random(2)
+    game = othello.OthelloGame(8, 8, othello.WHITE, othello.BLACK, othello.MOST_CELLS)
+    for ply in range(20):
+        game.make_move(generator.choice(game.legal_squares()))
+    game.attach_features(othello_eval.IncrementalFeatures(evaluator))
+    assert _incremental(game) == _scratch(evaluator, game)
+    # Copies leave the features behind
+    assert game.copy().get_features() is None
+
+
+def test_check_catches_features_out_of_sync():
+    evaluator = othello_eval.evaluator(6, 6)
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    features = othello_eval.IncrementalFeatures(evaluator, debug=True)
+    game.attach_features(features)
+    square = game.legal_squares()[0]
+    after = game.copy()
+    after.make_move(square)
+    black, white = after.get_position()[4:]
+    with pytest.raises(AssertionError):
+        # Places the disc but leaves out the flipped ones
+        features.update(True, square, 0, black, white)
+    features.undo()
+    features.check(*game.get_position()[4:])
+    game.make_move(square)
+    features.check(black, white)
+
+
+@pytest.mark.parametrize('agent_class, kwargs', [
+    (agent.AlphaBetaAgent, {'max_depth': 3, 'endgame_empties': 0}),
+    (agent.ExpectimaxAgent, {})])
+def test_agents_score_leaves_like_a_full_evaluation(agent_class, kwargs, monkeypatch):
+    # Searches with the debug check on raise as soon as an update goes wrong
+    evaluator = othello_eval.evaluator(6, 6)
+    generator = random.Random(3)
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    monkeypatch.setattr(othello_eval, 'DEBUG_FEATURES', True)
+    searcher = agent_class(evaluator=evaluator, **kwargs)
+    for ply in range(10):
+        searcher.search(game)
+        game.make_move(generator.choice(game.legal_squares()))
@@ -0,0 +1,100 @@
+#  AlphaBetaAgent's negamax/PVS search against a plain minimax that looks at
+#  every node: with the same leaf scores both must agree on the value of
+#  the root, including positions where someone has to pass.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_eval
+import othello_rules
+
+
+def _leaf_value(game: othello.OthelloGame, color: str, evaluator) -> float:
+    ''' Scores a leaf for color the way AlphaBetaAgent does '''
+    player, opponent = game.get_bitboards()
+    if game.is_game_over():
+        result = othello_rules.score(player, opponent, game.victory_type)
+        if result > 0:
+            score = agent.WIN_SCORE + result
+        elif result < 0:
+            score = -agent.WIN_SCORE + result
+        else:
+            score = 0
+    elif evaluator is None:
+        return game.get_total_cells(color)
+    else:
+        score = evaluator.evaluate(player, opponent)
+        if game.victory_type == othello.LEAST_CELLS:
+            score = -score
+    return score if game.get_turn() == color else -score
+
+
+def _minimax(game: othello.OthelloGame, depth: int, color: str, evaluator) -> float:
+    ''' Best value for color, searching depth moves; a pass uses no depth '''
+    if depth == 0 or game.is_game_over():
+        return _leaf_value(game, color, evaluator)
+    values = []
+    for square in game.legal_squares():
+        game.make_move(square)
+        values.append(_minimax(game, depth - 1, color, evaluator))
+        game.unmake_move()
+    return max(values) if game.get_turn() == color else min(values)
+
+
+def _random_position(generator: random.Random, rows: int, cols: int, victory_type: str,
+                     empties: int) -> othello.OthelloGame:
+    ''' Plays random moves until at most empties squares are left '''
+    while True:
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, victory_type)
+        while not game.is_game_over() and game.get_empty_cells() > empties:
+            game.make_move(generator.choice(game.legal_squares()))
+        if not game.is_game_over():
+            return game
+
+
+@pytest.mark.parametrize('victory_type', [othello.MOST_CELLS, othello.LEAST_CELLS])
+@pytest.mark.parametrize('use_patterns', [False, True])
+def test_negamax_matches_minimax(victory_type, use_patterns):
+    generator = random.Random(8)
+    evaluator = othello_eval.evaluator(6, 6) if use_patterns else None
+    for empties in (30, 24, 16, 10, 7, 5):
+        game = _random_position(generator, 6, 6, victory_type, empties)
+        searcher = agent.AlphaBetaAgent(max_depth=4, endgame_empties=0,
+                                        evaluator=agent.PATTERN_EVALUATOR if use_patterns else None)
+        result = searcher.search(game)
+        assert result.score == _minimax(game, 4, game.get_turn(), evaluator)
+
+        # The chosen move is worth the score, and the PV is a legal line
+        square = game.get_geometry().square(*result.move)
+        child = game.copy()
+        child.make_move(square)
+        assert _minimax(child, 3, game.get_turn(), evaluator) == result.score
+        line = game.copy()
+        assert result.pv[0] == result.move
+        for row, col in result.pv:
+            line.move(row, col)
+
+
+def test_passes_do_not_use_depth():
+    # Play until some position has a pass within reach of a shallow search
+    generator = random.Random(9)
+    found = 0
+    while found < 5:
+        game = _random_position(generator, 4, 6, othello.MOST_CELLS, generator.randrange(4, 12))
+        turn = game.get_turn()
+        passes = False
+        for square in game.legal_squares():
+            game.make_move(square)
+            if game.get_turn() == turn and not game.is_game_over():
+                passes = True
+            game.unmake_move()
+        if not passes:
+            continue
+        found += 1
+        for depth in (1, 2, 3):
+            result = agent.AlphaBetaAgent(max_depth=depth, endgame_empties=0).search(game)
+            assert result.score == _minimax(game, depth, turn, None)
+
@@ -0,0 +1,65 @@
+#  The bitboard game against the original list-of-lists implementation
+#  (othello_reference): the same random games must give the same boards,
+#  turns, legal moves, disc counts and winners at every ply.
+
+import random
+
+import pytest
+
+import othello
+import othello_reference
+
+SIZES = [(4, 4), (4, 6), (6, 6), (8, 8), (6, 10), (10, 8), (16, 16)]
+
+
+def _reference_moves(game: othello_reference.OthelloGame) -> [(int, int)]:
+    game.can_move(game.get_turn())
+    return sorted(set((row, col) for row, col in game.possible_moves))
+
+
+@pytest.mark.parametrize('rows, cols', SIZES)
+@pytest.mark.parametrize('top_left', [othello.BLACK, othello.WHITE])
+def test_random_games_match_reference(rows, cols, top_left):
+    generator = random.Random(rows * 100 + cols)
+    for victory_type in (othello.MOST_CELLS, othello.LEAST_CELLS):
+        game = othello.OthelloGame(rows, cols, othello.BLACK, top_left, victory_type)
+        reference = othello_reference.OthelloGame(rows, cols, othello.BLACK, top_left, victory_type)
+        while True:
+            assert game.get_board() == reference.get_board()
+            assert game.get_turn() == reference.get_turn()
+            for color in (othello.BLACK, othello.WHITE):
+                assert game.get_total_cells(color) == reference.get_total_cells(color)
+            moves = [game.get_geometry().position(square) for square in game.legal_squares()]
+            assert sorted(moves) == _reference_moves(reference)
+            assert game.is_game_over() == reference.is_game_over()
+            if game.is_game_over():
+                assert game.return_winner() == reference.return_winner()
+                break
+            row, col = generator.choice(moves)
+            game.move(row, col)
+            reference.move(row, col)
+
+
+def test_invalid_moves_raise():
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    with pytest.raises(othello.InvalidMoveException):
+        # Occupied
+        game.move(3, 3)
+    with pytest.raises(othello.InvalidMoveException):
+        # Flips nothing
+        game.move(0, 0)
+    with pytest.raises(othello.InvalidMoveException):
+        game.move(8, 0)
+    assert game.get_total_cells(othello.BLACK) == game.get_total_cells(othello.WHITE) == 2
+
+
+def test_position_round_trip():
+    game = othello.OthelloGame(6, 8, othello.WHITE, othello.BLACK, othello.LEAST_CELLS)
+    generator = random.Random(1)
+    for ply in range(10):
+        game.make_move(generator.choice(game.legal_squares()))
+    copy = othello.OthelloGame.from_position(game.get_position())
+    assert copy.get_board() == game.get_board()
+    assert copy.get_turn() == game.get_turn()
+    assert copy.get_key() == game.get_key()
+    assert copy.legal_squares() == game.legal_squares()
@@ -0,0 +1,82 @@
+#  ParallelAgent against the serial agents: splitting the root moves between
+#  worker processes may search more nodes, but at a fixed depth it must find
+#  the same best score, and a move worth that score.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_parallel
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with othello_parallel.SearchPool(2) as pool:
+        yield pool
+
+
+def _positions(count: int, seed: int) -> [othello.OthelloGame]:
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        for ply in range(generator.randrange(0, 20)):
+            if game.is_game_over():
+                break
+            game.make_move(generator.choice(game.legal_squares()))
+        if not game.is_game_over() and len(game.legal_squares()) >= 2:
+            positions.append(game)
+    return positions
+
+
+def _move_score(agent_class, kwargs: dict, game: othello.OthelloGame, move: [int]) -> float:
+    ''' Score of a single root move, searched serially '''
+    square = game.get_geometry().square(*move)
+    return agent_class(**kwargs).search(game, root_moves=[square]).score
+
+
+@pytest.mark.parametrize('agent_class, kwargs', [
+    (agent.AlphaBetaAgent, {'max_depth': 4, 'endgame_empties': 0}),
+    (agent.AlphaBetaAgent, {'max_depth': 3, 'endgame_empties': 0, 'evaluator': agent.PATTERN_EVALUATOR}),
+    (agent.ExpectimaxAgent, {})])
+def test_parallel_matches_serial(pool, agent_class, kwargs):
+    for game in _positions(5, 10):
+        serial = agent_class(**kwargs).search(game)
+        parallel = othello_parallel.ParallelAgent(agent_class, pool=pool, **kwargs).search(game)
+        assert parallel.score == serial.score
+        assert parallel.depth == serial.depth
+        assert _move_score(agent_class, kwargs, game, parallel.move) == serial.score
+        assert parallel.pv[0] == parallel.move
+
+
+def test_root_moves_cover_every_move(pool):
+    game = _positions(1, 11)[0]
+    searcher = othello_parallel.ParallelAgent(agent.AlphaBetaAgent, pool=pool)
+    moves = game.legal_squares()
+    shares = searcher._split(game, moves)
+    assert sorted(move for share in shares for move in share) == sorted(moves)
+    assert len(shares) == min(pool.workers, len(moves))
+
+
+def test_endgame_is_searched_locally(pool):
+    generator = random.Random(12)
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    while game.get_empty_cells() > 6 or game.is_game_over():
+        if game.is_game_over():
+            game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        game.make_move(generator.choice(game.legal_squares()))
+    parallel = othello_parallel.ParallelAgent(agent.AlphaBetaAgent, pool=pool, endgame_empties=6)
+    result = parallel.search(game)
+    assert result.score == agent.AlphaBetaAgent(endgame_empties=6).search(game).score
+    assert result.depth == game.get_empty_cells()
+
+
+def test_agents_are_kept_between_moves(pool):
+    # Later searches reuse the worker agents; the agent must still move legally
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    searcher = othello_parallel.ParallelAgent(agent.AlphaBetaAgent, pool=pool, max_depth=2)
+    while not game.is_game_over():
+        row, col = searcher.get_next_action(game)
+        game.move(row, col)
@@ -0,0 +1,64 @@
+#  Perft: the known counts of the 8x8 start position, and every engine
+#  agreeing on start positions, the benchmark corpus and positions with
+#  passes and finished games.
+
+import random
+
+import pytest
+
+import othello
+import othello_benchmark
+import othello_perft
+import othello_rules
+
+
+def test_standard_counts():
+    position = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS).get_position()
+    assert othello_perft.perft(position, 6).counts() == othello_perft.STANDARD_8X8[:6]
+
+
+@pytest.mark.parametrize('rows, cols', [(4, 4), (4, 6), (6, 10), (10, 8), (16, 16)])
+def test_engines_agree_on_start_positions(rows, cols):
+    position = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS).get_position()
+    results, problems = othello_perft.check(position, 4)
+    assert problems == []
+
+
+@pytest.mark.parametrize('rows, cols', [(6, 6), (8, 8)])
+def test_engines_agree_on_the_corpus(rows, cols):
+    for name, position in othello_benchmark.corpus([(rows, cols)], per_phase=1):
+        results, problems = othello_perft.check(position, 3)
+        assert problems == [], name
+
+
+def test_engines_agree_on_passes_and_finished_games():
+    generator = random.Random(5)
+    found = 0
+    while found < 10:
+        game = othello.OthelloGame(4, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        while not game.is_game_over() and game.get_empty_cells() > 6:
+            game.make_move(generator.choice(game.legal_squares()))
+        rows, cols, turn, victory_type, black, white = game.get_position()
+        # Hand the move to the other side: if that side has no move, the
+        # tree starts with a pass
+        other = othello.WHITE if turn == othello.BLACK else othello.BLACK
+        player, opponent = (black, white) if other == othello.BLACK else (white, black)
+        if othello_rules.legal_moves(game.get_geometry(), player, opponent):
+            continue
+        found += 1
+        for position in (game.get_position(), (rows, cols, other, victory_type, black, white)):
+            results, problems = othello_perft.check(position, 8)
+            assert problems == []
+
+
+def test_finished_game_is_one_leaf_at_every_depth():
+    generator = random.Random(6)
+    game = othello.OthelloGame(4, 4, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    while not game.is_game_over():
+        game.make_move(generator.choice(game.legal_squares()))
+    for engine in othello_perft.ENGINES:
+        assert othello_perft.perft(game.get_position(), 3, engine).counts() == [1, 1, 1]
+
+
+def test_check_command_passes():
+    othello_perft.main(['--depth', '4', '--sizes', '8x8', '6x6', '--check'])
@@ -0,0 +1,157 @@
+#  Game record files: games must read back exactly as written, plain and
+#  gzip-compressed, a game cut off in the middle of writing must be skipped
+#  by the reader and removed by the next writer, and unfinished games must
+#  never reach a file.
+
+import os
+import random
+
+import pytest
+
+import othello
+import othello_record
+
+
+def _play(rows: int, cols: int, seed: int, start_plies: int = 0) -> othello_record.GameRecord:
+    ''' Records a random game, from a random opening if start_plies > 0 '''
+    generator = random.Random(seed)
+    game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.LEAST_CELLS)
+    for ply in range(start_plies):
+        game.make_move(generator.choice(game.legal_squares()))
+    game = othello.OthelloGame.from_position(game.get_position())
+    record = othello_record.GameRecord.from_game(game, 'black player', 'white é')
+    while not game.is_game_over():
+        mover = game.get_turn()
+        square = generator.choice(game.legal_squares())
+        game.make_move(square)
+        stats = None
+        if generator.random() < 0.7:
+            stats = (generator.randrange(10 ** 6), generator.choice([None, 3]), 0.25, generator.choice([None, -2.5]))
+        record.add_move(game, mover, square, stats)
+    record.finish(game)
+    return record
+
+
+def _fields(record: othello_record.GameRecord) -> tuple:
+    return (record.rows, record.cols, record.first_player, record.top_left, record.victory_type,
+            record.black, record.white, record.start, record.moves, record.stats,
+            record.black_cells, record.white_cells, record.winner, record.forfeit)
+
+
+def _records(count: int) -> [othello_record.GameRecord]:
+    sizes = [(4, 4), (6, 8), (8, 8), (16, 16)]
+    return [_play(*sizes[number % len(sizes)], number, 3 * (number % 2)) for number in range(count)]
+
+
+@pytest.mark.parametrize('name', ['games.rec', 'games.rec.gz'])
+def test_records_read_back_exactly(name, tmp_path):
+    path = str(tmp_path / name)
+    records = _records(8)
+    with othello_record.RecordWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    read = list(othello_record.read_records(path))
+    assert [_fields(record) for record in read] == [_fields(record) for record in records]
+    for record in read:
+        final = record.final_game()
+        assert final.is_game_over()
+        assert final.get_total_cells(othello.BLACK) == record.black_cells
+        assert final.return_winner() == record.winner
+        assert len(list(record.replay())) == len(record.squares())
+
+
+def test_passes_are_recorded():
+    passes = [record for record in _records(40) if othello_record.PASS in record.moves]
+    assert passes
+    for record in passes:
+        list(record.replay())
+        record.moves.remove(othello_record.PASS)
+        with pytest.raises(ValueError):
+            list(record.replay())
+
+
+def test_writer_appends_to_an_existing_file(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    records = _records(4)
+    for record in records:
+        with othello_record.RecordWriter(path) as writer:
+            writer.write(record)
+    assert [_fields(record) for record in othello_record.read_records(path)] == \
+        [_fields(record) for record in records]
+
+
+def test_cut_off_game_is_skipped_and_removed(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    records = _records(4)
+    with othello_record.RecordWriter(path) as writer:
+        for record in records[:3]:
+            writer.write(record)
+    os.truncate(path, os.path.getsize(path) - 5)
+    assert [_fields(record) for record in othello_record.read_records(path)] == \
+        [_fields(record) for record in records[:2]]
+    with othello_record.RecordWriter(path) as writer:
+        writer.write(records[3])
+    assert [_fields(record) for record in othello_record.read_records(path)] == \
+        [_fields(record) for record in records[:2] + records[3:]]
+
+
+def test_cut_off_gzip_file_keeps_its_complete_games(tmp_path):
+    path = str(tmp_path / 'games.rec.gz')
+    records = _records(6)
+    with othello_record.RecordWriter(path) as writer:
+        for record in records[:5]:
+            writer.write(record)
+    size = os.path.getsize(path)
+    os.truncate(path, size - size // 3)
+    read = [_fields(record) for record in othello_record.read_records(path)]
+    assert read == [_fields(record) for record in records[:len(read)]]
+    with othello_record.RecordWriter(path) as writer:
+        writer.write(records[5])
+    assert [_fields(record) for record in othello_record.read_records(path)] == \
+        read + [_fields(records[5])]
+
+
+def test_file_cut_off_in_the_header_is_started_again(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    with open(path, 'wb') as file:
+        file.write(othello_record.MAGIC[:3])
+    record = _records(1)[0]
+    with othello_record.RecordWriter(path) as writer:
+        writer.write(record)
+    assert [_fields(read) for read in othello_record.read_records(path)] == [_fields(record)]
+
+
+def test_unfinished_games_are_not_written(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    record = othello_record.GameRecord.from_game(game)
+    with othello_record.RecordWriter(path) as writer:
+        with pytest.raises(ValueError):
+            writer.write(record)
+    assert list(othello_record.read_records(path)) == []
+    # An unfinished game that did get into a file is skipped
+    with open(path, 'ab') as file:
+        data = othello_record.encode(record)
+        file.write(othello_record.LENGTH.pack(len(data)) + data)
+    assert list(othello_record.read_records(path)) == []
+
+
+def test_forfeit_is_recorded(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    record = othello_record.GameRecord.from_game(game)
+    record.finish(game, forfeit=othello.BLACK)
+    with othello_record.RecordWriter(path) as writer:
+        writer.write(record)
+    (read,) = othello_record.read_records(path)
+    assert (read.forfeit, read.winner) == (othello.BLACK, othello.WHITE)
+
+
+def test_not_a_record_file(tmp_path):
+    path = str(tmp_path / 'other.rec')
+    with open(path, 'wb') as file:
+        file.write(b'something else entirely')
+    with pytest.raises(ValueError):
+        othello_record.RecordWriter(path)
+    with pytest.raises(ValueError):
+        list(othello_record.read_records(path))
@@ -0,0 +1,125 @@
+#  Board symmetries and canonical forms, and AlphaBetaAgent with tt_symmetry,
+#  which must score positions exactly like a plain search.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_bitboard
+import othello_rules
+import othello_symmetry
+
+SIZES = [(4, 4), (6, 8), (8, 8), (10, 6), (16, 16)]
+
+
+def _positions(rows: int, cols: int, count: int, seed: int) -> [othello.OthelloGame]:
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        for ply in range(generator.randrange(rows * cols - 4)):
+            if game.is_game_over():
+                break
+            game.make_move(generator.choice(game.legal_squares()))
+        positions.append(game)
+    return positions
+
+
+def _permute(permutation: [int], board: int) -> int:
+    return sum(1 << permutation[square] for square in othello_bitboard.squares(board))
+
+
+@pytest.mark.parametrize('rows, cols', SIZES)
+def test_symmetries_form_a_group(rows, cols):
+    transforms = othello_symmetry.symmetries(rows, cols)
+    assert len(transforms) == (8 if rows == cols else 4)
+    assert transforms[0] == list(range(rows * cols))
+    for transform in transforms:
+        assert sorted(transform) == list(range(rows * cols))
+        for other in transforms:
+            assert [other[square] for square in transform] in transforms
+    for number, inverse in enumerate(othello_symmetry.inverses(rows, cols)):
+        assert [transforms[inverse][square] for square in transforms[number]] == transforms[0]
+
+
+@pytest.mark.parametrize('rows, cols', SIZES)
+def test_symmetries_preserve_the_rules(rows, cols):
+    geometry = othello_bitboard.geometry(rows, cols)
+    for game in _positions(rows, cols, 10, rows * cols):
+        player, opponent = game.get_bitboards()
+        moves = othello_rules.legal_moves(geometry, player, opponent)
+        for symmetry, transform in enumerate(othello_symmetry.symmetries(rows, cols)):
+            image_player = othello_symmetry.transform_board(rows, cols, symmetry, player)
+            image_opponent = othello_symmetry.transform_board(rows, cols, symmetry, opponent)
+            assert image_player == _permute(transform, player)
+            assert image_opponent == _permute(transform, opponent)
+            assert othello_rules.legal_moves(geometry, image_player, image_opponent) == _permute(transform, moves)
+            for square in othello_bitboard.squares(moves):
+                image_square = othello_symmetry.transform_square(rows, cols, symmetry, square)
+                flipped = othello_bitboard.flips(geometry, player, opponent, square)
+                assert othello_bitboard.flips(geometry, image_player, image_opponent,
+                                              image_square) == _permute(transform, flipped)
+
+
+@pytest.mark.parametrize('rows, cols', SIZES)
+def test_every_orientation_has_the_same_canonical_form(rows, cols):
+    for game in _positions(rows, cols, 10, rows * cols + 1):
+        player, opponent = game.get_bitboards()
+        canonical_player, canonical_opponent, symmetry = othello_symmetry.canonical(rows, cols, player, opponent)
+        assert othello_symmetry.transform_board(rows, cols, symmetry, player) == canonical_player
+        assert othello_symmetry.transform_board(rows, cols, symmetry, opponent) == canonical_opponent
+        images = []
+        for other in range(len(othello_symmetry.symmetries(rows, cols))):
+            image = (othello_symmetry.transform_board(rows, cols, other, player),
+                     othello_symmetry.transform_board(rows, cols, other, opponent))
+            images.append(image)
+            assert othello_symmetry.canonical(rows, cols, *image)[:2] == (canonical_player, canonical_opponent)
+        assert min(images) == (canonical_player, canonical_opponent)
+
+
+def test_ties_on_the_player_are_broken_by_the_opponent():
+    # After the first move the position is symmetric about a diagonal, so
+    # the player's discs look the same under two symmetries and the
+    # opponent's decide between them
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    game.make_move(game.legal_squares()[0])
+    player, opponent = game.get_bitboards()
+    images = [(othello_symmetry.transform_board(8, 8, symmetry, player),
+               othello_symmetry.transform_board(8, 8, symmetry, opponent)) for symmetry in range(8)]
+    assert len(set(image[0] for image in images)) < len(images)
+    assert othello_symmetry.canonical(8, 8, player, opponent)[:2] == min(images)
+
+
+@pytest.mark.parametrize('evaluator', [None, agent.PATTERN_EVALUATOR])
+def test_tt_symmetry_matches_a_plain_search(evaluator):
+    for game in _positions(6, 6, 8, 2):
+        if game.is_game_over():
+            continue
+        plain = agent.AlphaBetaAgent(max_depth=4, endgame_empties=0, evaluator=evaluator).search(game)
+        symmetric = agent.AlphaBetaAgent(max_depth=4, endgame_empties=0, evaluator=evaluator,
+                                         tt_symmetry=True).search(game)
+        assert symmetric.score == plain.score
+        assert game.get_geometry().square(*symmetric.move) in game.legal_squares()
+
+
+def test_tt_symmetry_moves_are_mapped_back():
+    # A second search of a mirrored position starts from the stored entries
+    # of the first one; its hash moves must be legal in the mirrored position
+    searcher = agent.AlphaBetaAgent(max_depth=3, endgame_empties=0, tt_symmetry=True)
+    for game in _positions(8, 8, 4, 3):
+        if game.is_game_over():
+            continue
+        searcher.search(game)
+        rows, cols, turn, victory_type, black, white = game.get_position()
+        for symmetry in range(1, 8):
+            image = othello.OthelloGame.from_position(
+                (rows, cols, turn, victory_type,
+                 othello_symmetry.transform_board(rows, cols, symmetry, black),
+                 othello_symmetry.transform_board(rows, cols, symmetry, white)))
+            result = searcher.search(image)
+            assert image.get_geometry().square(*result.move) in image.legal_squares()
+            line = image.copy()
+            for row, col in result.pv:
+                line.move(row, col)
@@ -0,0 +1,106 @@
+#  The transposition table on its own (store, probe, replacement policies)
+#  and inside AlphaBetaAgent, where it must only ever save work: a search
+#  with the table has to find the same score as one without.
+
+import random
+
+import pytest
+
+import agent
+import othello
+import othello_transposition
+from othello_transposition import EXACT, LOWER, UPPER
+
+
+def test_store_and_probe():
+    table = othello_transposition.TranspositionTable(16)
+    assert table.probe(5) is None
+    table.store(5, 3, EXACT, 12, 7)
+    assert table.probe(5)[:5] == (5, 3, EXACT, 12, 7)
+    # Same slot, different key
+    assert table.probe(5 + 16) is None
+    stats = table.stats()
+    assert (stats['hits'], stats['misses'], stats['collisions'], stats['used']) == (1, 2, 1, 1)
+
+
+def test_size_rounds_down_to_a_power_of_two():
+    assert othello_transposition.TranspositionTable(100).size == 64
+    with pytest.raises(ValueError):
+        othello_transposition.TranspositionTable(0)
+    with pytest.raises(ValueError):
+        othello_transposition.TranspositionTable(16, 'newest')
+
+
+def test_restoring_a_position_keeps_its_best_move():
+    table = othello_transposition.TranspositionTable(16)
+    table.store(5, 2, LOWER, 10, 7)
+    table.store(5, 3, UPPER, 4, None)
+    assert table.probe(5)[:5] == (5, 3, UPPER, 4, 7)
+
+
+@pytest.mark.parametrize('replacement, replaced', [
+    (othello_transposition.ALWAYS_REPLACE, True),
+    (othello_transposition.DEPTH_PREFERRED, False),
+    (othello_transposition.AGING, False)])
+def test_replacement_policies(replacement, replaced):
+    table = othello_transposition.TranspositionTable(16, replacement)
+    table.store(1, 5, EXACT, 0, None)
+    table.store(17, 2, EXACT, 0, None)
+    assert (table.probe(17) is not None) == replaced
+    # A deeper entry always wins the slot
+    table.store(33, 9, EXACT, 0, None)
+    assert table.probe(33) is not None
+
+
+def test_aging_replaces_entries_of_earlier_searches():
+    table = othello_transposition.TranspositionTable(16, othello_transposition.AGING)
+    table.store(1, 5, EXACT, 0, None)
+    table.new_search()
+    table.store(17, 2, EXACT, 0, None)
+    assert table.probe(17) is not None
+    table.clear()
+    assert table.probe(17) is None
+
+
+def _random_positions(rows: int, cols: int, count: int, seed: int) -> [othello.OthelloGame]:
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        for ply in range(generator.randrange(2, rows * cols - 8)):
+            if game.is_game_over():
+                break
+            game.make_move(generator.choice(game.legal_squares()))
+        if not game.is_game_over():
+            positions.append(game)
+    return positions
+
+
+@pytest.mark.parametrize('evaluator', [None, agent.PATTERN_EVALUATOR])
+def test_table_does_not_change_the_score(evaluator):
+    for game in _random_positions(6, 6, 12, 5):
+        scores = []
+        for tt_size in (0, 1 << 12):
+            searcher = agent.AlphaBetaAgent(max_depth=4, tt_size=tt_size,
+                                            endgame_empties=0, evaluator=evaluator)
+            scores.append(searcher.search(game).score)
+        assert scores[0] == scores[1]
+
+
+def test_table_is_cleared_for_another_victory_type():
+    # Close enough to the end that the search sees finished games, whose
+    # scores depend on the victory type
+    generator = random.Random(6)
+    game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    while game.get_empty_cells() > 6 or game.is_game_over():
+        if game.is_game_over():
+            game = othello.OthelloGame(6, 6, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        game.make_move(generator.choice(game.legal_squares()))
+    rows, cols, turn, victory_type, black, white = game.get_position()
+    least = othello.OthelloGame.from_position((rows, cols, turn, othello.LEAST_CELLS, black, white))
+
+    searcher = agent.AlphaBetaAgent(max_depth=6, endgame_empties=0)
+    most_score = searcher.search(game).score
+    least_score = agent.AlphaBetaAgent(max_depth=6, endgame_empties=0).search(least).score
+    assert most_score != least_score
+    assert searcher.search(least).score == least_score
@@ -0,0 +1,82 @@
+#  The tuning fit: its tables must stay symmetric, so that every orientation
+#  of a position gets the same score (which tt_symmetry and the book rely
+#  on), and it must fit its labels better than the tables it started from.
+
+import random
+
+import numpy
+import pytest
+
+import othello
+import othello_eval
+import othello_symmetry
+import othello_tuning
+
+
+def _random_positions(rows: int, cols: int, games: int, seed: int) -> dict:
+    ''' Positions of random games, labelled with their final disc difference '''
+    generator = random.Random(seed)
+    samples = []
+    for game_number in range(games):
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        recorded = []
+        while not game.is_game_over():
+            recorded.append(game.get_bitboards() + (game.get_turn(),))
+            game.make_move(generator.choice(game.legal_squares()))
+        difference = game.get_total_cells(othello.BLACK) - game.get_total_cells(othello.WHITE)
+        for player, opponent, turn in recorded:
+            result = difference if turn == othello.BLACK else -difference
+            samples.append((player, opponent, result, result, False))
+    return othello_tuning._positions(rows, cols, samples)
+
+
+def _assert_symmetric(evaluator: othello_eval.PatternEvaluator, positions: dict) -> None:
+    rows, cols = evaluator.rows, evaluator.cols
+    for player_bytes, opponent_bytes in zip(positions['player'][::7], positions['opponent'][::7]):
+        player = int.from_bytes(player_bytes.tobytes(), 'little')
+        opponent = int.from_bytes(opponent_bytes.tobytes(), 'little')
+        score = evaluator.evaluate(player, opponent)
+        for symmetry in range(len(othello_symmetry.symmetries(rows, cols))):
+            assert evaluator.evaluate(othello_symmetry.transform_board(rows, cols, symmetry, player),
+                                      othello_symmetry.transform_board(rows, cols, symmetry, opponent)) == score
+
+
+def _error(evaluator: othello_eval.PatternEvaluator, positions: dict) -> float:
+    errors = []
+    for player_bytes, opponent_bytes, label in zip(positions['player'], positions['opponent'], positions['label']):
+        player = int.from_bytes(player_bytes.tobytes(), 'little')
+        opponent = int.from_bytes(opponent_bytes.tobytes(), 'little')
+        errors.append(evaluator.evaluate(player, opponent) - label * othello_tuning.DISC_VALUE)
+    return float(numpy.mean(numpy.square(errors)))
+
+
+@pytest.mark.parametrize('rows, cols', [(6, 6), (6, 8)])
+def test_default_tables_are_symmetric(rows, cols):
+    _assert_symmetric(othello_eval.PatternEvaluator(rows, cols), _random_positions(rows, cols, 5, 1))
+
+
+@pytest.mark.parametrize('rows, cols', [(6, 6), (6, 8)])
+@pytest.mark.parametrize('loss', [othello_tuning.LEAST_SQUARES, othello_tuning.LOGISTIC])
+def test_fitted_tables_are_symmetric(rows, cols, loss):
+    positions = _random_positions(rows, cols, 40, rows * cols)
+    fitted = othello_tuning.fit_evaluator(positions, phases=2, loss=loss, iterations=20)
+    _assert_symmetric(fitted, _random_positions(rows, cols, 5, 2))
+
+
+def test_fit_reduces_the_error():
+    positions = _random_positions(6, 6, 80, 3)
+    base = othello_eval.PatternEvaluator(6, 6)
+    fitted = othello_tuning.fit_evaluator(positions, phases=2, iterations=50, base=base)
+    assert _error(fitted, positions) < _error(base, positions)
+
+
+def test_saved_weights_load_back(tmp_path):
+    positions = _random_positions(6, 6, 20, 4)
+    fitted = othello_tuning.fit_evaluator(positions, phases=3, iterations=5)
+    path = str(tmp_path / 'weights.json.gz')
+    fitted.save_weights(path)
+    loaded = othello_eval.load_evaluator(path)
+    for player_bytes, opponent_bytes in zip(positions['player'], positions['opponent']):
+        player = int.from_bytes(player_bytes.tobytes(), 'little')
+        opponent = int.from_bytes(opponent_bytes.tobytes(), 'little')
+        assert loaded.evaluate(player, opponent) == fitted.evaluate(player, opponent)
@@ -0,0 +1,79 @@
+#  make_move() and unmake_move(): walking down a random line and back up
+#  again must give back every earlier position exactly, with the cached
+#  counts, legal moves and Zobrist key intact.
+
+import random
+
+import pytest
+
+import othello
+import othello_zobrist
+
+
+def _snapshot(game: othello.OthelloGame) -> tuple:
+    return (game.get_position(), game.get_key(), game.legal_squares(),
+            game.get_total_cells(othello.BLACK), game.get_total_cells(othello.WHITE),
+            game.is_game_over())
+
+
+@pytest.mark.parametrize('rows, cols', [(4, 4), (6, 8), (8, 8), (10, 6)])
+def test_unmake_restores_every_position(rows, cols):
+    generator = random.Random(rows * cols)
+    for game_number in range(5):
+        game = othello.OthelloGame(rows, cols, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+        snapshots = []
+        while not game.is_game_over():
+            snapshots.append(_snapshot(game))
+            square = generator.choice(game.legal_squares())
+            game.make_move(square)
+            # Take the move back and play it again now and then, so the
+            # caches are exercised straight after an undo as well
+            if generator.random() < 0.3:
+                game.unmake_move()
+                assert _snapshot(game) == snapshots[-1]
+                game.make_move(square)
+        assert game.get_undo_depth() == len(snapshots)
+        while snapshots:
+            game.unmake_move()
+            assert _snapshot(game) == snapshots.pop()
+        assert game.get_undo_depth() == 0
+
+
+def test_incremental_key_matches_fresh_key():
+    generator = random.Random(3)
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    keys = othello_zobrist.keys(8, 8)
+    while not game.is_game_over():
+        rows, cols, turn, victory, black, white = game.get_position()
+        assert game.get_key() == keys.key(black, white, turn == othello.WHITE)
+        game.make_move(generator.choice(game.legal_squares()))
+
+
+def test_counts_match_the_board():
+    generator = random.Random(4)
+    game = othello.OthelloGame(6, 6, othello.WHITE, othello.BLACK, othello.LEAST_CELLS)
+    while not game.is_game_over():
+        board = game.get_board()
+        for color in (othello.BLACK, othello.WHITE):
+            assert game.get_total_cells(color) == sum(row.count(color) for row in board)
+        assert game.get_empty_cells() == sum(row.count(othello.NONE) for row in board)
+        game.make_move(generator.choice(game.legal_squares()))
+
+
+def test_invalid_move_leaves_the_game_alone():
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    before = _snapshot(game)
+    with pytest.raises(othello.InvalidMoveException):
+        game.make_move(0)
+    assert _snapshot(game) == before
+    assert game.get_undo_depth() == 0
+
+
+def test_copy_is_independent():
+    game = othello.OthelloGame(8, 8, othello.BLACK, othello.WHITE, othello.MOST_CELLS)
+    game.make_move(game.legal_squares()[0])
+    before = _snapshot(game)
+    copy = game.copy()
+    assert copy.get_undo_depth() == 0
+    copy.make_move(copy.legal_squares()[0])
+    assert _snapshot(game) == before